@@ -18,7 +18,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager, suppress
 from typing import Optional, List
 from datetime import datetime
 from pathlib import Path
@@ -27,6 +27,7 @@ import json
 import csv
 import io
 import random
+import struct
 import time
 import threading
 
@@ -82,15 +83,68 @@ def write_json(filepath: Path, data):
     with open(filepath, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
 
+# report.json ถูกเขียนจากหลาย thread (log writer, เขียนตรงตอน writer ไม่ทำงาน)
+_report_lock = threading.Lock()
+
 def append_log(entry: LogEntry):
     """
     เพิ่ม log entry ใหม่เข้าไปในไฟล์ report.json
     Logic: อ่านค่าเก่า -> เติมค่าใหม่ (Append) -> บันทึก
     """
-    logs = read_json(REPORT_FILE, [])
-    logs.append(entry.model_dump())  # ใช้ model_dump() แทน dict()
-    write_json(REPORT_FILE, logs)
-    return len(logs)
+    return append_logs([entry])
+
+def append_logs(entries: List[LogEntry]):
+    """เพิ่มหลาย log entries ด้วยการอ่าน/เขียนไฟล์ครั้งเดียว"""
+    with _report_lock:
+        logs = read_json(REPORT_FILE, [])
+        logs.extend(entry.model_dump() for entry in entries)  # ใช้ model_dump() แทน dict()
+        write_json(REPORT_FILE, logs)
+        return len(logs)
+
+# ==================== ASYNC LOG WRITER ====================
+# API handlers และ mission loop ส่ง log เข้า queue เดียวกัน (ลำดับใน report ตรงกับลำดับที่ส่ง)
+# แล้วทำงานต่อทันที ไม่ต้องรอเขียนไฟล์
+LOG_BATCH_SIZE = 64
+LOG_FLUSH_INTERVAL = 0.1  # วินาที
+
+_log_queue: Optional[asyncio.Queue] = None
+_log_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def queue_log(entry: LogEntry):
+    """
+    ส่ง log เข้า queue - เรียกจาก thread ไหนก็ได้ (put ผ่าน call_soon_threadsafe ตามลำดับที่เรียก)
+    ถ้า writer ยังไม่เริ่ม / หยุดไปแล้วจะเขียนตรง
+    """
+    log_queue = _log_queue
+    if log_queue is None:
+        append_log(entry)
+        return
+    try:
+        _log_loop.call_soon_threadsafe(log_queue.put_nowait, entry)
+    except RuntimeError:  # event loop ปิดไปแล้ว
+        append_log(entry)
+
+def _drain_log_queue(queue: asyncio.Queue, batch: list) -> list:
+    """ดึง entries ที่ค้างใน queue เพิ่มจนเต็ม batch"""
+    while len(batch) < LOG_BATCH_SIZE and not queue.empty():
+        batch.append(queue.get_nowait())
+    return batch
+
+async def _log_writer(queue: asyncio.Queue):
+    """Background task: รวม log เป็น batch แล้วเขียนใน worker thread"""
+    while True:
+        batch = [await queue.get()]
+        try:
+            await asyncio.sleep(LOG_FLUSH_INTERVAL)
+        except asyncio.CancelledError:
+            # Shutdown ระหว่างรอ - เขียน batch ที่ดึงมาแล้วก่อนออก
+            append_logs(_drain_log_queue(queue, batch))
+            raise
+        _drain_log_queue(queue, batch)
+        try:
+            await asyncio.to_thread(append_logs, batch)
+        except Exception as e:
+            print(f"❌ Log write error: {e}")
 
 # ==================== REAL ROBOT CONTROLLER ====================
 import sys
@@ -261,7 +315,7 @@ class RealRobotController:
         self.say("moving")
         
         # Log start
-        append_log(LogEntry(
+        queue_log(LogEntry(
             timestamp=datetime.now().isoformat(),
             event="MISSION_START",
             details=f"Mission started ({'Single Shot' if single_shot else 'Continuous'})"
@@ -288,7 +342,7 @@ class RealRobotController:
         
         self.say("stopped")
         
-        append_log(LogEntry(
+        queue_log(LogEntry(
             timestamp=datetime.now().isoformat(),
             event="EMERGENCY_STOP",
             details="Mission stopped by user"
@@ -406,7 +460,7 @@ class RealRobotController:
                 self.status.weed_count += 1
                 
                 # Log detection
-                append_log(LogEntry(
+                queue_log(LogEntry(
                     timestamp=datetime.now().isoformat(),
                     event="TARGET_DETECTED",
                     x=target.x,
@@ -508,7 +562,7 @@ class RealRobotController:
                 print(f">>> Spray count: {self.status.spray_count}")
                 
                 # Log completion
-                append_log(LogEntry(
+                queue_log(LogEntry(
                     timestamp=datetime.now().isoformat(),
                     event="TARGET_SPRAYED",
                     x=target.x,
@@ -591,6 +645,12 @@ async def lifespan(app: FastAPI):
     if not STATUS_FILE.exists():
         write_json(STATUS_FILE, RobotStatus().model_dump())
     
+    # Start background log writer
+    global _log_queue, _log_loop
+    _log_loop = asyncio.get_running_loop()
+    log_queue = _log_queue = asyncio.Queue()
+    log_writer_task = asyncio.create_task(_log_writer(log_queue))
+    
     # Initialize robot devices (ESP32 + Camera)
     print("🔌 Initializing robot devices...")
     if robot.initialize_devices():
@@ -602,6 +662,18 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("👋 Server shutting down...")
+    # หยุดรับ log ใหม่ (เขียนตรงแทน) แล้วให้ put ที่ thread อื่น schedule ไว้แล้วเข้า queue ก่อน drain
+    _log_queue = None
+    await asyncio.sleep(0)
+    # รอ writer ออกจริงก่อน (batch ที่ดึงไปแล้วถูกเขียนใน task เอง)
+    # ถ้า cancel ตอนเขียนใน worker thread: append_logs ด้านล่างรอ _report_lock ต่อคิวเอง
+    log_writer_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await log_writer_task
+    pending = _drain_log_queue(log_queue, [])
+    while pending:
+        append_logs(pending)
+        pending = _drain_log_queue(log_queue, [])
     robot.shutdown()
 
 
@@ -1528,6 +1600,166 @@ class ManualCommandRequest(BaseModel):
     params: Optional[dict] = None
 
 
+# Manual command handlers - exact-match commands take no argument,
+# prefix commands receive the full (upper-cased) command string.
+# Commands are written as pre-encoded bytes (send_cmd_bytes) to skip
+# per-request f-string formatting and encoding.
+
+async def _manual_move_forward():
+    robot.brain.send_cmd_bytes(b"DRIVE_FW\n")
+    robot.say("moving")
+    return {"success": True, "message": "กำลังเดินหน้า"}
+
+
+async def _manual_move_backward():
+    robot.brain.send_cmd_bytes(b"DRIVE_BW\n")
+    return {"success": True, "message": "กำลังถอยหลัง"}
+
+
+async def _manual_move_left():
+    robot.brain.send_cmd_bytes(b"TURN_LEFT\n")
+    return {"success": True, "message": "กำลังเลี้ยวซ้าย"}
+
+
+async def _manual_move_right():
+    robot.brain.send_cmd_bytes(b"TURN_RIGHT\n")
+    return {"success": True, "message": "กำลังเลี้ยวขวา"}
+
+
+async def _manual_move_stop():
+    robot.brain.send_cmd_bytes(b"DRIVE_STOP\n")
+    return {"success": True, "message": "หยุดแล้ว"}
+
+
+async def _manual_y_up():
+    robot.brain.send_cmd_bytes(b"ACT:Y_UP\n")
+    return {"success": True, "message": "ยกหัวพ่นขึ้น"}
+
+
+async def _manual_y_down():
+    robot.brain.send_cmd_bytes(b"ACT:Y_DOWN\n")
+    return {"success": True, "message": "วางหัวพ่นลง"}
+
+
+async def _manual_pump_on():
+    robot.brain.send_cmd_bytes(b"PUMP_ON\n")
+    return {"success": True, "message": "เปิดปั๊ม"}
+
+
+async def _manual_pump_off():
+    robot.brain.send_cmd_bytes(b"PUMP_OFF\n")
+    return {"success": True, "message": "ปิดปั๊ม"}
+
+
+async def _manual_stop_all():
+    robot.brain.send_cmd_bytes(b"STOP_ALL\n")
+    robot.is_running = False
+    robot.status.state = "Stopped"
+    robot.say("stopped")
+    
+    queue_log(LogEntry(
+        timestamp=datetime.now().isoformat(),
+        event="MANUAL_STOP",
+        details="Emergency stop via manual control"
+    ))
+    
+    return {"success": True, "message": "หยุดฉุกเฉินทุกระบบ"}
+
+
+async def _manual_us_get_dist():
+    robot.brain.send_cmd_bytes(b"US_GET_DIST\n")
+    return {"success": True, "message": "อ่านค่า Ultrasonic"}
+
+
+async def _manual_move_fw_timed(cmd: str):
+    """MOVE_FW:<sec> - เดินหน้าตามเวลาแล้วหยุด"""
+    duration = float(cmd.split(":")[1])
+    robot.brain.send_cmd_bytes(b"DRIVE_FW\n")
+    robot.say("moving")
+    await asyncio.sleep(duration)
+    robot.brain.send_cmd_bytes(b"DRIVE_STOP\n")
+    return {"success": True, "message": f"เดินหน้า {duration} วินาที เสร็จแล้ว"}
+
+
+async def _manual_move_bw_timed(cmd: str):
+    """MOVE_BW:<sec> - ถอยหลังตามเวลาแล้วหยุด"""
+    duration = float(cmd.split(":")[1])
+    robot.brain.send_cmd_bytes(b"DRIVE_BW\n")
+    await asyncio.sleep(duration)
+    robot.brain.send_cmd_bytes(b"DRIVE_STOP\n")
+    return {"success": True, "message": f"ถอยหลัง {duration} วินาที เสร็จแล้ว"}
+
+
+async def _manual_z_out(cmd: str):
+    duration = cmd.split(":")[2]
+    robot.brain.send_cmd_bytes(b"ACT:Z_OUT:" + duration.encode() + b"\n")
+    robot.say("arm_extend")
+    return {"success": True, "message": f"ยืดแขน {duration} วินาที"}
+
+
+async def _manual_z_in(cmd: str):
+    duration = cmd.split(":")[2]
+    robot.brain.send_cmd_bytes(b"ACT:Z_IN:" + duration.encode() + b"\n")
+    robot.say("arm_retract")
+    return {"success": True, "message": f"หดแขน {duration} วินาที"}
+
+
+async def _manual_y_up_timed(cmd: str):
+    duration = cmd.split(":")[1]
+    robot.brain.send_cmd_bytes(b"Y_UP:" + duration.encode() + b"\n")
+    return {"success": True, "message": f"ยกหัวพ่นขึ้น {duration} วินาที"}
+
+
+async def _manual_y_down_timed(cmd: str):
+    duration = cmd.split(":")[1]
+    robot.brain.send_cmd_bytes(b"Y_DOWN:" + duration.encode() + b"\n")
+    return {"success": True, "message": f"วางหัวพ่นลง {duration} วินาที"}
+
+
+async def _manual_spray(cmd: str):
+    duration = cmd.split(":")[2]
+    robot.brain.send_cmd_bytes(b"ACT:SPRAY:" + duration.encode() + b"\n")
+    robot.say("spraying")
+    robot.status.spray_count += 1
+    robot._save_status()
+    
+    # Log spray event
+    queue_log(LogEntry(
+        timestamp=datetime.now().isoformat(),
+        event="MANUAL_SPRAY",
+        details=f"Manual spray for {duration}s"
+    ))
+    
+    return {"success": True, "message": f"พ่นยา {duration} วินาที"}
+
+
+# Exact-match commands: one dict lookup per request
+_MANUAL_EXACT = {
+    "MOVE_FORWARD": _manual_move_forward,
+    "MOVE_BACKWARD": _manual_move_backward,
+    "MOVE_LEFT": _manual_move_left,
+    "MOVE_RIGHT": _manual_move_right,
+    "MOVE_STOP": _manual_move_stop,
+    "ACT:Y_UP": _manual_y_up,
+    "ACT:Y_DOWN": _manual_y_down,
+    "PUMP_ON": _manual_pump_on,
+    "PUMP_OFF": _manual_pump_off,
+    "STOP_ALL": _manual_stop_all,
+    "US_GET_DIST": _manual_us_get_dist,
+}
+
+# Parameterised commands: scanned only when the exact lookup misses
+_MANUAL_PREFIX = (
+    ("MOVE_FW:", _manual_move_fw_timed),
+    ("MOVE_BW:", _manual_move_bw_timed),
+    ("ACT:Z_OUT:", _manual_z_out),
+    ("ACT:Z_IN:", _manual_z_in),
+    ("Y_UP:", _manual_y_up_timed),
+    ("Y_DOWN:", _manual_y_down_timed),
+    ("ACT:SPRAY:", _manual_spray),
+)
+
+
 @app.post("/api/manual")
 async def manual_control(request: ManualCommandRequest):
     """
@@ -1536,9 +1768,12 @@ async def manual_control(request: ManualCommandRequest):
     
     Commands:
     - Movement: MOVE_FORWARD, MOVE_BACKWARD, MOVE_LEFT, MOVE_RIGHT, MOVE_STOP
+    - Timed movement: MOVE_FW:<sec>, MOVE_BW:<sec>
     - Arm Z: ACT:Z_OUT:<sec>, ACT:Z_IN:<sec>
-    - Arm Y: ACT:Y_UP, ACT:Y_DOWN
+    - Arm Y: ACT:Y_UP, ACT:Y_DOWN, Y_UP:<sec>, Y_DOWN:<sec>
     - Spray: ACT:SPRAY:<sec>
+    - Pump: PUMP_ON, PUMP_OFF
+    - Ultrasonic: US_GET_DIST
     - Emergency: STOP_ALL
     """
     cmd = request.command.upper()
@@ -1551,125 +1786,15 @@ async def manual_control(request: ManualCommandRequest):
         return {"success": False, "error": "Robot brain ไม่พร้อมใช้งาน"}
     
     try:
-        # Movement commands
-        if cmd == "MOVE_FORWARD":
-            robot.brain.send_cmd("DRIVE_FW")
-            robot.say("moving")
-            return {"success": True, "message": "กำลังเดินหน้า"}
-        
-        elif cmd == "MOVE_BACKWARD":
-            robot.brain.send_cmd("DRIVE_BW")
-            return {"success": True, "message": "กำลังถอยหลัง"}
-        
-        elif cmd == "MOVE_LEFT":
-            robot.brain.send_cmd("TURN_LEFT")
-            return {"success": True, "message": "กำลังเลี้ยวซ้าย"}
-        
-        elif cmd == "MOVE_RIGHT":
-            robot.brain.send_cmd("TURN_RIGHT")
-            return {"success": True, "message": "กำลังเลี้ยวขวา"}
-        
-        elif cmd == "MOVE_STOP":
-            robot.brain.send_cmd("DRIVE_STOP")
-            return {"success": True, "message": "หยุดแล้ว"}
-        
-        # Timed Movement commands (MOVE_FW:duration, MOVE_BW:duration)
-        elif cmd.startswith("MOVE_FW:"):
-            duration = float(cmd.split(":")[1])
-            robot.brain.send_cmd("DRIVE_FW")
-            robot.say("moving")
-            await asyncio.sleep(duration)
-            robot.brain.send_cmd("DRIVE_STOP")
-            return {"success": True, "message": f"เดินหน้า {duration} วินาที เสร็จแล้ว"}
-        
-        elif cmd.startswith("MOVE_BW:"):
-            duration = float(cmd.split(":")[1])
-            robot.brain.send_cmd("DRIVE_BW")
-            await asyncio.sleep(duration)
-            robot.brain.send_cmd("DRIVE_STOP")
-            return {"success": True, "message": f"ถอยหลัง {duration} วินาที เสร็จแล้ว"}
+        handler = _MANUAL_EXACT.get(cmd)
+        if handler is not None:
+            return await handler()
         
-        # Arm Z commands
-        elif cmd.startswith("ACT:Z_OUT:"):
-            duration = cmd.split(":")[2]
-            robot.brain.send_cmd(f"ACT:Z_OUT:{duration}")
-            robot.say("arm_extend")
-            return {"success": True, "message": f"ยืดแขน {duration} วินาที"}
+        for prefix, prefix_handler in _MANUAL_PREFIX:
+            if cmd.startswith(prefix):
+                return await prefix_handler(cmd)
         
-        elif cmd.startswith("ACT:Z_IN:"):
-            duration = cmd.split(":")[2]
-            robot.brain.send_cmd(f"ACT:Z_IN:{duration}")
-            robot.say("arm_retract")
-            return {"success": True, "message": f"หดแขน {duration} วินาที"}
-        
-        # Arm Y commands
-        elif cmd == "ACT:Y_UP":
-            robot.brain.send_cmd("ACT:Y_UP")
-            return {"success": True, "message": "ยกหัวพ่นขึ้น"}
-        
-        elif cmd == "ACT:Y_DOWN":
-            robot.brain.send_cmd("ACT:Y_DOWN")
-            return {"success": True, "message": "วางหัวพ่นลง"}
-        
-        # Arm Y with duration (Y_UP:<seconds>, Y_DOWN:<seconds>)
-        elif cmd.startswith("Y_UP:"):
-            duration = cmd.split(":")[1]
-            robot.brain.send_cmd(f"Y_UP:{duration}")
-            return {"success": True, "message": f"ยกหัวพ่นขึ้น {duration} วินาที"}
-        
-        elif cmd.startswith("Y_DOWN:"):
-            duration = cmd.split(":")[1]
-            robot.brain.send_cmd(f"Y_DOWN:{duration}")
-            return {"success": True, "message": f"วางหัวพ่นลง {duration} วินาที"}
-        
-        # Spray command
-        elif cmd.startswith("ACT:SPRAY:"):
-            duration = cmd.split(":")[2]
-            robot.brain.send_cmd(f"ACT:SPRAY:{duration}")
-            robot.say("spraying")
-            robot.status.spray_count += 1
-            robot._save_status()
-            
-            # Log spray event
-            append_log(LogEntry(
-                timestamp=datetime.now().isoformat(),
-                event="MANUAL_SPRAY",
-                details=f"Manual spray for {duration}s"
-            ))
-            
-            return {"success": True, "message": f"พ่นยา {duration} วินาที"}
-        
-        # Pump direct control
-        elif cmd == "PUMP_ON":
-            robot.brain.send_cmd("PUMP_ON")
-            return {"success": True, "message": "เปิดปั๊ม"}
-        
-        elif cmd == "PUMP_OFF":
-            robot.brain.send_cmd("PUMP_OFF")
-            return {"success": True, "message": "ปิดปั๊ม"}
-        
-        # Emergency stop
-        elif cmd == "STOP_ALL":
-            robot.brain.send_cmd("STOP_ALL")
-            robot.is_running = False
-            robot.status.state = "Stopped"
-            robot.say("stopped")
-            
-            append_log(LogEntry(
-                timestamp=datetime.now().isoformat(),
-                event="MANUAL_STOP",
-                details="Emergency stop via manual control"
-            ))
-            
-            return {"success": True, "message": "หยุดฉุกเฉินทุกระบบ"}
-        
-        # Ultrasonic read
-        elif cmd == "US_GET_DIST":
-            robot.brain.send_cmd("US_GET_DIST")
-            return {"success": True, "message": "อ่านค่า Ultrasonic"}
-        
-        else:
-            return {"success": False, "error": f"Unknown command: {cmd}"}
+        return {"success": False, "error": f"Unknown command: {cmd}"}
     
     except Exception as e:
         print(f"❌ Manual control error: {e}")
@@ -1684,6 +1809,48 @@ class DeviceStatus:
     WARNING = "warning"
     ERROR = "error"
 
+# US_GET_DIST_BIN response length: b"D" + 3 x uint16
+US_DIST_FRAME_SIZE = 7
+
+# Camera frame younger than this counts as a live camera (no extra capture)
+CAMERA_FRAME_FRESH_SEC = 1.0
+
+# ESP32 Serial.println() terminates lines with CRLF
+PONG_TOKEN = b"PONG\r\n"
+
+
+@contextmanager
+def _serial_timeout(ser, seconds: float):
+    """ตั้ง read timeout ของ serial ชั่วคราว แล้วคืนค่าเดิม"""
+    prev_timeout = ser.timeout
+    ser.timeout = seconds
+    try:
+        yield ser
+    finally:
+        ser.timeout = prev_timeout
+
+
+@contextmanager
+def _serial_session(wait: float = 0.5):
+    """
+    ถือ serial_lock ของ RobotBrain ระหว่าง probe (กันชนกับ mission thread)
+    
+    ล้าง RX buffer เฉพาะเมื่อมีข้อมูลค้าง (rx_dirty) แทนการ
+    reset_input_buffer() ทุกครั้ง; ถ้า probe ล้มเหลวจะ mark dirty ไว้
+    """
+    brain = robot.brain
+    if not brain.serial_lock.acquire(timeout=wait):
+        raise TimeoutError("ESP32 กำลังทำงานอยู่")
+    try:
+        brain.drain_input()
+        yield brain.ser
+    except Exception:
+        brain.rx_dirty = True
+        raise
+    finally:
+        brain.serial_lock.release()
+
+
 def create_device_result(status: str, message: str, details: dict = None) -> dict:
     """สร้างผลลัพธ์สำหรับอุปกรณ์"""
     result = {"status": status, "message": message}
@@ -1692,35 +1859,116 @@ def create_device_result(status: str, message: str, details: dict = None) -> dic
     return result
 
 
+# Constant device results - shared across responses, treat as read-only
+_RESULT_ESP32_DISCONNECTED = create_device_result(
+    DeviceStatus.ERROR,
+    "ไม่ได้เชื่อมต่อ",
+    {"suggestion": "ตรวจสอบสาย USB และ port /dev/ttyUSB0"}
+)
+_RESULT_CAMERA_MISSING = create_device_result(
+    DeviceStatus.ERROR,
+    "ไม่พบกล้อง",
+    {"suggestion": "ตรวจสอบการเชื่อมต่อ USB กล้อง"}
+)
+_RESULT_NEEDS_ESP32 = create_device_result(DeviceStatus.ERROR, "ต้องเชื่อมต่อ ESP32")
+_RESULT_US_BAD_FORMAT = create_device_result(DeviceStatus.WARNING, "รูปแบบข้อมูลผิด")
+_RESULT_US_NO_DATA = create_device_result(DeviceStatus.WARNING, "ไม่ได้รับข้อมูล")
+
+# Motors/pump assumed ready whenever ESP32 is connected
+_ESP32_READY_RESULTS = {
+    "motor_left": create_device_result(DeviceStatus.OK, "พร้อมใช้งาน"),
+    "motor_right": create_device_result(DeviceStatus.OK, "พร้อมใช้งาน"),
+    "motor_z": create_device_result(DeviceStatus.OK, "พร้อมใช้งาน (แกน Z)"),
+    "motor_y": create_device_result(DeviceStatus.OK, "พร้อมใช้งาน (แกน Y)"),
+    "pump": create_device_result(DeviceStatus.OK, "พร้อมใช้งาน"),
+}
+
+# ESP32 not connected - all hardware unavailable
+_ALL_DISCONNECTED_RESULTS = {
+    name: _RESULT_NEEDS_ESP32
+    for name in (
+        "motor_left", "motor_right", "motor_z", "motor_y", "pump",
+        "ultrasonic_front", "ultrasonic_y", "ultrasonic_right",
+    )
+}
+
+
+# Probes currently running, keyed by endpoint (single-flight)
+_inflight: dict = {}
+
+
+async def _singleflight(key: str, coro_factory):
+    """
+    รวม request ที่เข้ามาพร้อมกันให้รอผล probe ชุดเดียวกัน
+    
+    caller แรกสร้าง task, caller ถัดไป await task เดิมจนกว่าจะเสร็จ
+    (await ผ่าน shield: caller ที่ถูก cancel ไม่ทำให้ task ที่คนอื่นรออยู่ถูก cancel ด้วย)
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = _inflight[key] = asyncio.create_task(coro_factory())
+        task.add_done_callback(lambda t: _forget_inflight(key, t))
+    return await asyncio.shield(task)
+
+
+def _forget_inflight(key: str, task: asyncio.Task):
+    """ลบ task ที่เสร็จแล้ว (สำเร็จ / error / cancel) ออกจาก _inflight - ไม่ถูกใช้ซ้ำ"""
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled():
+        task.exception()  # ถ้าทุก caller ถูก cancel ไปแล้ว ไม่ให้ขึ้น "exception was never retrieved"
+
+
+def _read_us_frame(ser, timeout: float = 2.0) -> bytes:
+    """
+    อ่าน binary frame ของ US_GET_DIST_BIN (b"D" + 3 x uint16)
+    
+    ข้ามบรรทัด log ที่ ESP32 ส่งค้างไว้ก่อน frame (resync ที่ marker b"D" ซึ่งต้องอยู่ต้นบรรทัด
+    ไม่ใช่ตัว D กลางข้อความ); คืน b"" ถ้าไม่เจอ marker ก่อน timeout
+    """
+    deadline = time.monotonic() + timeout
+    at_line_start = True
+    with _serial_timeout(ser, timeout):
+        while time.monotonic() < deadline:
+            skipped = ser.read_until(b"D")
+            if not skipped.endswith(b"D"):
+                return b""
+            if (at_line_start and len(skipped) == 1) or skipped[-2:-1] == b"\n":
+                return b"D" + ser.read(US_DIST_FRAME_SIZE - 1)
+            at_line_start = False
+    return b""
+
+
 @app.get("/api/health")
 async def get_health_status():
     """
     GET /api/health
     ตรวจสอบสถานะอุปกรณ์ทั้งหมด
     """
+    return await _singleflight("health", lambda: asyncio.to_thread(_probe_health))
+
+
+def _probe_health() -> dict:
+    """อ่านสถานะอุปกรณ์ทั้งหมด (blocking - รันใน worker thread)"""
     results = {}
     
     # 1. ESP32 Connection
     if robot.esp32_connected and robot.brain:
         try:
             # Send PING to check connection
-            start_time = time.time()
-            robot.brain.ser.reset_input_buffer()
-            robot.brain.ser.write(b"PING\n")
-            
-            # Wait for PONG
-            response = ""
-            timeout = time.time() + 2
-            while time.time() < timeout:
-                if robot.brain.ser.in_waiting > 0:
-                    response = robot.brain.ser.readline().decode().strip()
-                    if response == "PONG":
-                        break
-                time.sleep(0.01)
+            start_time = time.monotonic()
+            with _serial_session() as ser:
+                ser.write(b"PING\n")
+                
+                # Wait for PONG - read_until returns as soon as the token lands
+                with _serial_timeout(ser, 2):
+                    data = ser.read_until(PONG_TOKEN)
+                if not data.endswith(PONG_TOKEN):
+                    robot.brain.rx_dirty = True
             
-            latency = int((time.time() - start_time) * 1000)
+            latency = int((time.monotonic() - start_time) * 1000)
             
-            if response == "PONG":
+            if data.endswith(PONG_TOKEN):
                 results["esp32"] = create_device_result(
                     DeviceStatus.OK, 
                     f"เชื่อมต่อแล้ว ({latency}ms)",
@@ -1734,18 +1982,21 @@ async def get_health_status():
         except Exception as e:
             results["esp32"] = create_device_result(DeviceStatus.ERROR, f"ข้อผิดพลาด: {str(e)}")
     else:
-        results["esp32"] = create_device_result(
-            DeviceStatus.ERROR,
-            "ไม่ได้เชื่อมต่อ",
-            {"suggestion": "ตรวจสอบสาย USB และ port /dev/ttyUSB0"}
-        )
+        results["esp32"] = _RESULT_ESP32_DISCONNECTED
     
     # 2. Camera
     if robot.camera_connected and robot.detector:
         try:
-            frame = robot.detector.capture_frame()
-            if frame is not None:
-                h, w = frame.shape[:2]
+            # ใช้เฟรมล่าสุดจาก detection/stream loop ถ้ายังใหม่อยู่
+            detector = robot.detector
+            if time.monotonic() - detector.last_frame_ts < CAMERA_FRAME_FRESH_SEC:
+                shape = detector.last_frame_shape
+            else:
+                frame = detector.capture_frame()
+                shape = frame.shape if frame is not None else None
+            
+            if shape is not None:
+                h, w = shape[:2]
                 results["camera"] = create_device_result(
                     DeviceStatus.OK,
                     f"พร้อมใช้งาน ({w}x{h})"
@@ -1758,79 +2009,64 @@ async def get_health_status():
         except Exception as e:
             results["camera"] = create_device_result(DeviceStatus.ERROR, f"ข้อผิดพลาด: {str(e)}")
     else:
-        results["camera"] = create_device_result(
-            DeviceStatus.ERROR,
-            "ไม่พบกล้อง",
-            {"suggestion": "ตรวจสอบการเชื่อมต่อ USB กล้อง"}
-        )
+        results["camera"] = _RESULT_CAMERA_MISSING
     
     # 3. Motors (ถ้า ESP32 เชื่อมต่อ)
     if robot.esp32_connected:
         # Motor Left/Right assumed ready if ESP32 is connected
-        results["motor_left"] = create_device_result(DeviceStatus.OK, "พร้อมใช้งาน")
-        results["motor_right"] = create_device_result(DeviceStatus.OK, "พร้อมใช้งาน")
-        results["motor_z"] = create_device_result(DeviceStatus.OK, "พร้อมใช้งาน (แกน Z)")
-        results["motor_y"] = create_device_result(DeviceStatus.OK, "พร้อมใช้งาน (แกน Y)")
-        results["pump"] = create_device_result(DeviceStatus.OK, "พร้อมใช้งาน")
+        results.update(_ESP32_READY_RESULTS)
         
         # 4. Ultrasonic Sensors - read actual values
+        # Binary frame: b"D" + struct "<3H" (front, y, right in mm) = 7 bytes
         try:
-            robot.brain.ser.reset_input_buffer()
-            robot.brain.ser.write(b"US_GET_DIST\n")
-            
-            response = ""
-            timeout = time.time() + 2
-            while time.time() < timeout:
-                if robot.brain.ser.in_waiting > 0:
-                    response = robot.brain.ser.readline().decode().strip()
-                    if response.startswith("DIST:"):
-                        break
-                time.sleep(0.01)
+            with _serial_session() as ser:
+                ser.write(b"US_GET_DIST_BIN\n")
+                
+                buf = _read_us_frame(ser)
+                if len(buf) != US_DIST_FRAME_SIZE:
+                    robot.brain.rx_dirty = True
             
-            if response.startswith("DIST:"):
-                # Parse: DIST:front,yaxis,right
-                values = response[5:].split(",")
-                if len(values) >= 3:
-                    front, yaxis, right = float(values[0]), float(values[1]), float(values[2])
-                    
-                    def us_status(val, name):
-                        if val > 0 and val < 400:
-                            return create_device_result(DeviceStatus.OK, f"{val:.1f} cm")
-                        elif val == 0:
-                            return create_device_result(DeviceStatus.WARNING, "อ่านค่า 0 - อาจต่อผิด")
-                        else:
-                            return create_device_result(DeviceStatus.ERROR, "ค่าผิดปกติ")
-                    
-                    results["ultrasonic_front"] = us_status(front, "หน้า")
-                    results["ultrasonic_y"] = us_status(yaxis, "แกน Y")
-                    results["ultrasonic_right"] = us_status(right, "ขวา")
-                else:
-                    results["ultrasonic_front"] = create_device_result(DeviceStatus.WARNING, "รูปแบบข้อมูลผิด")
-                    results["ultrasonic_y"] = create_device_result(DeviceStatus.WARNING, "รูปแบบข้อมูลผิด")
-                    results["ultrasonic_right"] = create_device_result(DeviceStatus.WARNING, "รูปแบบข้อมูลผิด")
+            if len(buf) == US_DIST_FRAME_SIZE:
+                front_mm, y_mm, right_mm = struct.unpack_from("<3H", buf, 1)
+                front, yaxis, right = front_mm / 10.0, y_mm / 10.0, right_mm / 10.0
+                
+                def us_status(val, name):
+                    if val > 0 and val < 400:
+                        return create_device_result(DeviceStatus.OK, f"{val:.1f} cm")
+                    elif val == 0:
+                        return create_device_result(DeviceStatus.WARNING, "อ่านค่า 0 - อาจต่อผิด")
+                    else:
+                        return create_device_result(DeviceStatus.ERROR, "ค่าผิดปกติ")
+                
+                results["ultrasonic_front"] = us_status(front, "หน้า")
+                results["ultrasonic_y"] = us_status(yaxis, "แกน Y")
+                results["ultrasonic_right"] = us_status(right, "ขวา")
+            elif buf:
+                results["ultrasonic_front"] = _RESULT_US_BAD_FORMAT
+                results["ultrasonic_y"] = _RESULT_US_BAD_FORMAT
+                results["ultrasonic_right"] = _RESULT_US_BAD_FORMAT
             else:
-                results["ultrasonic_front"] = create_device_result(DeviceStatus.WARNING, "ไม่ได้รับข้อมูล")
-                results["ultrasonic_y"] = create_device_result(DeviceStatus.WARNING, "ไม่ได้รับข้อมูล")
-                results["ultrasonic_right"] = create_device_result(DeviceStatus.WARNING, "ไม่ได้รับข้อมูล")
+                results["ultrasonic_front"] = _RESULT_US_NO_DATA
+                results["ultrasonic_y"] = _RESULT_US_NO_DATA
+                results["ultrasonic_right"] = _RESULT_US_NO_DATA
         except Exception as e:
             results["ultrasonic_front"] = create_device_result(DeviceStatus.ERROR, str(e))
             results["ultrasonic_y"] = create_device_result(DeviceStatus.ERROR, str(e))
             results["ultrasonic_right"] = create_device_result(DeviceStatus.ERROR, str(e))
     else:
         # ESP32 not connected - all hardware unavailable
-        results["motor_left"] = create_device_result(DeviceStatus.ERROR, "ต้องเชื่อมต่อ ESP32")
-        results["motor_right"] = create_device_result(DeviceStatus.ERROR, "ต้องเชื่อมต่อ ESP32")
-        results["motor_z"] = create_device_result(DeviceStatus.ERROR, "ต้องเชื่อมต่อ ESP32")
-        results["motor_y"] = create_device_result(DeviceStatus.ERROR, "ต้องเชื่อมต่อ ESP32")
-        results["pump"] = create_device_result(DeviceStatus.ERROR, "ต้องเชื่อมต่อ ESP32")
-        results["ultrasonic_front"] = create_device_result(DeviceStatus.ERROR, "ต้องเชื่อมต่อ ESP32")
-        results["ultrasonic_y"] = create_device_result(DeviceStatus.ERROR, "ต้องเชื่อมต่อ ESP32")
-        results["ultrasonic_right"] = create_device_result(DeviceStatus.ERROR, "ต้องเชื่อมต่อ ESP32")
+        results.update(_ALL_DISCONNECTED_RESULTS)
     
     # Summary
-    ok_count = sum(1 for r in results.values() if r["status"] == DeviceStatus.OK)
-    warning_count = sum(1 for r in results.values() if r["status"] == DeviceStatus.WARNING)
-    error_count = sum(1 for r in results.values() if r["status"] == DeviceStatus.ERROR)
+    ok_count = warning_count = error_count = 0
+    for r in results.values():
+        status = r["status"]
+        if status == DeviceStatus.OK:
+            ok_count += 1
+        elif status == DeviceStatus.WARNING:
+            warning_count += 1
+        else:
+            error_count += 1
     
     return {
         "devices": results,
@@ -1888,25 +2124,31 @@ async def get_gpio_config():
     GET /api/gpio
     อ่านค่า GPIO configuration ปัจจุบันจาก ESP32
     """
+    return await _singleflight("gpio", lambda: asyncio.to_thread(_probe_gpio_config))
+
+
+def _probe_gpio_config() -> dict:
+    """ส่ง GPIO_GET แล้วรอคำตอบ (blocking - รันใน worker thread)"""
     if not robot.esp32_connected or not robot.brain:
         return {"success": False, "error": "ESP32 ไม่ได้เชื่อมต่อ"}
     
     try:
-        robot.brain.ser.reset_input_buffer()
-        robot.brain.ser.write(b"GPIO_GET\n")
-        
-        response = ""
-        timeout = time.time() + 2
-        while time.time() < timeout:
-            if robot.brain.ser.in_waiting > 0:
-                line = robot.brain.ser.readline().decode().strip()
-                if line.startswith("GPIO:"):
-                    response = line[5:]  # Remove "GPIO:" prefix
-                    break
-            time.sleep(0.01)
+        with _serial_session() as ser:
+            ser.write(b"GPIO_GET\n")
+            
+            response = ""
+            deadline = time.monotonic_ns() + 2_000_000_000
+            while time.monotonic_ns() < deadline:
+                if ser.in_waiting > 0:
+                    line = ser.readline().decode().strip()
+                    if line.startswith("GPIO:"):
+                        response = line[5:]  # Remove "GPIO:" prefix
+                        break
+                time.sleep(0.01)
+            else:
+                robot.brain.rx_dirty = True
         
         if response:
-            import json
             config = json.loads(response)
             return {"success": True, "config": config}
         else:
@@ -1935,24 +2177,31 @@ async def swap_gpio_group(group: str):
     if group not in swap_commands:
         return {"success": False, "error": f"ไม่รู้จักกลุ่ม: {group}. ใช้ได้: motor_yz, wheels"}
     
-    cmd = swap_commands[group]
-    
+    return await asyncio.to_thread(_send_gpio_swap, group, swap_commands[group])
+
+
+def _send_gpio_swap(group: str, cmd: str) -> dict:
+    """ส่งคำสั่งสลับ GPIO แล้วรอคำตอบ (blocking - รันใน worker thread)"""
     try:
-        robot.brain.ser.reset_input_buffer()
-        robot.brain.ser.write(f"{cmd}\n".encode())
-        
-        # Wait for response
-        response = ""
-        timeout = time.time() + 3
-        while time.time() < timeout:
-            if robot.brain.ser.in_waiting > 0:
-                line = robot.brain.ser.readline().decode().strip()
-                if line.startswith("GPIO:"):
-                    response = line
-                    break
-                elif line == "DONE":
-                    break
-            time.sleep(0.01)
+        with _serial_session() as ser:
+            ser.write(f"{cmd}\n".encode())
+            
+            # Wait for response
+            response = ""
+            deadline = time.monotonic_ns() + 3_000_000_000
+            while time.monotonic_ns() < deadline:
+                if ser.in_waiting > 0:
+                    line = ser.readline().decode().strip()
+                    if line.startswith("GPIO:"):
+                        # DONE อาจตามมาหลัง GPIO: - ให้ probe ถัดไปล้างทิ้ง
+                        response = line
+                        robot.brain.rx_dirty = True
+                        break
+                    elif line == "DONE":
+                        break
+                time.sleep(0.01)
+            else:
+                robot.brain.rx_dirty = True
         
         return {
             "success": True, 
@@ -1973,18 +2222,25 @@ async def reset_gpio_config():
     if not robot.esp32_connected or not robot.brain:
         return {"success": False, "error": "ESP32 ไม่ได้เชื่อมต่อ"}
     
+    return await asyncio.to_thread(_send_gpio_reset)
+
+
+def _send_gpio_reset() -> dict:
+    """ส่ง GPIO_RESET แล้วรอ DONE (blocking - รันใน worker thread)"""
     try:
-        robot.brain.ser.reset_input_buffer()
-        robot.brain.ser.write(b"GPIO_RESET\n")
-        
-        # Wait for DONE
-        timeout = time.time() + 3
-        while time.time() < timeout:
-            if robot.brain.ser.in_waiting > 0:
-                line = robot.brain.ser.readline().decode().strip()
-                if line == "DONE":
-                    break
-            time.sleep(0.01)
+        with _serial_session() as ser:
+            ser.write(b"GPIO_RESET\n")
+            
+            # Wait for DONE
+            deadline = time.monotonic_ns() + 3_000_000_000
+            while time.monotonic_ns() < deadline:
+                if ser.in_waiting > 0:
+                    line = ser.readline().decode().strip()
+                    if line == "DONE":
+                        break
+                time.sleep(0.01)
+            else:
+                robot.brain.rx_dirty = True
         
         return {
             "success": True,
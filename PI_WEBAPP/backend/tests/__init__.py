@@ -0,0 +1,8 @@
+"""
+Unit Tests สำหรับ AgriBot API Server
+
+Usage:
+    python -m pytest tests/ -v
+
+Author: AgriBot Team
+"""
@@ -0,0 +1,127 @@
+"""
+Test API Server helpers (ไม่ต้องต่อ ESP32 / กล้อง)
+"""
+import asyncio
+import struct
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import main
+
+
+class TestSingleflight:
+    """request ที่เข้ามาพร้อมกันใช้ probe ชุดเดียวกัน"""
+    
+    def test_cancelled_caller_does_not_cancel_others(self):
+        calls = []
+        release = threading.Event()
+        
+        def probe():
+            calls.append(1)
+            release.wait(2)
+            return {"ok": True}
+        
+        async def scenario():
+            factory = lambda: asyncio.to_thread(probe)
+            first = asyncio.create_task(main._singleflight("test", factory))
+            second = asyncio.create_task(main._singleflight("test", factory))
+            await asyncio.sleep(0.05)
+            
+            first.cancel()
+            await asyncio.sleep(0)
+            release.set()
+            
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+        
+        assert asyncio.run(scenario()) == {"ok": True}
+        assert len(calls) == 1
+        assert "test" not in main._inflight
+    
+    def test_failed_probe_is_not_reused(self):
+        results = iter([RuntimeError("serial lost"), {"ok": True}])
+        
+        async def probe():
+            result = next(results)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        
+        async def scenario():
+            with pytest.raises(RuntimeError):
+                await main._singleflight("test", probe)
+            return await main._singleflight("test", probe)
+        
+        assert asyncio.run(scenario()) == {"ok": True}
+
+
+class TestQueueLog:
+    """log จาก mission thread และ API handler ผ่าน queue เดียวกัน เรียงตามลำดับที่ส่ง"""
+    
+    def test_thread_and_loop_entries_keep_order(self, monkeypatch):
+        written = []
+        monkeypatch.setattr(main, "append_logs", lambda entries: written.extend(e.event for e in entries))
+        monkeypatch.setattr(main, "LOG_FLUSH_INTERVAL", 0.01)
+        
+        def log(event):
+            main.queue_log(main.LogEntry(timestamp="", event=event))
+        
+        async def scenario():
+            monkeypatch.setattr(main, "_log_loop", asyncio.get_running_loop())
+            queue = asyncio.Queue()
+            monkeypatch.setattr(main, "_log_queue", queue)
+            writer = asyncio.create_task(main._log_writer(queue))
+            
+            await asyncio.to_thread(log, "MISSION_START")
+            log("MANUAL")
+            await asyncio.to_thread(log, "TARGET_SPRAYED")
+            await asyncio.sleep(0.1)
+            
+            writer.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await writer
+        
+        asyncio.run(scenario())
+        assert written == ["MISSION_START", "MANUAL", "TARGET_SPRAYED"]
+
+
+class FakeSerial:
+    """Serial ปลอม: read / read_until จาก buffer bytes (ไม่พอ = timeout คืนเท่าที่มี)"""
+    
+    def __init__(self, rx: bytes):
+        self.rx = rx
+        self.timeout = None
+    
+    def read(self, size):
+        data, self.rx = self.rx[:size], self.rx[size:]
+        return data
+    
+    def read_until(self, expected):
+        end = self.rx.find(expected)
+        end = len(self.rx) if end < 0 else end + len(expected)
+        return self.read(end)
+
+
+class TestReadUltrasonicFrame:
+    """US_GET_DIST_BIN: resync ที่ marker b"D" เมื่อมี log ค้างอยู่ก่อน frame"""
+    
+    FRAME = b"D" + struct.pack("<3H", 1234, 56, 0)
+    
+    def test_reads_clean_frame(self):
+        assert main._read_us_frame(FakeSerial(self.FRAME)) == self.FRAME
+    
+    def test_skips_queued_log_lines(self):
+        ser = FakeSerial(b"Motor Y: DOWN done\r\nReady\r\n" + self.FRAME)
+        assert main._read_us_frame(ser) == self.FRAME
+    
+    def test_no_marker_returns_empty(self):
+        assert main._read_us_frame(FakeSerial(b"ESP32 AgriBot Ready\r\n"), timeout=0.1) == b""
@@ -14,6 +14,13 @@
 // Global instance
 CommandHandler cmdHandler;
 
+// ระยะ (cm) → mm สำหรับ binary frame: ค่าติดลบ / error (NaN) ให้เป็น 0 (Pi จะแสดง "อ่านค่า 0")
+// แทนที่ cast ตรงๆ แล้ววนเป็น 6553.x cm
+static uint16_t distanceToMm(float cm) {
+    if (!(cm > 0)) return 0;
+    return (uint16_t)constrain(cm * 10.0f, 0.0f, 65535.0f);
+}
+
 void CommandHandler::init() {
     Serial.begin(SERIAL_BAUD_RATE);
     Serial.println("ESP32 AgriBot Ready");
@@ -173,6 +180,22 @@ void CommandHandler::processCommand(String command) {
         Serial.print(",");
         Serial.println(yAxis, 1);
     }
+    // Binary frame สำหรับ health check: 'D' + uint16 LE (mm) x3 = 7 bytes
+    // ลำดับ: front, y, right
+    else if (command == "US_GET_DIST_BIN") {
+        uint16_t mm[3] = {
+            distanceToMm(ultrasonics.getFrontDistance()),
+            distanceToMm(ultrasonics.getYDistance()),
+            distanceToMm(ultrasonics.getRightDistance())
+        };
+        uint8_t frame[7];
+        frame[0] = 'D';
+        for (int i = 0; i < 3; i++) {
+            frame[1 + i * 2] = mm[i] & 0xFF;
+            frame[2 + i * 2] = mm[i] >> 8;
+        }
+        Serial.write(frame, sizeof(frame));
+    }
     else if (command == "US_CHECK") {
         ObstacleDirection obstacle = ultrasonics.checkObstacles();
         Serial.print("OBSTACLE:");
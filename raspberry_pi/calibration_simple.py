@@ -14,39 +14,121 @@ Version: 2.1 (Raspberry Pi 5 Compatible)
 """
 
 import json
+import math
+import os
+import struct
+import sys
+import threading
+from operator import attrgetter
 from pathlib import Path
-from dataclasses import dataclass, asdict, field
+from dataclasses import dataclass, field, fields
 from datetime import datetime
-from typing import List, Optional, Tuple
-import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 
 try:
     import cv2
     CV2_AVAILABLE = True
+    FONT = cv2.FONT_HERSHEY_SIMPLEX
 except ImportError:
     CV2_AVAILABLE = False
     print("⚠️ OpenCV not available. Camera features disabled.")
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 
 # ==================== CONFIG ====================
 CONFIG_FILE = Path(__file__).parent / "calibration.json"
 
+# path -> ((st_mtime_ns, st_size, st_ino), ค่า field ที่ parse แล้ว) - CalibrationData.load ไม่ต้องอ่านไฟล์ซ้ำ
+_load_cache: Dict[Path, Tuple[Tuple[int, int, int], dict]] = {}
+
+
+def _file_key(filepath: Path) -> Tuple[int, int, int]:
+    """
+    ตัวบอกว่าไฟล์เปลี่ยนหรือยัง: mtime อย่างเดียวไม่พอ (timestamp ของ ext4/FAT หยาบ
+    เขียนทับใน tick เดียวกันจะไม่เห็น) - size จับการแก้ที่ความยาวเปลี่ยน,
+    inode จับ os.replace (ไฟล์ใหม่ inode ใหม่เสมอ)
+    """
+    st = filepath.stat()
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+# Overlay colors (BGR)
+COLOR_YELLOW = (0, 255, 255)
+COLOR_GREEN = (0, 255, 0)
+COLOR_ORANGE = (0, 165, 255)
+COLOR_RED = (0, 0, 255)
+COLOR_MAGENTA = (255, 0, 255)
+COLOR_WHITE = (255, 255, 255)
+COLOR_GRAY = (100, 100, 100)
 
-@dataclass
-class MeasurementPoint:
-    """จุดที่วัด"""
-    position: str          # "near", "center", "far"
-    pixel_distance: float  # ระยะใน pixel
-    real_distance_cm: float  # ระยะจริง cm
-    pixel_to_cm: float = 0.0  # คำนวณแล้ว
+
+def _pix_dist(p1: Tuple[int, int], p2: Tuple[int, int]) -> float:
+    """ระยะห่างระหว่าง 2 จุด (pixel)"""
+    dx = p2[0] - p1[0]
+    dy = p2[1] - p1[1]
+    return (dx * dx + dy * dy) ** 0.5
+
+
+class _FrameGrabber(threading.Thread):
+    """
+    อ่านเฟรมจากกล้องใน thread แยก เก็บเฉพาะเฟรมล่าสุด (latest-wins)
+    
+    ใช้ buffer จองไว้ 3 ชุดวนกัน (cap.read(buf) เขียนทับ ไม่ต้อง allocate ทุกเฟรม):
+    ชุดที่ UI กำลังวาด, ชุดล่าสุดที่รอ UI มาเอา และชุดที่กำลังอ่านจากกล้อง
+    """
     
-    def calculate(self):
-        if self.pixel_distance > 0:
-            self.pixel_to_cm = self.real_distance_cm / self.pixel_distance
-        return self.pixel_to_cm
+    NUM_BUFFERS = 3
+    
+    def __init__(self, cap, width: int, height: int):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self._buffers = [np.empty((height, width, 3), dtype=np.uint8)
+                         for _ in range(self.NUM_BUFFERS)]
+        self._latest: Optional[int] = None   # index ของเฟรมใหม่ที่ยังไม่ถูกอ่าน
+        self._held: Optional[int] = None     # index ที่ UI ถืออยู่
+        self._lock = threading.Lock()
+        self._new_frame = threading.Event()
+        self._stop_event = threading.Event()
+    
+    def run(self):
+        while not self._stop_event.is_set():
+            with self._lock:
+                idx = next(i for i in range(self.NUM_BUFFERS)
+                           if i != self._latest and i != self._held)
+            ret, frame = self.cap.read(self._buffers[idx])
+            if not ret:
+                print("⚠️ Cannot read frame")
+                break
+            with self._lock:
+                # ถ้าขนาดเฟรมจริงไม่ตรง OpenCV จะ allocate ใหม่ - เก็บอันนั้นไว้ใช้ต่อ
+                self._buffers[idx] = frame
+                self._latest = idx
+            self._new_frame.set()
+    
+    def get(self, timeout: float = 0.1):
+        """
+        Return the newest unread frame, or None if none arrived within timeout.
+        The frame stays valid (not overwritten) until the next get() call.
+        """
+        if not self._new_frame.wait(timeout):
+            return None
+        with self._lock:
+            self._held, self._latest = self._latest, None
+            self._new_frame.clear()
+            return self._buffers[self._held]
+    
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=1.0)
 
 
-@dataclass 
+@dataclass(slots=True)
 class CalibrationData:
     """ค่า Calibration ทั้งหมด"""
     
@@ -87,21 +169,80 @@ class CalibrationData:
     notes: str = ""
     
     def to_dict(self):
-        return asdict(self)
+        # ทุก field เป็น scalar - สร้าง dict จากชื่อ field ที่ cache ไว้ แทน asdict() (ไม่ต้อง deepcopy/fields())
+        return dict(zip(self._FIELD_NAMES, self._GET_FIELDS(self)))
+    
+    def to_json(self) -> str:
+        """JSON (indent=2) จาก template ที่สร้างไว้ตอน import - escape เฉพาะ field ที่เป็น string"""
+        values = self.to_dict()
+        for name in self._NUMERIC_FIELDS:
+            v = values[name]
+            if (type(v) is not int and type(v) is not float) or not math.isfinite(v):
+                # ค่าแปลก (แก้ไฟล์เอง/NaN) → ให้ json จัดการตามปกติ
+                return json.dumps(values, indent=2, ensure_ascii=False)
+        for name in self._STR_FIELDS:
+            values[name] = json.dumps(values[name], ensure_ascii=False)
+        return self._JSON_TEMPLATE.format_map(values)
     
     def save(self, filepath: Path = CONFIG_FILE):
         self.calibrated_at = datetime.now().isoformat()
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        self.save_atomic(filepath)
         print(f"\n✅ บันทึกไปที่: {filepath}")
     
+    def save_atomic(self, filepath: Path = CONFIG_FILE):
+        """
+        เขียนไฟล์ .tmp ด้วย os.write ครั้งเดียว แล้ว os.replace ทับของเดิม
+        - ไฟล์จริงไม่มีวันถูกเขียนค้างครึ่งๆ (ไฟดับ/หลุดกลางทาง robot_brain ยังโหลดค่าเดิมได้)
+        """
+        tmp_path = filepath.with_name(filepath.name + ".tmp")
+        payload = self.to_json().encode('utf-8')
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, payload)
+            os.fsync(fd)  # ให้ข้อมูลลง SD card ก่อน rename
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, filepath)
+        _load_cache[filepath] = (_file_key(filepath), self.to_dict())
+    
     @classmethod
     def load(cls, filepath: Path = CONFIG_FILE):
-        if filepath.exists():
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return cls(**{k: v for k, v in data.items() if k in cls.__dataclass_fields__})
-        return cls()
+        try:
+            file_key = _file_key(filepath)
+        except FileNotFoundError:
+            return cls()
+        
+        # ไฟล์ไม่เปลี่ยนตั้งแต่อ่านครั้งก่อน → ใช้ค่าที่ parse ไว้แล้ว
+        cached = _load_cache.get(filepath)
+        if cached is not None and cached[0] == file_key:
+            values = cached[1]
+        else:
+            if ORJSON_AVAILABLE:
+                data = orjson.loads(filepath.read_bytes())
+            else:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            defaults = cls._DEFAULTS
+            values = {**defaults, **{k: v for k, v in data.items() if k in defaults}}
+            _load_cache[filepath] = (file_key, values)
+        
+        # ข้าม __init__: ตั้งค่าทุก field ตรงๆ (object ใหม่ทุกครั้ง แก้ไขได้ไม่กระทบ cache)
+        obj = cls.__new__(cls)
+        for name, value in values.items():
+            setattr(obj, name, value)
+        return obj
+
+
+# ชื่อ field และค่า default (คำนวณครั้งเดียว ใช้ใน to_dict / load)
+CalibrationData._FIELD_NAMES = tuple(CalibrationData.__dataclass_fields__)
+CalibrationData._GET_FIELDS = attrgetter(*CalibrationData._FIELD_NAMES)
+CalibrationData._DEFAULTS = {f.name: f.default for f in fields(CalibrationData)}
+CalibrationData._STR_FIELDS = tuple(f.name for f in fields(CalibrationData) if f.type in (str, 'str'))
+CalibrationData._NUMERIC_FIELDS = tuple(
+    name for name in CalibrationData._FIELD_NAMES if name not in CalibrationData._STR_FIELDS)
+# '{\n  "img_width": {img_width},\n  ...\n}' - ผลลัพธ์เหมือน json.dumps(indent=2)
+CalibrationData._JSON_TEMPLATE = "{{\n" + ",\n".join(
+    f'  "{name}": {{{name}}}' for name in CalibrationData._FIELD_NAMES) + "\n}}"
 
 
 # ==================== CAMERA FUNCTIONS (Raspberry Pi 5) ====================
@@ -109,15 +250,28 @@ class CalibrationData:
 class CameraCalibrator:
     """Camera helper for calibration with live preview"""
     
-    def __init__(self, camera_id: int = 0, width: int = 640, height: int = 480):
+    def __init__(self, camera_id: int = 0, width: int = 640, height: int = 480,
+                 use_opencl: bool = False):
+        """
+        Args:
+            use_opencl: เก็บ overlay เป็น UMat (OpenCL T-API) - ใช้เมื่อมี driver เท่านั้น
+                        ค่าเริ่มต้นวาดบน CPU
+        """
         self.camera_id = camera_id
         self.width = width
         self.height = height
         self.cap = None
+        self._grabber: Optional[_FrameGrabber] = None
         self.click_points: List[Tuple[int, int]] = []
         self.measuring = False
         self.guided_mode = False  # If true, don't auto-clear points
         
+        # Static overlay layer (built once per resolution)
+        self._overlay_size: Optional[Tuple[int, int]] = None
+        self._static_overlay = None
+        self._static_mask = None
+        self.use_opencl = use_opencl and CV2_AVAILABLE and cv2.ocl.haveOpenCL()
+        
     def _mouse_callback(self, event, x, y, flags, param):
         """Mouse callback for measuring pixels"""
         if event == cv2.EVENT_LBUTTONDOWN:
@@ -131,7 +285,7 @@ class CameraCalibrator:
                 
                 if len(self.click_points) == 2:
                     p1, p2 = self.click_points
-                    distance = math.sqrt((p2[0]-p1[0])**2 + (p2[1]-p1[1])**2)
+                    distance = _pix_dist(p1, p2)
                     print(f"📏 Distance: {distance:.1f} pixels → กด SPACE เพื่อยืนยัน!")
                     # DON'T clear - wait for SPACE to confirm
             else:
@@ -141,7 +295,7 @@ class CameraCalibrator:
                 
                 if len(self.click_points) == 2:
                     p1, p2 = self.click_points
-                    distance = math.sqrt((p2[0]-p1[0])**2 + (p2[1]-p1[1])**2)
+                    distance = _pix_dist(p1, p2)
                     print(f"📏 Distance: {distance:.1f} pixels")
                     self.click_points = []
     
@@ -157,9 +311,14 @@ class CameraCalibrator:
         print(f"🔍 Trying to open: {device_path}")
         
         # Try with device path first (more reliable on RPi5)
-        self.cap = cv2.VideoCapture(device_path, cv2.CAP_V4L2)
+        # - skip it if the node is missing/unreadable (a failed V4L2 open blocks ~0.5-1s)
+        if os.access(device_path, os.R_OK | os.W_OK):
+            self.cap = cv2.VideoCapture(device_path, cv2.CAP_V4L2)
+        else:
+            print(f"⚠️ {device_path} not found / no permission")
+            self.cap = None
         
-        if not self.cap.isOpened():
+        if not self.cap or not self.cap.isOpened():
             print(f"⚠️ Device path failed, trying index {self.camera_id}...")
             self.cap = cv2.VideoCapture(self.camera_id)
         
@@ -170,6 +329,10 @@ class CameraCalibrator:
         
         print(f"✅ Camera opened successfully")
         
+        # Request MJPG from the camera (set before resolution - some V4L2 drivers
+        # reset the format on FOURCC change). Decoding MJPG is cheaper than YUYV->BGR.
+        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        
         # Set resolution
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
@@ -191,54 +354,97 @@ class CameraCalibrator:
         actual_h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         print(f"📷 Resolution: {actual_w}x{actual_h}")
         
+        fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        fourcc_str = "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4))
+        print(f"🎞️ Format: {fourcc_str}")
+        
+        # Capture in background so cap.read() never blocks the UI loop
+        self._grabber = _FrameGrabber(self.cap, actual_w, actual_h)
+        self._grabber.start()
+        
         return True
     
+    def read_frame(self):
+        """Latest frame from the grabber thread (None = no new frame yet)"""
+        return self._grabber.get()
+    
+    @property
+    def camera_alive(self) -> bool:
+        return self._grabber is not None and self._grabber.is_alive()
+    
     def close_camera(self):
         """Release camera"""
+        if self._grabber:
+            self._grabber.stop()
+            self._grabber = None
         if self.cap:
             self.cap.release()
             cv2.destroyAllWindows()
     
-    def draw_calibration_overlay(self, frame):
-        """Draw grid and guides on frame for calibration"""
-        h, w = frame.shape[:2]
+    def _build_static_overlay(self, w: int, h: int):
+        """Draw everything that doesn't change per frame once for this resolution"""
+        overlay = np.zeros((h, w, 3), dtype=np.uint8)
         
-        # Draw grid lines
         # Horizontal lines (divide into 3 zones: NEAR, CENTER, FAR)
         y1 = h // 3
         y2 = 2 * h // 3
-        cv2.line(frame, (0, y1), (w, y1), (0, 255, 255), 1)
-        cv2.line(frame, (0, y2), (w, y2), (0, 255, 255), 1)
+        cv2.line(overlay, (0, y1), (w, y1), COLOR_YELLOW, 1)
+        cv2.line(overlay, (0, y2), (w, y2), COLOR_YELLOW, 1)
         
         # Zone labels
-        cv2.putText(frame, "FAR", (10, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
-        cv2.putText(frame, "CENTER", (10, y2 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-        cv2.putText(frame, "NEAR", (10, h - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 165, 255), 1)
+        cv2.putText(overlay, "FAR", (10, y1 - 10), FONT, 0.5, COLOR_YELLOW, 1)
+        cv2.putText(overlay, "CENTER", (10, y2 - 10), FONT, 0.5, COLOR_GREEN, 1)
+        cv2.putText(overlay, "NEAR", (10, h - 10), FONT, 0.5, COLOR_ORANGE, 1)
         
         # Center crosshair
         cx, cy = w // 2, h // 2
-        cv2.line(frame, (cx - 30, cy), (cx + 30, cy), (0, 255, 0), 1)
-        cv2.line(frame, (cx, cy - 30), (cx, cy + 30), (0, 255, 0), 1)
+        crosshair = [
+            np.array([[cx - 30, cy], [cx + 30, cy]], dtype=np.int32),
+            np.array([[cx, cy - 30], [cx, cy + 30]], dtype=np.int32),
+        ]
+        cv2.polylines(overlay, crosshair, False, COLOR_GREEN, 1)
         
         # Vertical center line
-        cv2.line(frame, (cx, 0), (cx, h), (100, 100, 100), 1)
+        cv2.line(overlay, (cx, 0), (cx, h), COLOR_GRAY, 1)
+        
+        # Instructions
+        cv2.putText(overlay, "Click 2 points to measure | Q=Quit | C=Clear | S=Screenshot", 
+                    (10, 20), FONT, 0.5, COLOR_WHITE, 1)
+        
+        mask = cv2.cvtColor(overlay, cv2.COLOR_BGR2GRAY)
+        if self.use_opencl:
+            # Upload once; per-frame copyTo then runs on the GPU
+            overlay, mask = cv2.UMat(overlay), cv2.UMat(mask)
+        self._static_overlay = overlay
+        self._static_mask = mask
+        self._overlay_size = (w, h)
+    
+    def draw_calibration_overlay(self, frame):
+        """
+        Draw grid and guides on frame for calibration
+        Returns a UMat when use_opencl is set (imshow/imwrite accept both)
+        """
+        h, w = frame.shape[:2]
+        
+        # Grid, labels, crosshair, instructions: one masked copy of the prebuilt layer
+        if self._overlay_size != (w, h):
+            self._build_static_overlay(w, h)
+        if self.use_opencl:
+            frame = cv2.UMat(frame)
+        frame = cv2.copyTo(self._static_overlay, self._static_mask, frame)
         
         # Show clicked points
         for i, (px, py) in enumerate(self.click_points):
-            cv2.circle(frame, (px, py), 5, (0, 0, 255), -1)
-            cv2.putText(frame, f"P{i+1}", (px+10, py), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+            cv2.circle(frame, (px, py), 5, COLOR_RED, -1)
+            cv2.putText(frame, f"P{i+1}", (px+10, py), FONT, 0.5, COLOR_RED, 1)
         
         # Draw line between 2 points
         if len(self.click_points) == 2:
             p1, p2 = self.click_points
-            cv2.line(frame, p1, p2, (255, 0, 255), 2)
-            dist = math.sqrt((p2[0]-p1[0])**2 + (p2[1]-p1[1])**2)
+            cv2.line(frame, p1, p2, COLOR_MAGENTA, 2)
+            dist = _pix_dist(p1, p2)
             mid = ((p1[0]+p2[0])//2, (p1[1]+p2[1])//2)
-            cv2.putText(frame, f"{dist:.1f}px", mid, cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 255), 2)
-        
-        # Instructions
-        cv2.putText(frame, "Click 2 points to measure | Q=Quit | C=Clear | S=Screenshot", 
-                    (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            cv2.putText(frame, f"{dist:.1f}px", mid, FONT, 0.7, COLOR_MAGENTA, 2)
         
         return frame
     
@@ -255,6 +461,7 @@ class CameraCalibrator:
         cv2.setMouseCallback(window_name, self._mouse_callback)
         
         last_distance = None
+        measured_pair = None
         screenshot_count = 0
         
         print("\n🎥 Camera Preview Started")
@@ -264,10 +471,11 @@ class CameraCalibrator:
         
         try:
             while True:
-                ret, frame = self.cap.read()
-                if not ret:
-                    print("⚠️ Cannot read frame")
-                    break
+                frame = self.read_frame()
+                if frame is None:
+                    if not self.camera_alive:
+                        break
+                    continue
                 
                 if with_overlay:
                     frame = self.draw_calibration_overlay(frame)
@@ -287,10 +495,12 @@ class CameraCalibrator:
                     print(f"📸 Screenshot saved: {screenshot_path}")
                     screenshot_count += 1
                 
-                # Update last measured distance
+                # Update last measured distance (only when the points change)
                 if len(self.click_points) == 2:
-                    p1, p2 = self.click_points
-                    last_distance = math.sqrt((p2[0]-p1[0])**2 + (p2[1]-p1[1])**2)
+                    pair = tuple(self.click_points)
+                    if pair != measured_pair:
+                        measured_pair = pair
+                        last_distance = _pix_dist(*pair)
         
         except KeyboardInterrupt:
             print("\n⚠️ Interrupted")
@@ -367,9 +577,11 @@ class CameraCalibrator:
         
         try:
             while current_step < len(steps):
-                ret, frame = self.cap.read()
-                if not ret:
-                    break
+                frame = self.read_frame()
+                if frame is None:
+                    if not self.camera_alive:
+                        break
+                    continue
                 
                 step = steps[current_step]
                 h, w = frame.shape[:2]
@@ -412,7 +624,7 @@ class CameraCalibrator:
                 if len(self.click_points) >= 2:
                     p1, p2 = self.click_points[0], self.click_points[1]
                     cv2.line(frame, p1, p2, (255, 0, 255), 3)
-                    last_measured = math.sqrt((p2[0]-p1[0])**2 + (p2[1]-p1[1])**2)
+                    last_measured = _pix_dist(p1, p2)
                     
                     # Show measurement
                     mid = ((p1[0]+p2[0])//2, (p1[1]+p2[1])//2 - 15)
@@ -466,11 +678,50 @@ class CameraCalibrator:
 
 
 
+# V4L2 (linux/videodev2.h)
+VIDIOC_QUERYCAP = 0x80685600
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_VIDEO_CAPTURE_MPLANE = 0x00001000  # driver แบบ multi-planar
+V4L2_CAP_ANY_CAPTURE = V4L2_CAP_VIDEO_CAPTURE | V4L2_CAP_VIDEO_CAPTURE_MPLANE
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+
+
+def _v4l2_capture_devices() -> List[int]:
+    """สแกน /dev/video* แล้วถาม capability ด้วย ioctl (ไม่ต้องเปิด VideoCapture)"""
+    import fcntl
+    
+    available = []
+    for entry in os.scandir('/dev'):
+        suffix = entry.name[5:]
+        if not entry.name.startswith('video') or not suffix.isdigit():
+            continue
+        buf = bytearray(104)  # struct v4l2_capability
+        try:
+            fd = os.open(entry.path, os.O_RDWR | os.O_NONBLOCK)
+            try:
+                fcntl.ioctl(fd, VIDIOC_QUERYCAP, buf)
+            finally:
+                os.close(fd)
+        except OSError:
+            continue  # node ไม่มีสิทธิ์ / busy / ไม่ใช่ V4L2 → ข้ามไปตัวถัดไป
+        caps, device_caps = struct.unpack_from('<II', buf, 84)
+        if caps & V4L2_CAP_DEVICE_CAPS:
+            caps = device_caps
+        if caps & V4L2_CAP_ANY_CAPTURE:
+            available.append(int(suffix))
+    return sorted(available)
+
+
 def find_available_cameras() -> List[int]:
     """Find available camera indices on Raspberry Pi"""
     if not CV2_AVAILABLE:
         return []
     
+    try:
+        return _v4l2_capture_devices()
+    except (ImportError, OSError):
+        pass  # ไม่ใช่ Linux / ไม่มีสิทธิ์ → probe ด้วย OpenCV แบบเดิม
+    
     available = []
     for i in range(5):  # Check first 5 indices
         cap = cv2.VideoCapture(i)
@@ -497,8 +748,11 @@ def camera_preview_menu():
     cam_id = get_int("Camera ID (0 = /dev/video0)", 0)
     width = get_int("Width", 640)
     height = get_int("Height", 480)
+    use_opencl = False
+    if cv2.ocl.haveOpenCL():
+        use_opencl = input("ใช้ OpenCL (GPU) วาด overlay? (y/n) [n]: ").lower().strip() == 'y'
     
-    calibrator = CameraCalibrator(cam_id, width, height)
+    calibrator = CameraCalibrator(cam_id, width, height, use_opencl=use_opencl)
     distance = calibrator.run_preview()
     
     return distance
@@ -581,17 +835,21 @@ def easy_guided_calibration():
 
 # ==================== UTILITIES ====================
 
+_CLEAR_CMD = 'cls' if os.name == 'nt' else 'clear'
+
+
 def clear_screen():
     """ล้างหน้าจอ (optional)"""
-    import os
-    os.system('cls' if os.name == 'nt' else 'clear')
+    os.system(_CLEAR_CMD)
+
+
+def _header_text(title: str) -> str:
+    return f"\n{'=' * 60}\n  {title}\n{'=' * 60}\n"
 
 
 def print_header(title: str):
     """แสดง header สวยๆ"""
-    print("\n" + "="*60)
-    print(f"  {title}")
-    print("="*60)
+    sys.stdout.write(_header_text(title))
 
 
 def print_box(lines: List[str], title: str = ""):
@@ -600,13 +858,13 @@ def print_box(lines: List[str], title: str = ""):
     if title:
         max_len = max(max_len, len(title) + 4)
     
-    print("┌" + "─" * (max_len + 2) + "┐")
+    out = ["┌" + "─" * (max_len + 2) + "┐"]
     if title:
-        print(f"│ {title.center(max_len)} │")
-        print("├" + "─" * (max_len + 2) + "┤")
-    for line in lines:
-        print(f"│ {line.ljust(max_len)} │")
-    print("└" + "─" * (max_len + 2) + "┘")
+        out.append(f"│ {title.center(max_len)} │")
+        out.append("├" + "─" * (max_len + 2) + "┤")
+    out.extend(f"│ {line.ljust(max_len)} │" for line in lines)
+    out.append("└" + "─" * (max_len + 2) + "┘\n")
+    sys.stdout.write("\n".join(out))
 
 
 def get_float(prompt: str, default: float, min_val: float = None, max_val: float = None) -> float:
@@ -644,6 +902,11 @@ def get_int(prompt: str, default: int) -> int:
 
 # ==================== CALIBRATION FUNCTIONS ====================
 
+def pixel_to_cm_ratios(pixel_dists, real_cms) -> np.ndarray:
+    """อัตราส่วน cm/pixel ของทุกจุดวัด (หารครั้งเดียวทั้ง array)"""
+    return np.asarray(real_cms, dtype=np.float64) / np.asarray(pixel_dists, dtype=np.float64)
+
+
 def calibrate_pixel_to_cm_multipoint(data: CalibrationData) -> float:
     """
     คำนวณ pixel_to_cm จากการวัดหลายจุด (สำหรับกล้องเฉียง)
@@ -671,7 +934,9 @@ def calibrate_pixel_to_cm_multipoint(data: CalibrationData) -> float:
 └─────────────────────────────────────────────────────────┘
 """)
     
-    measurements = []
+    names: List[str] = []
+    pixel_dists: List[float] = []
+    real_cms: List[float] = []
     
     # วัด 3 จุด
     positions = [
@@ -694,17 +959,22 @@ def calibrate_pixel_to_cm_multipoint(data: CalibrationData) -> float:
         pixel_dist = get_float(f"   📷 จำนวน pixel", 200, min_val=1)
         real_cm = get_float(f"   📐 ระยะจริง (cm)", 10, min_val=0.1)
         
-        point = MeasurementPoint(
-            position=pos_name.lower(),
-            pixel_distance=pixel_dist,
-            real_distance_cm=real_cm
-        )
-        ratio = point.calculate()
-        measurements.append(point)
+        names.append(pos_name)
+        pixel_dists.append(pixel_dist)
+        real_cms.append(real_cm)
         
-        print(f"   ✓ pixel_to_cm = {ratio:.6f}")
-        
-        # Save individual values
+        print(f"   ✓ pixel_to_cm = {real_cm / pixel_dist:.6f}")
+    
+    if not names:
+        print("\n⚠️ ไม่มีการวัด ใช้ค่าเดิม")
+        return data.pixel_to_cm_z
+    
+    # คำนวณทุกจุดพร้อมกัน
+    ratios = pixel_to_cm_ratios(pixel_dists, real_cms)
+    measurements = list(zip(names, ratios.tolist()))
+    
+    # Save individual values
+    for pos_name, ratio in measurements:
         if pos_name == "NEAR":
             data.pixel_to_cm_z_near = ratio
         elif pos_name == "CENTER":
@@ -712,32 +982,26 @@ def calibrate_pixel_to_cm_multipoint(data: CalibrationData) -> float:
         elif pos_name == "FAR":
             data.pixel_to_cm_z_far = ratio
     
-    if not measurements:
-        print("\n⚠️ ไม่มีการวัด ใช้ค่าเดิม")
-        return data.pixel_to_cm_z
-    
     # คำนวณค่าเฉลี่ย
     print("\n" + "="*50)
     print("📊 สรุปผล:")
     print("-"*50)
     
-    ratios = [m.pixel_to_cm for m in measurements]
-    
-    for m in measurements:
-        print(f"   {m.position.upper():8} : {m.pixel_to_cm:.6f} cm/px")
+    for pos_name, ratio in measurements:
+        print(f"   {pos_name:8} : {ratio:.6f} cm/px")
     
-    avg_ratio = sum(ratios) / len(ratios)
+    avg_ratio = float(ratios.mean())
     print("-"*50)
     print(f"   {'AVERAGE':8} : {avg_ratio:.6f} cm/px")
     
     # ถ้ามี CENTER ให้ใช้ CENTER (สำคัญที่สุดสำหรับ Z-axis)
-    center_point = next((m for m in measurements if m.position == "center"), None)
+    center_ratio = next((ratio for pos_name, ratio in measurements if pos_name == "CENTER"), None)
     
-    if center_point:
-        print(f"\n💡 แนะนำ: ใช้ค่า CENTER ({center_point.pixel_to_cm:.6f}) สำหรับ Z-axis")
+    if center_ratio is not None:
+        print(f"\n💡 แนะนำ: ใช้ค่า CENTER ({center_ratio:.6f}) สำหรับ Z-axis")
         use_center = input("   ใช้ค่า CENTER? (y/n) [y]: ").lower()
         if use_center != 'n':
-            return center_point.pixel_to_cm
+            return center_ratio
     
     return avg_ratio
 
@@ -902,10 +1166,8 @@ def quick_calibration():
 
 
 def show_summary(data: CalibrationData):
-    """แสดงสรุป"""
-    print_header("📊 CALIBRATION SUMMARY")
-    
-    print(f"""
+    """แสดงสรุป (เขียนออก stdout ครั้งเดียวทั้งกล่อง)"""
+    sys.stdout.write(_header_text("📊 CALIBRATION SUMMARY") + f"""
 ┌─────────────────────────────────────────────────────────┐
 │  Camera                                                  │
 ├─────────────────────────────────────────────────────────┤
@@ -929,7 +1191,9 @@ def show_summary(data: CalibrationData):
 │  spray_time:     {data.default_spray_duration:>6.2f} s                             │
 │  encoder_ppr:    {data.encoder_ppr:>6}                                  │
 └─────────────────────────────────────────────────────────┘
+
 """)
+    sys.stdout.flush()
 
 
 def show_current():
@@ -13,11 +13,45 @@ Author: AgriBot Team
 import cv2
 import numpy as np
 import json
+import math
+import mmap
+import os
+import sys
+import threading
 import time
 from dataclasses import dataclass, asdict
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 from pathlib import Path
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+# filepath -> ((st_mtime_ns, st_size, st_ino), dict ที่ parse แล้ว) - ไม่ต้องอ่าน/parse ไฟล์ซ้ำถ้าไม่เปลี่ยน
+_load_cache: Dict[str, Tuple[Tuple[int, int, int], dict]] = {}
+
+
+def _file_key(filepath) -> Tuple[int, int, int]:
+    """
+    ตัวบอกว่าไฟล์เปลี่ยนหรือยัง: mtime อย่างเดียวไม่พอ (timestamp ของ ext4/FAT หยาบ
+    เขียนทับใน tick เดียวกันจะไม่เห็น) - size จับการแก้ที่ความยาวเปลี่ยน,
+    inode จับ os.replace (ไฟล์ใหม่ inode ใหม่เสมอ)
+    """
+    st = os.stat(filepath)
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+IMAGE_UI_PERIOD_MS = 30  # รอบ UI ตอนไม่มีกล้อง (ภาพนิ่ง)
+MMAP_MIN_BYTES = 1_000_000  # ไฟล์ภาพเล็กกว่านี้ใช้ cv2.imread ปกติ
+
+# Serial (ESP32)
+SERIAL_POLL_TIMEOUT = 0.05     # readline timeout ต่อรอบ
+ESP32_READY_TIMEOUT_SEC = 2.0  # รอบอร์ดบูต/ตอบ PONG สูงสุด
+PING_INTERVAL_SEC = 0.25
+DONE_TIMEOUT_SEC = 3.0         # เผื่อเวลาหลังคำสั่งจบ ก่อนเลิกรอ DONE
+
 
 @dataclass
 class CalibrationResult:
@@ -32,17 +66,69 @@ class CalibrationResult:
         return asdict(self)
     
     def save(self, filepath: str):
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        # เขียนลงไฟล์ .tmp ก่อนแล้ว os.replace - ไฟดับกลางทางไฟล์เดิมยังอยู่ครบ
+        tmp_path = filepath + ".tmp"
+        if ORJSON_AVAILABLE:
+            payload = orjson.dumps(self.to_dict(), option=orjson.OPT_INDENT_2)
+        else:
+            payload = json.dumps(self.to_dict(), indent=2, ensure_ascii=False).encode('utf-8')
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+        _load_cache[filepath] = (_file_key(filepath), self.to_dict())
         print(f"✅ Saved to {filepath}")
     
     @classmethod
     def load(cls, filepath: str):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        file_key = _file_key(filepath)
+        cached = _load_cache.get(filepath)
+        if cached is not None and cached[0] == file_key:
+            data = cached[1]
+        else:
+            with open(filepath, 'rb') as f:
+                raw = f.read()
+            data = orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
+            _load_cache[filepath] = (file_key, data)
         return cls(**data)
 
 
+class _CaptureThread(threading.Thread):
+    """อ่านกล้องต่อเนื่องใน thread แยก เก็บแค่เฟรมล่าสุด (เฟรมเก่าทิ้ง)"""
+    
+    def __init__(self, cap):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.running = True
+        self.lock = threading.Lock()
+        self.latest = None
+        self._new_frame = threading.Event()
+    
+    def run(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            with self.lock:
+                self.latest = frame
+            self._new_frame.set()
+    
+    def get(self, timeout: float = 0.1):
+        """เฟรมใหม่ที่ยังไม่เคยอ่าน หรือ None ถ้าไม่มีเฟรมใหม่ภายใน timeout"""
+        if not self._new_frame.wait(timeout):
+            return None
+        with self.lock:
+            frame, self.latest = self.latest, None
+            self._new_frame.clear()
+        return frame
+    
+    def stop(self):
+        self.running = False
+        self.join(timeout=1.0)
+
+
 class CalibrationTool:
     """
     Interactive Calibration Tool
@@ -54,13 +140,18 @@ class CalibrationTool:
     4. โปรแกรมคำนวณ pixel_to_cm ให้
     """
     
-    def __init__(self, camera_id: int = 0):
+    def __init__(self, camera_id: int = 0, width: int = 640, height: int = 480):
         self.camera_id = camera_id
+        self.width = width
+        self.height = height
         self.cap = None
+        self._capture: Optional[_CaptureThread] = None
+        self._ui_period_ms = IMAGE_UI_PERIOD_MS
         self.result = CalibrationResult()
         
         # State for point clicking
         self.points: List[Tuple[int, int]] = []
+        self._pts_arr = np.zeros((2, 2), dtype=np.int32)  # buffer สำหรับ cv2.polylines
         self.current_frame = None
         self.frozen_frame = None
         self.is_frozen = False
@@ -72,13 +163,34 @@ class CalibrationTool:
             print("❌ Cannot open camera")
             return False
         
+        # ขอ MJPG ก่อนตั้งความละเอียด (กล้อง USB บีบอัดเอง, decode ด้วย libjpeg-turbo ถูกกว่า YUYV)
+        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        
+        # เก็บ buffer ฝั่ง driver แค่ 1 เฟรม → ได้ภาพล่าสุดเสมอ
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
+        # คาบเวลา UI ตาม FPS กล้อง (ไม่ต้องวน waitKey(1) ให้กิน CPU ตอนภาพนิ่ง)
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        self._ui_period_ms = max(1, int(1000 / fps))
+        
         self.result.img_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         self.result.img_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        print(f"📷 Camera opened ({self.result.img_width}x{self.result.img_height})")
+        fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        fourcc_str = "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4))
+        print(f"📷 Camera opened ({self.result.img_width}x{self.result.img_height}, {fourcc_str})")
+        
+        # อ่านกล้องใน background - UI loop ไม่ต้องรอ cap.read()
+        self._capture = _CaptureThread(self.cap)
+        self._capture.start()
         return True
     
     def stop_camera(self):
         """ปิดกล้อง"""
+        if self._capture:
+            self._capture.stop()
+            self._capture = None
         if self.cap:
             self.cap.release()
     
@@ -95,8 +207,34 @@ class CalibrationTool:
             return 0
         
         p1, p2 = self.points
-        dist = np.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2)
-        return dist
+        return math.hypot(p2[0] - p1[0], p2[1] - p1[1])
+    
+    @staticmethod
+    def _build_static_overlay(w: int, h: int, status: str, status_color):
+        """เส้นแกนกลาง + ข้อความสถานะบนพื้นดำ และ mask สำหรับ cv2.copyTo"""
+        overlay = np.zeros((h, w, 3), dtype=np.uint8)
+        cv2.line(overlay, (w//2, 0), (w//2, h), (255, 255, 0), 1)
+        cv2.line(overlay, (0, h//2), (w, h//2), (255, 255, 0), 1)
+        cv2.putText(overlay, status, (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, status_color, 2)
+        return overlay, cv2.cvtColor(overlay, cv2.COLOR_BGR2GRAY)
+    
+    def _draw_points(self, frame):
+        """วาดจุดที่คลิก + เส้นเชื่อม + ระยะ pixel"""
+        for i, pt in enumerate(self.points):
+            color = (0, 255, 0) if i == 0 else (0, 0, 255)
+            cv2.circle(frame, pt, 8, color, -1)
+            cv2.putText(frame, f"P{i+1}", (pt[0]+10, pt[1]),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+        
+        if len(self.points) == 2:
+            pts = self._pts_arr
+            pts[:] = self.points
+            cv2.polylines(frame, [pts], False, (255, 0, 255), 2)
+            pixel_dist = self._calculate_pixel_distance()
+            mid_x, mid_y = (pts[0] + pts[1]) // 2
+            cv2.putText(frame, f"{pixel_dist:.1f} px", (mid_x, mid_y - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 255), 2)
     
     def run_pixel_to_cm_calibration(self):
         """
@@ -125,45 +263,38 @@ class CalibrationTool:
         print("5. กด R เพื่อ reset, Q เพื่อจบ")
         print("="*50 + "\n")
         
+        live_overlay = None   # (overlay, mask) เส้นแกนกลาง + สถานะ LIVE สร้างครั้งเดียว
+        frozen_base = None    # ภาพ freeze + เส้นแกนกลาง + สถานะ FROZEN
+        shown_points = None   # จุดที่แสดงอยู่บนภาพ freeze (ไม่เปลี่ยน = ไม่ต้องวาดใหม่)
+        
         while True:
             if not self.is_frozen:
-                ret, frame = self.cap.read()
-                if not ret:
+                frame = self._capture.get()
+                if frame is None:
                     continue
                 self.current_frame = frame.copy()
-            else:
-                frame = self.frozen_frame.copy()
-            
-            # วาดเส้นแกนกลาง
-            h, w = frame.shape[:2]
-            cv2.line(frame, (w//2, 0), (w//2, h), (255, 255, 0), 1)
-            cv2.line(frame, (0, h//2), (w, h//2), (255, 255, 0), 1)
-            
-            # วาดจุดที่คลิก
-            for i, pt in enumerate(self.points):
-                color = (0, 255, 0) if i == 0 else (0, 0, 255)
-                cv2.circle(frame, pt, 8, color, -1)
-                cv2.putText(frame, f"P{i+1}", (pt[0]+10, pt[1]),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-            
-            # วาดเส้นเชื่อม
-            if len(self.points) == 2:
-                cv2.line(frame, self.points[0], self.points[1], (255, 0, 255), 2)
-                pixel_dist = self._calculate_pixel_distance()
-                mid_x = (self.points[0][0] + self.points[1][0]) // 2
-                mid_y = (self.points[0][1] + self.points[1][1]) // 2
-                cv2.putText(frame, f"{pixel_dist:.1f} px", (mid_x, mid_y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 255), 2)
-            
-            # แสดงสถานะ
-            status = "FROZEN - Click 2 points" if self.is_frozen else "LIVE - Press SPACE to freeze"
-            cv2.putText(frame, status, (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, 
-                        (0, 0, 255) if self.is_frozen else (0, 255, 0), 2)
-            
-            cv2.imshow(window_name, frame)
+                
+                if live_overlay is None:
+                    h, w = frame.shape[:2]
+                    live_overlay = self._build_static_overlay(
+                        w, h, "LIVE - Press SPACE to freeze", (0, 255, 0))
+                cv2.copyTo(live_overlay[0], live_overlay[1], frame)
+                self._draw_points(frame)
+                cv2.imshow(window_name, frame)
+            elif frozen_base is None or tuple(self.points) != shown_points:
+                if frozen_base is None:
+                    h, w = self.frozen_frame.shape[:2]
+                    overlay, mask = self._build_static_overlay(
+                        w, h, "FROZEN - Click 2 points", (0, 0, 255))
+                    frozen_base = self.frozen_frame.copy()
+                    cv2.copyTo(overlay, mask, frozen_base)
+                frame = frozen_base.copy()
+                self._draw_points(frame)
+                cv2.imshow(window_name, frame)
+                shown_points = tuple(self.points)
             
-            key = cv2.waitKey(1) & 0xFF
+            # LIVE: _capture.get() รอเฟรมอยู่แล้ว / FROZEN: พักตามรอบ UI
+            key = cv2.waitKey(self._ui_period_ms if self.is_frozen else 1) & 0xFF
             
             if key == ord('q'):
                 break
@@ -171,6 +302,7 @@ class CalibrationTool:
                 self.is_frozen = not self.is_frozen
                 if self.is_frozen:
                     self.frozen_frame = self.current_frame.copy()
+                    frozen_base = None
                     self.points = []
                     print("🔒 Frame frozen - click 2 points")
                 else:
@@ -197,6 +329,26 @@ class CalibrationTool:
         self.stop_camera()
         return self.result.pixel_to_cm_z
     
+    @staticmethod
+    def _wait_esp32_ready(ser) -> bool:
+        """
+        รอจน ESP32 พร้อม: เจอ banner ตอนบูต หรือตอบ PONG (ส่ง PING ซ้ำเป็นระยะ)
+        - ต่อเสร็จทันทีที่บอร์ดพร้อม แทนการ sleep ตายตัว 2 วินาที
+        """
+        deadline = time.monotonic() + ESP32_READY_TIMEOUT_SEC
+        next_ping = 0.0
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                return False
+            if now >= next_ping:
+                ser.write(b"PING\n")
+                next_ping = now + PING_INTERVAL_SEC
+            line = ser.readline()
+            if b"PONG" in line or b"Ready" in line:
+                ser.reset_input_buffer()
+                return True
+    
     def run_motor_speed_calibration(self, serial_port: str = None):
         """
         Mode 2: วัดความเร็วมอเตอร์
@@ -217,8 +369,10 @@ class CalibrationTool:
         if serial_port:
             try:
                 import serial
-                ser = serial.Serial(serial_port, 115200, timeout=2)
-                time.sleep(2)
+                ser = serial.Serial(serial_port, 115200, timeout=SERIAL_POLL_TIMEOUT)
+                if not self._wait_esp32_ready(ser):
+                    ser.close()
+                    raise TimeoutError("ESP32 not responding")
                 print("✅ Connected to ESP32")
                 
                 input("กด ENTER เมื่อพร้อมยืดแขน...")
@@ -227,10 +381,18 @@ class CalibrationTool:
                 print("🔄 Extending arm for 1 second...")
                 ser.write(b"ACT:Z_OUT:1.00\n")
                 
-                # รอ DONE
-                response = ser.readline().decode().strip()
-                if response == "DONE":
-                    print("✅ Done extending")
+                # รอ DONE (มีกำหนดเวลา - ไม่ค้างถ้า ESP32 ไม่ตอบ)
+                deadline = time.monotonic() + 1.0 + DONE_TIMEOUT_SEC
+                while time.monotonic() < deadline:
+                    response = ser.readline().strip()
+                    if response == b"DONE":
+                        print("✅ Done extending")
+                        break
+                    if response.startswith(b"ERR"):
+                        print(f"❌ ESP32: {response.decode(errors='replace')}")
+                        break
+                else:
+                    print("⚠️ No DONE from ESP32")
                 
                 ser.close()
                 
@@ -307,11 +469,12 @@ class CalibrationTool:
         return self.result
     
     def _print_summary(self):
-        """แสดงสรุปค่า Calibration"""
-        print("\n" + "="*60)
-        print("📊 CALIBRATION SUMMARY")
-        print("="*60)
-        print(f"""
+        """แสดงสรุปค่า Calibration (เขียนออก stdout ครั้งเดียว)"""
+        sys.stdout.write(f"""
+{"=" * 60}
+📊 CALIBRATION SUMMARY
+{"=" * 60}
+
 # Copy these values to robot_brain.py:
 
 pixel_to_cm_z = {self.result.pixel_to_cm_z:.6f}
@@ -319,14 +482,32 @@ arm_speed_cm_per_sec = {self.result.arm_speed_cm_per_sec:.2f}
 arm_base_offset_cm = {self.result.arm_base_offset_cm:.2f}
 img_width = {self.result.img_width}
 img_height = {self.result.img_height}
+
+{"=" * 60}
 """)
-        print("="*60)
+        sys.stdout.flush()
+    
+    @staticmethod
+    def _read_image(image_path: str):
+        """
+        อ่านภาพ - ไฟล์ใหญ่ (> MMAP_MIN_BYTES) decode จาก mmap ตรงๆ ไม่ต้อง read() ลง buffer ก่อน
+        """
+        try:
+            if os.path.getsize(image_path) > MMAP_MIN_BYTES:
+                with open(image_path, 'rb') as f, \
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    frame = cv2.imdecode(np.frombuffer(mm, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if frame is not None:
+                    return frame
+        except (OSError, ValueError, BufferError):
+            pass  # อ่าน/map ไม่ได้ → ใช้ imread
+        return cv2.imread(image_path)
     
     def load_from_image(self, image_path: str):
         """
         Calibrate จากไฟล์ภาพ (ไม่ต้องใช้กล้อง)
         """
-        frame = cv2.imread(image_path)
+        frame = self._read_image(image_path)
         if frame is None:
             print(f"❌ Cannot load image: {image_path}")
             return None
@@ -348,32 +529,21 @@ img_height = {self.result.img_height}
         print("3. กด R เพื่อ reset, Q เพื่อจบ")
         print("="*50 + "\n")
         
+        # ภาพไม่เปลี่ยน - วาดเส้นแกนกลางครั้งเดียว
+        base = frame.copy()
+        h, w = base.shape[:2]
+        cv2.line(base, (w//2, 0), (w//2, h), (255, 255, 0), 1)
+        shown_points = None
+        
         while True:
-            display = frame.copy()
-            
-            # วาดเส้นแกนกลาง
-            h, w = display.shape[:2]
-            cv2.line(display, (w//2, 0), (w//2, h), (255, 255, 0), 1)
-            
-            # วาดจุด
-            for i, pt in enumerate(self.points):
-                color = (0, 255, 0) if i == 0 else (0, 0, 255)
-                cv2.circle(display, pt, 8, color, -1)
-                cv2.putText(display, f"P{i+1}", (pt[0]+10, pt[1]),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-            
-            # วาดเส้นเชื่อม
-            if len(self.points) == 2:
-                cv2.line(display, self.points[0], self.points[1], (255, 0, 255), 2)
-                pixel_dist = self._calculate_pixel_distance()
-                mid_x = (self.points[0][0] + self.points[1][0]) // 2
-                mid_y = (self.points[0][1] + self.points[1][1]) // 2
-                cv2.putText(display, f"{pixel_dist:.1f} px", (mid_x, mid_y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 255), 2)
-            
-            cv2.imshow(window_name, display)
+            # วาดใหม่เฉพาะตอนจุดเปลี่ยน
+            if tuple(self.points) != shown_points:
+                display = base.copy()
+                self._draw_points(display)
+                cv2.imshow(window_name, display)
+                shown_points = tuple(self.points)
             
-            key = cv2.waitKey(1) & 0xFF
+            key = cv2.waitKey(IMAGE_UI_PERIOD_MS) & 0xFF
             
             if key == ord('q'):
                 break
@@ -12,8 +12,12 @@ Created: 2026-01-21
 
 import time
 import threading
-from dataclasses import dataclass
-from typing import Tuple, Optional, Callable
+import selectors
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from pathlib import Path
+from typing import Tuple, Optional, Callable, Union
 import logging
 
 from kinematics.camera_calibration import CameraCalibration, quick_calibration
@@ -22,6 +26,57 @@ from control.pid_controller import PIDController, ImprovedTimeBasedController, c
 
 logger = logging.getLogger(__name__)
 
+# IK cache: quantize เป้าหมายเป็น grid 1 mm
+IK_CACHE_DECIMALS = 1
+IK_CACHE_SIZE = 256
+
+# เป้าหมายห่างจากตำแหน่งที่ไปถึงแล้วน้อยกว่านี้ (cm², = 0.1 mm) ไม่ต้องขยับ
+TARGET_EPSILON_SQ = 1e-4
+
+# คำสั่ง ACT รอ DONE ได้นานสุดเท่านี้; readline บล็อกครั้งละไม่เกิน SERIAL_READ_TIMEOUT_SEC
+COMMAND_TIMEOUT_SEC = 30.0
+SERIAL_READ_TIMEOUT_SEC = 0.5
+
+# รอคำตอบ encoder ไม่เกิน 1 tick ของ control loop 50Hz
+ENCODER_READ_TIMEOUT_SEC = 0.02
+
+
+@contextmanager
+def _serial_timeout(ser, seconds: float):
+    """
+    ตั้ง read timeout ของ serial ชั่วคราว แล้วคืนค่าเดิม
+    
+    port อาจใช้ร่วมกับ RobotBrain / web backend จึงไม่เปลี่ยน timeout ของ port ถาวร
+    (ค่าเท่าเดิมอยู่แล้ว หรือ mock ไม่มี timeout → ไม่แตะ)
+    """
+    prev_timeout = getattr(ser, 'timeout', seconds)
+    if prev_timeout == seconds:
+        yield ser
+        return
+    ser.timeout = seconds
+    try:
+        yield ser
+    finally:
+        ser.timeout = prev_timeout
+
+# คำสั่ง ESP32 ที่ encode ไว้แล้ว (ตัวที่มีพารามิเตอร์ใช้ bytes % value)
+CMD_STOP = b"STOP\n"
+CMD_GET_ENC_ALL = b"GET:ENC_ALL\n"
+CMD_GET_ENC_FMT = b"GET:ENC_%s\n"
+CMD_Y_UP = b"ACT:Y_UP\n"
+CMD_Y_DOWN = b"ACT:Y_DOWN\n"
+CMD_Z_OUT_FMT = b"ACT:Z_OUT:%.2f\n"
+CMD_Z_IN_FMT = b"ACT:Z_IN:%.2f\n"
+CMD_Z_IN_MAX = b"ACT:Z_IN:10.0\n"  # Max retract
+CMD_SPRAY_FMT = b"ACT:SPRAY:%.1f\n"
+
+# Prefix ของคำสั่ง PWM (encode ไว้ล่วงหน้า ใช้ใน control loop 50 Hz)
+MOTOR_PWM_PREFIX = {
+    (axis, direction): f"MOT:{axis}:{direction}:".encode()
+    for axis in ('Z', 'Y')
+    for direction in ('FW', 'BW')
+}
+
 
 @dataclass
 class ArmState:
@@ -61,6 +116,10 @@ class ArmController:
         """
         self.serial = serial_connection
         self.use_encoder = use_encoder
+        self._enable_low_latency()
+        self._selector = self._create_selector()
+        # มีคำตอบ encoder ที่ยังไม่ถูกอ่านค้างอยู่ (timeout / ตอบผิดรูป) → ล้าง RX ก่อน request ถัดไป
+        self._rx_dirty = False
         
         # Initialize camera calibration
         if camera_calibration:
@@ -78,6 +137,9 @@ class ArmController:
         else:
             self.ik = create_agribot_ik()
         
+        # IK cache: เป้าหมายซ้ำ (retry, scripted sequence) ไม่ต้อง solve ใหม่
+        self._solve_cached = lru_cache(maxsize=IK_CACHE_SIZE)(self.ik.solve)
+        
         # Initialize motor controllers
         if use_encoder:
             # PID controllers for closed-loop control
@@ -90,6 +152,7 @@ class ArmController:
         # State
         self.state = ArmState()
         self._stop_event = threading.Event()
+        self._reached_target: Optional[Tuple[float, float, float]] = None  # เป้าหมายล่าสุดที่ไปถึงสำเร็จ
         
         # Control loop parameters
         self.control_rate = 50  # Hz
@@ -98,6 +161,31 @@ class ArmController:
         
         logger.info(f"ArmController initialized (encoder={use_encoder})")
     
+    def _enable_low_latency(self):
+        """
+        ลด latency ของ USB-serial เพื่อให้ PID loop 50Hz ทำได้จริง (Linux, best-effort)
+        
+        - ASYNC_LOW_LATENCY ผ่าน pyserial set_low_latency_mode (= setserial low_latency)
+        - latency_timer ของ FTDI เป็น 1ms (default 16ms) - FTDI ได้ผลมากที่สุด
+        """
+        try:
+            self.serial.set_low_latency_mode(True)
+            logger.info("Serial low-latency mode enabled")
+        except (AttributeError, NotImplementedError, OSError, ValueError) as e:
+            logger.debug(f"Low-latency mode not available: {e}")
+        
+        port = getattr(self.serial, 'port', None)
+        if not isinstance(port, str):
+            return
+        port_name = Path(port).resolve().name
+        latency_timer = Path("/sys/bus/usb-serial/devices") / port_name / "latency_timer"
+        try:
+            if latency_timer.exists():
+                latency_timer.write_text("1")
+                logger.info(f"{port_name} latency_timer = 1ms")
+        except OSError as e:
+            logger.debug(f"Cannot set latency_timer: {e}")
+    
     # ==================== Main Movement Functions ====================
     
     def move_to_pixel(self, x_px: int, y_px: int, z_target: float = 0.0) -> bool:
@@ -120,23 +208,46 @@ class ArmController:
         # Step 2: Move to world coordinates
         return self.move_to_world(x_world, y_world, z_world)
     
+    def pixels_to_world(self, x_px, y_px, z_target: float = 0.0):
+        """
+        แปลง pixel หลายจุด (เช่นทุกจุดใน mask) → world coordinates ในครั้งเดียว
+        
+        Returns:
+            (x_world, y_world, z_world) numpy arrays (cm)
+        """
+        return self.camera.pixels_to_world(x_px, y_px, z_target)
+    
     def move_to_world(self, x: float, y: float, z: float) -> bool:
         """
         เคลื่อนที่แขนไปยังตำแหน่ง world coordinates
         
+        เป้าหมายถูกปัดเป็น grid 1 mm (IK_CACHE_DECIMALS) ก่อน solve IK
+        แขนจึงถูกสั่งไปยังตำแหน่งที่ปัดแล้ว (คลาดจากค่าที่ส่งมาได้ไม่เกิน 0.05 cm ต่อแกน)
+        
         Args:
             x, y, z: World coordinates (cm)
         
         Returns:
             True if movement successful
         """
+        # อยู่ที่เป้าหมายนี้อยู่แล้ว: ไม่ต้อง solve IK / สั่งมอเตอร์ซ้ำ
+        reached = self._reached_target
+        if reached is not None and not self.state.is_moving:
+            dx = x - reached[0]
+            dy = y - reached[1]
+            dz = z - reached[2]
+            if dx * dx + dy * dy + dz * dz < TARGET_EPSILON_SQ:
+                logger.debug("Already at target, skipping move")
+                return True
+        
         self.state.last_target = (x, y, z)
         self.state.is_moving = True
+        self._reached_target = None
         self._stop_event.clear()
         
         try:
             # Step 1: Solve Inverse Kinematics
-            solution = self.ik.solve(x, y, z)
+            solution = self._solve_ik(x, y, z)
             
             if not solution.reachable:
                 self.state.error_message = solution.error_message
@@ -148,9 +259,13 @@ class ArmController:
             
             # Step 2: Execute movement
             if self.use_encoder:
-                return self._execute_closed_loop(solution)
+                success = self._execute_closed_loop(solution)
             else:
-                return self._execute_open_loop(solution)
+                success = self._execute_open_loop(solution)
+            
+            if success:
+                self._reached_target = (x, y, z)
+            return success
             
         except Exception as e:
             logger.error(f"Movement failed: {e}")
@@ -159,6 +274,37 @@ class ArmController:
         finally:
             self.state.is_moving = False
     
+    def _solve_ik(self, x: float, y: float, z: float) -> IKSolution:
+        """
+        Solve IK ผ่าน cache (พิกัดปัดเป็น 1 mm)
+        
+        cache เก็บเฉพาะ geometry (joint_values) - เวลาเคลื่อนที่คำนวณใหม่ทุกครั้งจาก
+        current_value ของ joint ตอนนี้ จึงไม่ได้ค่าเวลาเก่าเมื่อแขนขยับไปแล้ว
+        """
+        rx = round(float(x), IK_CACHE_DECIMALS)
+        ry = round(float(y), IK_CACHE_DECIMALS)
+        rz = round(float(z), IK_CACHE_DECIMALS)
+        solution = self._solve_cached(rx, ry, rz)
+        if not solution.reachable:
+            # กรณีเข้าไม่ถึง joint_values = ตำแหน่งปัจจุบัน (ไม่ใช่ geometry) จึง solve ใหม่
+            return self.ik.solve(rx, ry, rz)
+        
+        joints = self.ik.joints
+        joint_times = {
+            name: joints[name].time_to_move(value)
+            for name, value in solution.joint_values.items()
+        }
+        return replace(
+            solution,
+            joint_values=dict(solution.joint_values),
+            joint_times=joint_times,
+            total_time=max(joint_times.values(), default=0.0)  # Parallel movement
+        )
+    
+    def invalidate_ik_cache(self):
+        """ล้าง IK cache (เรียกเมื่อเปลี่ยน joint limits / link lengths ของแขน)"""
+        self._solve_cached.cache_clear()
+    
     # ==================== Closed-Loop Control (with Encoder) ====================
     
     def _execute_closed_loop(self, solution: IKSolution) -> bool:
@@ -167,71 +313,170 @@ class ArmController:
         
         Requires encoder feedback from ESP32
         """
-        target_z = solution.joint_values.get('Z', self.state.z_position_cm)
-        target_y = solution.joint_values.get('Y', self.state.y_angle_deg)
+        state = self.state
+        joint_values = solution.joint_values
+        target_z = joint_values.get('Z', state.z_position_cm)
+        target_y = joint_values.get('Y', state.y_angle_deg)
         
         dt = 1.0 / self.control_rate
+        # หน่วยต่างกัน (cm / degrees) จึงเช็คแยกแกน แต่เทียบแบบยกกำลังสองไม่ต้อง abs
+        tolerance_sq = self.position_tolerance * self.position_tolerance
         
         # Reset PIDs
         self.pid_z.reset()
         self.pid_y.reset()
         
+        # Bind ไว้เป็น local: loop ด้านล่างไม่ต้อง lookup attribute / dict ทุก tick
+        stop_requested = self._stop_event.is_set
+        read_encoders = self._read_encoders
+        compute_z = self.pid_z.compute
+        compute_y = self.pid_y.compute
+        send_pwm = self._send_motor_pwm
+        sleep = time.sleep
+        
         for i in range(self.max_iterations):
-            if self._stop_event.is_set():
+            if stop_requested():
                 self._stop_motors()
                 logger.info("Movement stopped by user")
                 return False
             
-            # Read current positions from encoders
-            current_z = self._read_encoder('Z')
-            current_y = self._read_encoder('Y')
+            # Read current positions from encoders (one round-trip)
+            reading = read_encoders()
+            if reading is None:
+                # ไม่มีค่าใหม่: ข้าม PID tick นี้ ไม่ป้อนตำแหน่งปลอมเข้า PID
+                sleep(dt)
+                continue
+            current_z, current_y = reading
             
-            self.state.z_position_cm = current_z
-            self.state.y_angle_deg = current_y
+            state.z_position_cm = current_z
+            state.y_angle_deg = current_y
             
             # Check if reached target
-            z_error = abs(target_z - current_z)
-            y_error = abs(target_y - current_y)
+            z_error = target_z - current_z
+            y_error = target_y - current_y
             
-            if z_error < self.position_tolerance and y_error < self.position_tolerance:
+            if z_error * z_error < tolerance_sq and y_error * y_error < tolerance_sq:
                 self._stop_motors()
                 logger.info(f"Reached target in {i+1} iterations")
                 return True
             
             # Compute PID outputs
-            z_pwm = self.pid_z.compute(target_z, current_z, dt)
-            y_pwm = self.pid_y.compute(target_y, current_y, dt)
+            z_pwm = compute_z(target_z, current_z, dt)
+            y_pwm = compute_y(target_y, current_y, dt)
             
             # Send motor commands
-            self._send_motor_pwm('Z', z_pwm)
-            self._send_motor_pwm('Y', y_pwm)
+            send_pwm('Z', z_pwm)
+            send_pwm('Y', y_pwm)
             
-            time.sleep(dt)
+            sleep(dt)
         
         self._stop_motors()
         logger.warning("Movement timeout")
         return False
     
+    def _create_selector(self) -> Optional[selectors.BaseSelector]:
+        """
+        Selector (epoll บน Linux) สำหรับรอข้อมูลจาก serial แบบมี timeout สั้น
+        
+        คืน None ถ้า port ไม่มี fileno (เช่น mock/Windows) → ใช้ readline ตาม port timeout
+        """
+        try:
+            selector = selectors.DefaultSelector()
+            selector.register(self.serial, selectors.EVENT_READ)
+            return selector
+        except (AttributeError, ValueError, OSError, TypeError) as e:
+            logger.debug(f"Serial selector not available: {e}")
+            return None
+    
+    def _wait_readable(self, timeout: float = ENCODER_READ_TIMEOUT_SEC) -> bool:
+        """รอจนกว่า serial มีข้อมูลให้อ่าน (True ถ้าไม่มี selector)"""
+        if self._selector is None:
+            return True
+        return bool(self._selector.select(timeout))
+    
+    def _flush_input(self):
+        """
+        ล้าง RX buffer เฉพาะเมื่ออาจมีคำตอบเก่าค้าง (_rx_dirty) แบบเดียวกับ RobotBrain.drain_input
+        
+        คำตอบ encoder ที่มาช้ากว่า timeout ถ้าไม่ทิ้งจะถูกอ่านเป็นคำตอบของ request ถัดไป;
+        ไม่ล้างทุก tick เพราะจะทิ้งบรรทัดสถานะ / DONE ที่ ESP32 ส่งมาระหว่าง PID control
+        """
+        if not self._rx_dirty:
+            return
+        try:
+            self.serial.reset_input_buffer()
+        except AttributeError:
+            pass
+        self._rx_dirty = False
+    
     def _read_encoder(self, axis: str) -> float:
-        """Read encoder position from ESP32"""
+        """
+        Read encoder position from ESP32
+        
+        ถ้าคำตอบมาไม่ทัน / อ่านไม่ได้ จะคืนตำแหน่งล่าสุดที่รู้ (ไม่ใช่ 0.0)
+        """
+        last_known = self.state.z_position_cm if axis == 'Z' else self.state.y_angle_deg
         try:
-            self.serial.write(f"GET:ENC_{axis}\n".encode())
-            response = self.serial.readline().decode().strip()
+            self._flush_input()
+            self.serial.write(CMD_GET_ENC_FMT % axis.encode())
+            self._rx_dirty = True  # จนกว่าจะอ่านคำตอบได้ครบ
+            if not self._wait_readable():
+                logger.debug(f"Encoder {axis} read timed out")
+                return last_known
+            with _serial_timeout(self.serial, ENCODER_READ_TIMEOUT_SEC) as ser:
+                response = ser.readline().decode().strip()
             
             if ':' in response:
-                return float(response.split(':')[1])
-            return 0.0
+                value = float(response.split(':')[1])
+                self._rx_dirty = False
+                return value
+            return last_known
         except Exception as e:
             logger.error(f"Encoder read failed: {e}")
-            return 0.0
+            return last_known
+    
+    def _read_encoders(self) -> Optional[Tuple[float, float]]:
+        """
+        Read Z and Y encoder positions with a single request
+        
+        ESP32 ต้องรองรับคำสั่ง GET:ENC_ALL และตอบกลับบรรทัดเดียว: "Z:<value>,Y:<value>"
+        
+        Returns:
+            (z, y) หรือ None ถ้าคำตอบมาไม่ทัน / ไม่ครบทั้งสองแกน / อ่านไม่ได้
+        """
+        try:
+            self._flush_input()
+            self.serial.write(CMD_GET_ENC_ALL)
+            self._rx_dirty = True  # จนกว่าจะอ่านคำตอบได้ครบ
+            if not self._wait_readable():
+                logger.debug("Encoder read timed out")
+                return None
+            with _serial_timeout(self.serial, ENCODER_READ_TIMEOUT_SEC) as ser:
+                response = ser.readline().decode().strip()
+            
+            values = {}
+            for part in response.split(','):
+                axis, sep, value = part.partition(':')
+                if sep and axis in ('Z', 'Y'):
+                    values[axis] = float(value)
+            if len(values) != 2:
+                logger.debug(f"Incomplete encoder response: {response!r}")
+                return None
+            self._rx_dirty = False
+            return values['Z'], values['Y']
+        except Exception as e:
+            logger.error(f"Encoder read failed: {e}")
+            return None
     
     def _send_motor_pwm(self, axis: str, pwm: float):
         """Send PWM command to motor"""
         direction = 'FW' if pwm >= 0 else 'BW'
         pwm_value = int(min(abs(pwm), 255))
         
-        cmd = f"MOT:{axis}:{direction}:{pwm_value}\n"
-        self.serial.write(cmd.encode())
+        prefix = MOTOR_PWM_PREFIX.get((axis, direction))
+        if prefix is None:
+            prefix = f"MOT:{axis}:{direction}:".encode()
+        self.serial.write(prefix + b"%d\n" % pwm_value)
     
     # ==================== Open-Loop Control (Time-Based) ====================
     
@@ -258,14 +503,15 @@ class ArmController:
                 return False
         
         # Update estimated position
-        if 'Z' in solution.joint_values:
-            self.state.z_position_cm = solution.joint_values['Z']
-        if 'Y' in solution.joint_values:
-            self.state.y_angle_deg = solution.joint_values['Y']
+        joint_values = solution.joint_values
+        if 'Z' in joint_values:
+            self.state.z_position_cm = joint_values['Z']
+        if 'Y' in joint_values:
+            self.state.y_angle_deg = joint_values['Y']
         
         return True
     
-    def _execute_command(self, cmd: str) -> bool:
+    def _execute_command(self, cmd: Union[str, bytes]) -> bool:
         """
         Execute a single motor command
         
@@ -273,22 +519,25 @@ class ArmController:
         Examples:
             ACT:Z_OUT:1.5
             ACT:Y_DOWN
+        
+        cmd เป็น bytes ที่ลงท้าย newline แล้ว (CMD_*) หรือ str (ไม่มี newline) ก็ได้
         """
         try:
-            self.serial.write(f"{cmd}\n".encode())
-            logger.debug(f"Sent: {cmd}")
+            data = cmd if isinstance(cmd, bytes) else f"{cmd}\n".encode()
+            self.serial.write(data)
+            logger.debug(f"Sent: {data.decode().strip()}")
             
-            # Wait for DONE response
-            start = time.time()
-            while time.time() - start < 30:  # 30s timeout
-                if self.serial.in_waiting > 0:
-                    response = self.serial.readline().decode().strip()
+            # Wait for DONE response (readline บล็อกรอบรรทัดใน OS แทนการ poll in_waiting + sleep,
+            # คืนทันทีที่ได้บรรทัด, ว่างเมื่อ timeout)
+            deadline = time.monotonic() + COMMAND_TIMEOUT_SEC
+            with _serial_timeout(self.serial, SERIAL_READ_TIMEOUT_SEC) as ser:
+                while time.monotonic() < deadline:
+                    response = ser.readline().decode().strip()
                     if response == "DONE":
                         return True
                     elif response.startswith("ERR"):
                         logger.error(f"ESP32 error: {response}")
                         return False
-                time.sleep(0.01)
             
             logger.error("Command timeout")
             return False
@@ -300,7 +549,7 @@ class ArmController:
     def _stop_motors(self):
         """Stop all motors"""
         try:
-            self.serial.write("STOP\n".encode())
+            self.serial.write(CMD_STOP)
         except Exception as e:
             logger.error(f"Stop failed: {e}")
     
@@ -324,13 +573,14 @@ class ArmController:
         """
         logger.info(f"=== Spray Mission Start ===")
         logger.info(f"Target: pixel ({x_px}, {y_px})")
+        self._reached_target = None  # ภารกิจจบที่ตำแหน่งหดแขน
         
         # Convert pixel to world
         x_w, y_w, z_w = self.camera.pixel_to_world(x_px, y_px)
         logger.info(f"World: ({x_w:.1f}, {y_w:.1f}, {z_w:.1f}) cm")
         
         # Solve IK
-        solution = self.ik.solve(x_w, y_w, z_w)
+        solution = self._solve_ik(x_w, y_w, z_w)
         
         if not solution.reachable:
             logger.error(f"Target unreachable: {solution.error_message}")
@@ -340,27 +590,27 @@ class ArmController:
         
         # Step 1: Extend arm
         logger.info(f"Step 1: Extending arm ({z_time:.2f}s)")
-        if not self._execute_command(f"ACT:Z_OUT:{z_time:.2f}"):
+        if not self._execute_command(CMD_Z_OUT_FMT % z_time):
             return False
         
         # Step 2: Lower spray head
         logger.info("Step 2: Lowering spray head")
-        if not self._execute_command("ACT:Y_DOWN"):
+        if not self._execute_command(CMD_Y_DOWN):
             return False
         
         # Step 3: Spray
         logger.info(f"Step 3: Spraying ({spray_duration}s)")
-        if not self._execute_command(f"ACT:SPRAY:{spray_duration:.1f}"):
+        if not self._execute_command(CMD_SPRAY_FMT % spray_duration):
             return False
         
         # Step 4: Raise spray head
         logger.info("Step 4: Raising spray head")
-        if not self._execute_command("ACT:Y_UP"):
+        if not self._execute_command(CMD_Y_UP):
             return False
         
         # Step 5: Retract arm
         logger.info(f"Step 5: Retracting arm ({z_time:.2f}s)")
-        if not self._execute_command(f"ACT:Z_IN:{z_time:.2f}"):
+        if not self._execute_command(CMD_Z_IN_FMT % z_time):
             return False
         
         logger.info("=== Spray Mission Complete ===")
@@ -373,12 +623,13 @@ class ArmController:
         logger.info("Homing arm...")
         
         # Retract fully
-        self._execute_command("ACT:Z_IN:10.0")  # Max retract
+        self._execute_command(CMD_Z_IN_MAX)
         
         # Raise head
-        self._execute_command("ACT:Y_UP")
+        self._execute_command(CMD_Y_UP)
         
         # Reset state
+        self._reached_target = None
         self.state.z_position_cm = 0.0
         self.state.y_angle_deg = 0.0
         
@@ -391,6 +642,7 @@ class ArmController:
         """Emergency stop"""
         self._stop_event.set()
         self._stop_motors()
+        self._reached_target = None
         self.state.is_moving = False
         logger.warning("Emergency stop activated")
     
@@ -14,13 +14,34 @@ Created: 2026-01-21
 
 import time
 from dataclasses import dataclass, field
-from typing import Optional, List, Tuple
+from typing import List, Tuple
 import logging
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    
+    def njit(**kwargs):
+        """ไม่มี numba: ใช้ฟังก์ชัน Python ตามเดิม"""
+        return lambda func: func
+
+# dt ต่ำสุด (กันหารด้วยศูนย์) และ dt เริ่มต้นของ compute_auto ครั้งแรก (50Hz)
+MIN_DT = 0.001
+DEFAULT_DT = 0.02
 
-@dataclass
+# คอลัมน์ของ debug history (ring buffer ของ PIDController)
+HISTORY_FIELDS = ('time', 'setpoint', 'measurement', 'error', 'P', 'I', 'D', 'output')
+_ERROR_COL = HISTORY_FIELDS.index('error')
+_OUTPUT_COL = HISTORY_FIELDS.index('output')
+
+
+@dataclass(slots=True)
 class PIDGains:
     """PID Tuning Parameters"""
     Kp: float = 1.0     # Proportional gain
@@ -39,6 +60,45 @@ class PIDGains:
     derivative_filter: float = 0.1
 
 
+@njit(cache=True, fastmath=True)
+def _pid_step(Kp, Ki, Kd, integral_min, integral_max, output_min, output_max, alpha,
+              integral, prev_error, prev_derivative, setpoint, measurement, dt):
+    """
+    PID หนึ่ง tick (scalar ล้วน compile ด้วย numba ได้)
+    
+    Clamp เขียนเป็น min(hi, max(lo, x)) ให้ LLVM ลดเป็น minsd/maxsd (NEON: fminnm/fmaxnm)
+    ไม่มี branch; fastmath=True อนุญาตให้ reorder floating point ได้
+    
+    Returns:
+        (output, integral, derivative, error, P, I, D)
+    """
+    error = setpoint - measurement
+    
+    # === Proportional ===
+    P = Kp * error
+    
+    # === Integral with Anti-Windup ===
+    integral = min(integral_max, max(integral_min, integral + error * dt))
+    I = Ki * integral
+    
+    # === Derivative with Filtering ===
+    raw_derivative = (error - prev_error) / dt
+    
+    # Low-pass filter on derivative
+    derivative = alpha * prev_derivative + (1 - alpha) * raw_derivative
+    D = Kd * derivative
+    
+    # === Output ===
+    output = min(output_max, max(output_min, P + I + D))
+    
+    return output, integral, derivative, error, P, I, D
+
+
+if NUMBA_AVAILABLE:
+    # Compile ตอน import ไม่ให้ tick แรกของ control loop ช้า
+    _pid_step(1.0, 0.0, 0.0, -1.0, 1.0, -1.0, 1.0, 0.1, 0.0, 0.0, 0.0, 0.0, 0.0, 0.02)
+
+
 class PIDController:
     """
     PID Controller with Anti-Windup and Derivative Filtering
@@ -56,13 +116,15 @@ class PIDController:
         Ki: float = 0.0, 
         Kd: float = 0.0,
         output_limits: Tuple[float, float] = (-255, 255),
-        name: str = "PID"
+        name: str = "PID",
+        record_history: bool = False
     ):
         """
         Args:
             Kp, Ki, Kd: PID gains
             output_limits: (min, max) output values
             name: Controller name for logging
+            record_history: เก็บ debug history ทุก tick (เปิดเฉพาะตอนจูน)
         """
         self.gains = PIDGains(
             Kp=Kp, Ki=Ki, Kd=Kd,
@@ -77,67 +139,60 @@ class PIDController:
         self.prev_derivative = 0.0
         self.prev_time = None
         
-        # Debug history
-        self._history: List[dict] = []
+        # Debug history: ring buffer (แถวละ 1 tick, คอลัมน์ตาม HISTORY_FIELDS)
+        self.record_history = record_history
         self._max_history = 1000
+        self._history = np.empty((self._max_history, len(HISTORY_FIELDS)), dtype=np.float64)
+        self._history_idx = 0
+        self._history_len = 0
     
-    def compute(self, setpoint: float, measurement: float, dt: Optional[float] = None) -> float:
+    def compute(self, setpoint: float, measurement: float, dt: float) -> float:
         """
-        คำนวณ output จาก PID
+        คำนวณ output จาก PID (fast path สำหรับ control loop ที่รู้ dt อยู่แล้ว)
         
         Args:
             setpoint: ค่าเป้าหมาย
             measurement: ค่าที่วัดได้จริง
-            dt: Time delta (ถ้าไม่ระบุจะคำนวณเอง)
+            dt: Time delta (seconds)
         
         Returns:
             Output value (clamped to limits)
         """
-        current_time = time.time()
-        
-        # Compute dt if not provided
-        if dt is None:
-            if self.prev_time is not None:
-                dt = current_time - self.prev_time
-            else:
-                dt = 0.02  # Default 50Hz
-        self.prev_time = current_time
+        return self._compute(setpoint, measurement, dt, time.perf_counter())
+    
+    def _compute(self, setpoint: float, measurement: float, dt: float, now: float) -> float:
+        """PID step ที่ tick เวลา now (perf_counter) - ผู้เรียกอ่านนาฬิกาเองครั้งเดียว"""
+        self.prev_time = now
         
         # Ensure minimum dt to avoid division by zero
-        dt = max(dt, 0.001)
-        
-        # Calculate error
-        error = setpoint - measurement
-        
-        # === Proportional ===
-        P = self.gains.Kp * error
-        
-        # === Integral with Anti-Windup ===
-        self.integral += error * dt
-        self.integral = max(self.gains.integral_min, 
-                           min(self.gains.integral_max, self.integral))
-        I = self.gains.Ki * self.integral
-        
-        # === Derivative with Filtering ===
-        raw_derivative = (error - self.prev_error) / dt
-        
-        # Low-pass filter on derivative
-        alpha = self.gains.derivative_filter
-        filtered_derivative = alpha * self.prev_derivative + (1 - alpha) * raw_derivative
-        self.prev_derivative = filtered_derivative
-        
-        D = self.gains.Kd * filtered_derivative
+        dt = max(dt, MIN_DT)
+        
+        g = self.gains
+        output, self.integral, self.prev_derivative, error, P, I, D = _pid_step(
+            g.Kp, g.Ki, g.Kd,
+            g.integral_min, g.integral_max,
+            g.output_min, g.output_max,
+            g.derivative_filter,
+            self.integral, self.prev_error, self.prev_derivative,
+            float(setpoint), float(measurement), float(dt)
+        )
         self.prev_error = error
         
-        # === Output ===
-        output = P + I + D
-        output = max(self.gains.output_min, min(self.gains.output_max, output))
-        
         # Log history
-        self._add_history(setpoint, measurement, error, P, I, D, output)
+        if self.record_history:
+            self._add_history(now, setpoint, measurement, error, P, I, D, output)
         
         return output
     
+    def compute_auto(self, setpoint: float, measurement: float) -> float:
+        """คำนวณ output โดยหา dt จากเวลาตั้งแต่การเรียกครั้งก่อนเอง"""
+        now = time.perf_counter()  # monotonic
+        if self.prev_time is not None:
+            dt = now - self.prev_time
+        else:
+            dt = DEFAULT_DT
+        return self._compute(setpoint, measurement, dt, now)
+    
     def reset(self):
         """Reset controller state"""
         self.integral = 0.0
@@ -156,44 +211,139 @@ class PIDController:
             self.gains.Kd = Kd
         logger.info(f"{self.name} gains updated: Kp={self.gains.Kp}, Ki={self.gains.Ki}, Kd={self.gains.Kd}")
     
-    def _add_history(self, setpoint, measurement, error, P, I, D, output):
-        """Add to debug history"""
-        self._history.append({
-            'time': time.time(),
-            'setpoint': setpoint,
-            'measurement': measurement,
-            'error': error,
-            'P': P,
-            'I': I,
-            'D': D,
-            'output': output
-        })
-        
-        # Limit history size
-        if len(self._history) > self._max_history:
-            self._history = self._history[-self._max_history:]
-    
-    def get_history(self) -> List[dict]:
-        """Get debug history"""
-        return self._history.copy()
+    def _add_history(self, t, setpoint, measurement, error, P, I, D, output):
+        """Add to debug history (เขียนทับแถวเก่าสุดเมื่อเต็ม, t = perf_counter ของ tick นี้)"""
+        self._history[self._history_idx] = (
+            t, setpoint, measurement, error, P, I, D, output
+        )
+        self._history_idx = (self._history_idx + 1) % self._max_history
+        if self._history_len < self._max_history:
+            self._history_len += 1
+    
+    def _history_rows(self) -> np.ndarray:
+        """History rows เรียงจากเก่าไปใหม่"""
+        if self._history_len < self._max_history:
+            return self._history[:self._history_len]
+        return np.concatenate((self._history[self._history_idx:], self._history[:self._history_idx]))
+    
+    def get_history(self) -> np.ndarray:
+        """
+        Get debug history: array (samples, len(HISTORY_FIELDS)) แบบ read-only เรียงเก่า→ใหม่
+        
+        ก่อน buffer เต็มจะเป็น view (ไม่ copy) ซึ่งจะถูกเขียนทับเมื่อ buffer วน;
+        ถ้าต้องเก็บไว้นานให้ .copy() เอง
+        """
+        rows = self._history_rows()  # slice/concatenate เป็น array object ใหม่เสมอ
+        rows.flags.writeable = False
+        return rows
     
     def get_stats(self) -> dict:
         """Get controller statistics"""
-        if not self._history:
+        if not self._history_len:
             return {}
         
-        errors = [h['error'] for h in self._history]
-        outputs = [h['output'] for h in self._history]
+        # ลำดับไม่มีผลกับสถิติ ใช้แถวที่มีข้อมูลตรงๆ
+        rows = self._history[:self._history_len]
+        errors = rows[:, _ERROR_COL]
+        outputs = rows[:, _OUTPUT_COL]
         
         return {
-            'samples': len(self._history),
-            'error_avg': sum(errors) / len(errors),
-            'error_max': max(abs(e) for e in errors),
-            'output_avg': sum(outputs) / len(outputs),
+            'samples': self._history_len,
+            'error_avg': float(errors.mean()),
+            'error_max': float(np.abs(errors).max()),
+            'output_avg': float(outputs.mean()),
             'integral': self.integral
         }
 
 
+class VectorPIDController:
+    """
+    PID หลายแกนในการเรียกครั้งเดียว (state เป็น numpy array ขนาด n_axes)
+    
+    คณิตศาสตร์เหมือน PIDController ทุกอย่าง แต่ overhead ของ numpy ต่อครั้งคงที่
+    จึงคุ้มเมื่อมีหลายแกน (~6 แกนขึ้นไป); แขน 2 แกนปัจจุบันใช้ PIDController แยกแกนเร็วกว่า
+    
+    Usage:
+        pid = VectorPIDController(Kp=[2.0, 3.0], Ki=[0.1, 0.2], Kd=[0.05, 0.1])
+        outputs = pid.compute(targets, currents, dt)
+    """
+    
+    def __init__(
+        self,
+        Kp,
+        Ki=0.0,
+        Kd=0.0,
+        output_limits: Tuple[float, float] = (-255, 255),
+        integral_limits: Tuple[float, float] = (-100.0, 100.0),
+        derivative_filter: float = 0.1,
+        name: str = "VectorPID"
+    ):
+        """
+        Args:
+            Kp, Ki, Kd: Gains ต่อแกน (sequence) หรือค่าเดียวใช้ทุกแกน
+            output_limits: (min, max) output values
+            integral_limits: (min, max) anti-windup limits
+            derivative_filter: Derivative low-pass filter (0 = no filter)
+            name: Controller name for logging
+        """
+        self.Kp = np.atleast_1d(np.array(Kp, dtype=np.float64))
+        n_axes = self.Kp.shape[0]
+        self.Ki = np.broadcast_to(np.array(Ki, dtype=np.float64), (n_axes,)).copy()
+        self.Kd = np.broadcast_to(np.array(Kd, dtype=np.float64), (n_axes,)).copy()
+        self.output_min, self.output_max = output_limits
+        self.integral_min, self.integral_max = integral_limits
+        self.derivative_filter = derivative_filter
+        self.name = name
+        
+        # State
+        self.integral = np.zeros(n_axes)
+        self.prev_error = np.zeros(n_axes)
+        self.prev_derivative = np.zeros(n_axes)
+    
+    @property
+    def n_axes(self) -> int:
+        return self.Kp.shape[0]
+    
+    def compute(self, setpoints, measurements, dt: float) -> np.ndarray:
+        """
+        คำนวณ output ของทุกแกน
+        
+        Args:
+            setpoints: ค่าเป้าหมายต่อแกน
+            measurements: ค่าที่วัดได้ต่อแกน
+            dt: Time delta (seconds)
+        
+        Returns:
+            Output array (clamped to limits)
+        """
+        dt = max(dt, MIN_DT)
+        error = np.subtract(setpoints, measurements, dtype=np.float64)
+        
+        # === Integral with Anti-Windup ===
+        integral = self.integral
+        integral += error * dt
+        np.clip(integral, self.integral_min, self.integral_max, out=integral)
+        
+        # === Derivative with Filtering ===
+        alpha = self.derivative_filter
+        raw_derivative = (error - self.prev_error) / dt
+        derivative = alpha * self.prev_derivative + (1 - alpha) * raw_derivative
+        self.prev_derivative = derivative
+        self.prev_error = error
+        
+        # === Output ===
+        output = self.Kp * error + self.Ki * integral + self.Kd * derivative
+        np.clip(output, self.output_min, self.output_max, out=output)
+        return output
+    
+    def reset(self):
+        """Reset controller state"""
+        self.integral.fill(0.0)
+        self.prev_error.fill(0.0)
+        self.prev_derivative.fill(0.0)
+        logger.debug(f"{self.name} PID reset")
+
+
 class ImprovedTimeBasedController:
     """
     ปรับปรุง Time-Based Control สำหรับระบบที่ไม่มี Encoder
@@ -274,6 +424,28 @@ class ImprovedTimeBasedController:
         
         return total_time
     
+    def calculate_move_times(self, targets_cm, from_position: float = None) -> np.ndarray:
+        """
+        คำนวณเวลาเคลื่อนที่หลายเป้าหมายในครั้งเดียว (vectorized ของ calculate_move_time)
+        
+        Args:
+            targets_cm: ระยะทางเป้าหมายหลายค่า (cm)
+            from_position: ตำแหน่งเริ่มต้น (ถ้าไม่ระบุใช้ current_position)
+        
+        Returns:
+            Array ของเวลาที่ต้องใช้ (วินาที), 0 สำหรับระยะที่สั้นเกินไป
+        """
+        if from_position is None:
+            from_position = self.current_position
+        
+        distance = np.abs(np.asarray(targets_cm, dtype=np.float64) - from_position)
+        
+        total_time = (distance / self.speed + self.accel_time) * self.overshoot_factor * self.calibration_factor
+        np.maximum(total_time, self.min_move_time, out=total_time)
+        total_time[distance < 0.1] = 0.0  # Too small, skip
+        
+        return total_time
+    
     def get_move_command(self, target_cm: float) -> dict:
         """
         Generate move command with timing
@@ -422,7 +594,7 @@ if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
     
     print("\n=== Testing PID Controller ===")
-    pid = PIDController(Kp=2.0, Ki=0.1, Kd=0.05, name="Test")
+    pid = PIDController(Kp=2.0, Ki=0.1, Kd=0.05, name="Test", record_history=True)
     
     # Simulate ramp to target
     target = 10.0
@@ -6,18 +6,85 @@ Author: AgriBot Team
 Created: 2026-01-21
 """
 
+import math
+import os
 import numpy as np
 import cv2
 import json
 from pathlib import Path
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from typing import Tuple, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+def _opencl_enabled() -> bool:
+    """OpenCL (T-API) ใช้ได้และ process ไม่ได้ปิดไว้ (ไม่แตะ setUseOpenCL ของทั้ง process)"""
+    return cv2.ocl.haveOpenCL() and cv2.ocl.useOpenCL()
+
+
+# findChessboardCornersSB: ได้ตำแหน่ง subpixel ในตัว ไม่ต้อง cornerSubPix
+CHESSBOARD_SB_FLAGS = cv2.CALIB_CB_NORMALIZE_IMAGE | cv2.CALIB_CB_EXHAUSTIVE | cv2.CALIB_CB_ACCURACY
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+    
+    def njit(**kwargs):
+        """ไม่มี numba: ใช้ฟังก์ชัน Python ตามเดิม"""
+        return lambda func: func
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def _pixels_to_world_kernel(xs, ys, out, fx, fy, cx, cy, angle_rad, tilted, height, offset_x, offset_y):
+    """
+    Simple projection ทีละจุดแบบ compiled (numba, แบ่งจุดให้หลาย core ด้วย prange)
+    
+    เขียนผลลง out[:, 0:2]; ใช้เมื่อมี numba เท่านั้น ไม่งั้น numpy path เร็วกว่า
+    """
+    for i in prange(xs.shape[0]):
+        x_norm = (xs[i] - cx) / fx
+        y_norm = (ys[i] - cy) / fy
+        if tilted:
+            scale = height / math.cos(angle_rad + y_norm * angle_rad * 0.5)
+        else:
+            scale = height
+        out[i, 0] = x_norm * scale + offset_x
+        out[i, 1] = y_norm * scale + offset_y
+
+
+# Field ที่ถ้าเปลี่ยนแล้วต้องสร้าง intrinsic_matrix ใหม่
+_INTRINSIC_FIELDS = frozenset(('fx', 'fy', 'cx', 'cy'))
+
+# key ในไฟล์ JSON → ชื่อ field ของ CameraConfig (เรียงตามลำดับที่ save_to_file เขียน)
+_CONFIG_FILE_KEYS = {
+    'img_width': 'width',
+    'img_height': 'height',
+    'fx': 'fx',
+    'fy': 'fy',
+    'cx': 'cx',
+    'cy': 'cy',
+    'distortion': 'distortion',
+    'camera_height_cm': 'camera_height_cm',
+    'camera_angle_deg': 'camera_angle_deg',
+    'offset_x_cm': 'offset_x_cm',
+    'offset_y_cm': 'offset_y_cm',
+    'offset_z_cm': 'offset_z_cm',
+}
+
+
+@dataclass(slots=True)
 class CameraConfig:
     """Camera intrinsic and extrinsic parameters"""
     # Image size
@@ -42,59 +109,72 @@ class CameraConfig:
     offset_y_cm: float = 0.0
     offset_z_cm: float = 0.0
     
+    # Cached arrays (สร้างครั้งแรกที่ใช้, ล้างอัตโนมัติเมื่อ field ที่เกี่ยวข้องเปลี่ยน)
+    _K_cache: Optional[np.ndarray] = field(default=None, init=False, repr=False, compare=False)
+    _dist_cache: Optional[np.ndarray] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in _INTRINSIC_FIELDS:
+            object.__setattr__(self, '_K_cache', None)
+        elif name == 'distortion':
+            object.__setattr__(self, '_dist_cache', None)
+    
     @property
     def intrinsic_matrix(self) -> np.ndarray:
         """Get camera intrinsic matrix K (3x3)"""
-        return np.array([
-            [self.fx, 0, self.cx],
-            [0, self.fy, self.cy],
-            [0, 0, 1]
-        ], dtype=np.float64)
+        if self._K_cache is None:
+            K = np.array([
+                [self.fx, 0, self.cx],
+                [0, self.fy, self.cy],
+                [0, 0, 1]
+            ], dtype=np.float64)
+            K.flags.writeable = False  # array เดียวใช้ร่วมกันทุกผู้เรียก ห้ามแก้ในที่
+            self._K_cache = K
+        return self._K_cache
     
     @property
     def distortion_coeffs(self) -> np.ndarray:
         """Get distortion coefficients"""
-        return np.array(self.distortion, dtype=np.float64)
+        if self._dist_cache is None:
+            dist = np.array(self.distortion, dtype=np.float64)
+            dist.flags.writeable = False
+            self._dist_cache = dist
+        return self._dist_cache
+    
+    def update_intrinsics(self, fx: float, fy: float, cx: float, cy: float, distortion: tuple):
+        """อัปเดต intrinsic + distortion พร้อมกัน (cache ถูกล้างให้เอง)"""
+        self.fx = fx
+        self.fy = fy
+        self.cx = cx
+        self.cy = cy
+        self.distortion = tuple(distortion)
     
     @classmethod
     def load_from_file(cls, filepath: str) -> 'CameraConfig':
-        """Load config from JSON file"""
-        with open(filepath, 'r') as f:
-            data = json.load(f)
-        
-        return cls(
-            width=data.get('img_width', 640),
-            height=data.get('img_height', 480),
-            fx=data.get('fx', 600.0),
-            fy=data.get('fy', 600.0),
-            cx=data.get('cx', 320.0),
-            cy=data.get('cy', 240.0),
-            distortion=tuple(data.get('distortion', [0, 0, 0, 0, 0])),
-            camera_height_cm=data.get('camera_height_cm', 50.0),
-            camera_angle_deg=data.get('camera_angle_deg', 45.0),
-            offset_x_cm=data.get('offset_x_cm', 0.0),
-            offset_y_cm=data.get('offset_y_cm', 0.0),
-            offset_z_cm=data.get('offset_z_cm', 0.0),
-        )
+        """Load config from JSON file (key ที่ไม่มีในไฟล์ใช้ค่า default)"""
+        if ORJSON_AVAILABLE:
+            data = orjson.loads(Path(filepath).read_bytes())
+        else:
+            with open(filepath, 'r') as f:
+                data = json.load(f)
+        
+        kwargs = {_CONFIG_FILE_KEYS[k]: v for k, v in data.items() if k in _CONFIG_FILE_KEYS}
+        if 'distortion' in kwargs:
+            kwargs['distortion'] = tuple(kwargs['distortion'])
+        return cls(**kwargs)
     
     def save_to_file(self, filepath: str):
         """Save config to JSON file"""
-        data = {
-            'img_width': self.width,
-            'img_height': self.height,
-            'fx': self.fx,
-            'fy': self.fy,
-            'cx': self.cx,
-            'cy': self.cy,
-            'distortion': list(self.distortion),
-            'camera_height_cm': self.camera_height_cm,
-            'camera_angle_deg': self.camera_angle_deg,
-            'offset_x_cm': self.offset_x_cm,
-            'offset_y_cm': self.offset_y_cm,
-            'offset_z_cm': self.offset_z_cm,
-        }
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        data = {key: getattr(self, name) for key, name in _CONFIG_FILE_KEYS.items()}
+        data['distortion'] = list(self.distortion)
+        if ORJSON_AVAILABLE:
+            # OPT_SERIALIZE_NUMPY: ค่าจาก calibrateCamera เป็น numpy float
+            Path(filepath).write_bytes(
+                orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with open(filepath, 'w') as f:
+                json.dump(data, f, indent=2)
 
 
 class CameraCalibration:
@@ -113,14 +193,76 @@ class CameraCalibration:
         else:
             self.config = CameraConfig()
         
+        self._pt_buf = np.zeros((1, 1, 2), dtype=np.float32)  # จุดเดียวสำหรับ undistortPoints (ไม่ต้อง allocate ทุกครั้ง)
+        self._rebuild_cache()
+        
+        logger.info(f"Camera Calibration initialized: {self.config.width}x{self.config.height}")
+    
+    def _rebuild_cache(self):
+        """คำนวณค่าที่ใช้ซ้ำจาก config ใหม่ (เรียกทุกครั้งที่ config เปลี่ยน)"""
         # Cache matrices
         self._K = self.config.intrinsic_matrix
         self._dist = self.config.distortion_coeffs
+        self._has_distortion = bool(np.any(self._dist != 0))
+        self._K_inv = np.linalg.inv(self._K)  # back-projection: [x_norm, y_norm, 1] = K^-1 @ [u, v, 1]
+        
+        # Undistort LUT ของทุก pixel ในภาพ (h, w, 2): pixel จำนวนเต็มไม่ต้องเรียก OpenCV อีก
+        self._undistort_lut = self._build_undistort_lut() if self._has_distortion else None
+        self._undistort_maps = {}  # (w, h) → (map_x, map_y) สำหรับ undistort_image
+        self._undistort_umaps = {}  # (w, h) → (map_x, map_y) เป็น UMat บน GPU สำหรับ undistort_frame
+        
+        # Precompute values (Python float: scalar path ใช้ math ซึ่งเร็วกว่า numpy กับค่าเดี่ยว)
+        self._angle_rad = math.radians(self.config.camera_angle_deg)
+        self._P = self._build_projection_matrix()
+        self._P_rows = self._P.tolist()  # Python floats สำหรับ world_to_pixel ทีละจุด
+        
+        # Scalar pixel → world: คูณด้วยส่วนกลับแทนการหาร และเลือก path ตามมุมกล้องครั้งเดียว
+        self._inv_fx = 1.0 / self.config.fx
+        self._inv_fy = 1.0 / self.config.fy
+        self._half_angle_rad = self._angle_rad * 0.5
+        if self.config.camera_angle_deg < 5:
+            self._pixel_to_world_simple = self._pixel_to_world_nadir
+            self.pixel_to_world_at_ground = self._pixel_to_world_nadir_ground
+        else:
+            self._pixel_to_world_simple = self._pixel_to_world_tilted
+            self.pixel_to_world_at_ground = self._pixel_to_world_tilted_ground
+        
+        # visualize_calibration: จุดปลาย crosshair (int สำหรับ cv2.line) + buffer ภาพผลลัพธ์ที่ใช้ซ้ำ
+        cx_i, cy_i = round(self.config.cx), round(self.config.cy)
+        self._crosshair = (
+            ((cx_i - 50, cy_i), (cx_i + 50, cy_i)),
+            ((cx_i, cy_i - 50), (cx_i, cy_i + 50)),
+        )
+        self._vis_buf = None
+        
+        # z = 0 (พื้น): กล้องตั้งฉาก scale คงที่ → world = pixel * k + b (คูณ-บวกครั้งเดียวต่อแกน)
+        H = self.config.camera_height_cm
+        self._ground_kx = H * self._inv_fx
+        self._ground_ky = H * self._inv_fy
+        self._ground_bx = self.config.offset_x_cm - self.config.cx * self._ground_kx
+        self._ground_by = self.config.offset_y_cm - self.config.cy * self._ground_ky
+    
+    def _build_projection_matrix(self) -> np.ndarray:
+        """
+        Projection matrix P (3x4) ของ forward model เดียวกับ pixel_to_world_simple
         
-        # Precompute values
-        self._angle_rad = np.radians(self.config.camera_angle_deg)
-        
-        logger.info(f"Camera Calibration initialized: {self.config.width}x{self.config.height}")
+        [u, v, w] = P @ [x, y, z, 1] → pixel = (u/w, v/w), w = H - z
+        (กล้องเอียง ≥ 5°: scale = (H - z) / cos(θ), ไม่งั้น scale = H - z)
+        """
+        cfg = self.config
+        c = 1.0 if cfg.camera_angle_deg < 5 else math.cos(self._angle_rad)
+        H = cfg.camera_height_cm
+        return np.array([
+            [cfg.fx * c, 0.0, -cfg.cx, cfg.cx * H - cfg.fx * c * cfg.offset_x_cm],
+            [0.0, cfg.fy * c, -cfg.cy, cfg.cy * H - cfg.fy * c * cfg.offset_y_cm],
+            [0.0, 0.0, -1.0, H]
+        ], dtype=np.float64)
+    
+    def _build_undistort_lut(self) -> np.ndarray:
+        """undistortPoints ครั้งเดียวกับทุก pixel (x, y) ของภาพขนาด config"""
+        w, h = self.config.width, self.config.height
+        grid = np.indices((h, w), dtype=np.float32)[::-1].transpose(1, 2, 0).reshape(-1, 1, 2)
+        return cv2.undistortPoints(grid, self._K, self._dist, P=self._K).reshape(h, w, 2)
     
     def pixel_to_world_simple(self, x_px: int, y_px: int, z_world: float = 0.0) -> Tuple[float, float, float]:
         """
@@ -138,30 +280,110 @@ class CameraCalibration:
         Returns:
             (x_world, y_world, z_world) in cm
         """
-        # Normalize to image center
-        x_norm = (x_px - self.config.cx) / self.config.fx
-        y_norm = (y_px - self.config.cy) / self.config.fy
-        
         # Calculate scale based on camera geometry
         # For camera looking down at angle θ from vertical:
         # - vertical distance = H * cos(θ)
         # - horizontal offset = H * sin(θ)
+        # (เลือก nadir / tilted ไว้แล้วตอน _rebuild_cache)
+        return self._pixel_to_world_simple(x_px, y_px, z_world)
+    
+    def _pixel_to_world_nadir(self, x_px: float, y_px: float, z_world: float) -> Tuple[float, float, float]:
+        """Nearly vertical camera (looking straight down): scale = effective height"""
+        cfg = self.config
+        scale = cfg.camera_height_cm - z_world
+        
+        x_world = (x_px - cfg.cx) * self._inv_fx * scale + cfg.offset_x_cm
+        y_world = (y_px - cfg.cy) * self._inv_fy * scale + cfg.offset_y_cm
+        
+        return (x_world, y_world, z_world)
+    
+    def _pixel_to_world_tilted(self, x_px: float, y_px: float, z_world: float) -> Tuple[float, float, float]:
+        """Angled camera: adjust for perspective (objects further appear smaller)"""
+        cfg = self.config
+        x_norm = (x_px - cfg.cx) * self._inv_fx
+        y_norm = (y_px - cfg.cy) * self._inv_fy
+        
+        y_angle_offset = y_norm * self._half_angle_rad  # Approximate
+        scale = (cfg.camera_height_cm - z_world) / math.cos(self._angle_rad + y_angle_offset)
+        
+        x_world = x_norm * scale + cfg.offset_x_cm
+        y_world = y_norm * scale + cfg.offset_y_cm
+        
+        return (x_world, y_world, z_world)
+    
+    def pixel_to_world_at_ground(self, x_px: float, y_px: float) -> Tuple[float, float, float]:
+        """
+        pixel_to_world_simple(x_px, y_px, 0.0) สำหรับผู้เรียกที่รู้ว่าเป้าอยู่บนพื้น (z = 0)
+        
+        (ถูกแทนด้วย variant ตามมุมกล้องใน _rebuild_cache)
+        """
+        return self._pixel_to_world_simple(x_px, y_px, 0.0)
+    
+    def _pixel_to_world_nadir_ground(self, x_px: float, y_px: float) -> Tuple[float, float, float]:
+        """Nadir ที่ z = 0: scale คงที่ ใช้ค่าที่คำนวณไว้แล้ว"""
+        return (x_px * self._ground_kx + self._ground_bx, y_px * self._ground_ky + self._ground_by, 0.0)
+    
+    def _pixel_to_world_tilted_ground(self, x_px: float, y_px: float) -> Tuple[float, float, float]:
+        """Tilted ที่ z = 0: cos ยังขึ้นกับ y ต่อจุด ประหยัดได้แค่ effective height"""
+        cfg = self.config
+        x_norm = (x_px - cfg.cx) * self._inv_fx
+        y_norm = (y_px - cfg.cy) * self._inv_fy
+        
+        scale = cfg.camera_height_cm / math.cos(self._angle_rad + y_norm * self._half_angle_rad)
+        
+        return (x_norm * scale + cfg.offset_x_cm, y_norm * scale + cfg.offset_y_cm, 0.0)
+    
+    def pixel_to_world_batch(self, xs, ys, z_world: float = 0.0) -> np.ndarray:
+        """
+        แปลง pixel หลายจุด → world coordinates (Simple Projection แบบ vectorized)
+        
+        คณิตศาสตร์เดียวกับ pixel_to_world_simple แต่คำนวณทั้ง array ในครั้งเดียว
+        
+        Args:
+            xs, ys: Pixel positions (N,)
+            z_world: Target Z height for all points
+        
+        Returns:
+            (N, 3) array of (x_world, y_world, z_world) in cm
+        """
+        xs = np.asarray(xs, dtype=np.float64).ravel()
+        ys = np.asarray(ys, dtype=np.float64).ravel()
         
+        world = np.empty((xs.size, 3), dtype=np.float64)
+        world[:, 2] = z_world
         effective_height = self.config.camera_height_cm - z_world
         
+        if NUMBA_AVAILABLE:
+            cfg = self.config
+            _pixels_to_world_kernel(
+                xs, ys, world, cfg.fx, cfg.fy, cfg.cx, cfg.cy,
+                float(self._angle_rad), cfg.camera_angle_deg >= 5, effective_height,
+                cfg.offset_x_cm, cfg.offset_y_cm
+            )
+            return world
+        
+        x_norm = world[:, 0]
+        y_norm = world[:, 1]
+        
+        # Normalize ด้วย K^-1 (เขียนลง output โดยตรง): x_norm = u * (1/fx) + (-cx/fx), คูณ-บวกแทนลบ-หาร
+        K_inv = self._K_inv
+        np.multiply(xs, K_inv[0, 0], out=x_norm)
+        x_norm += K_inv[0, 2]
+        np.multiply(ys, K_inv[1, 1], out=y_norm)
+        y_norm += K_inv[1, 2]
+        
+        # มุมกล้องคงที่ต่อ calibration: เลือก branch ครั้งเดียวต่อ batch
         if self.config.camera_angle_deg < 5:
-            # Nearly vertical camera (looking straight down)
             scale = effective_height
         else:
-            # Angled camera
-            # Adjust for perspective (objects further appear smaller)
-            y_angle_offset = y_norm * self._angle_rad * 0.5  # Approximate
-            scale = effective_height / np.cos(self._angle_rad + y_angle_offset)
+            scale = effective_height / np.cos(self._angle_rad + y_norm * self._angle_rad * 0.5)
         
-        x_world = x_norm * scale + self.config.offset_x_cm
-        y_world = y_norm * scale + self.config.offset_y_cm
+        x_norm *= scale
+        x_norm += self.config.offset_x_cm
+        y_norm *= scale
+        y_norm += self.config.offset_y_cm
         
-        return (x_world, y_world, z_world)
+        return world
     
     def pixel_to_world(self, x_px: int, y_px: int, z_world: float = 0.0) -> Tuple[float, float, float]:
         """
@@ -177,17 +399,122 @@ class CameraCalibration:
         Returns:
             (x_world, y_world, z_world) in cm
         """
-        # 1. Undistort point
-        pts = np.array([[[x_px, y_px]]], dtype=np.float32)
-        
-        if np.any(self._dist != 0):
-            undistorted = cv2.undistortPoints(pts, self._K, self._dist, P=self._K)
-            x_ud, y_ud = undistorted[0][0]
+        # 1. Undistort point (pixel จำนวนเต็มในภาพใช้ LUT)
+        if self._has_distortion:
+            xi = int(x_px)
+            yi = int(y_px)
+            if xi == x_px and yi == y_px and 0 <= xi < self.config.width and 0 <= yi < self.config.height:
+                x_ud, y_ud = self._undistort_lut[yi, xi].tolist()
+            else:
+                pt = self._pt_buf
+                pt[0, 0, 0] = x_px
+                pt[0, 0, 1] = y_px
+                undistorted = cv2.undistortPoints(pt, self._K, self._dist, P=self._K)
+                x_ud, y_ud = undistorted[0][0].tolist()
         else:
             x_ud, y_ud = x_px, y_px
         
         # 2. Use simple projection with undistorted point
-        return self.pixel_to_world_simple(x_ud, y_ud, z_world)
+        return self._pixel_to_world_simple(x_ud, y_ud, z_world)
+    
+    def undistort_points_batch(self, pts_px) -> np.ndarray:
+        """
+        Undistort pixel หลายจุดด้วย cv2.undistortPoints ครั้งเดียว
+        
+        Args:
+            pts_px: (N, 2) pixel positions
+        
+        Returns:
+            (N, 2) undistorted pixel positions (float32)
+        """
+        pts_px = np.asarray(pts_px)
+        if not self._has_distortion:
+            return pts_px.reshape(-1, 2).astype(np.float32)
+        
+        # Pixel จำนวนเต็มที่อยู่ในภาพทั้งหมด: gather จาก LUT
+        if np.issubdtype(pts_px.dtype, np.integer):
+            xs = pts_px[..., 0].ravel()
+            ys = pts_px[..., 1].ravel()
+            if (xs.size and xs.min() >= 0 and ys.min() >= 0
+                    and xs.max() < self.config.width and ys.max() < self.config.height):
+                return self._undistort_lut[ys, xs]
+        
+        pts = pts_px.reshape(-1, 1, 2).astype(np.float32)
+        return cv2.undistortPoints(pts, self._K, self._dist, P=self._K).reshape(-1, 2)
+    
+    def undistort_image(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Undistort ทั้งภาพด้วย cv2.remap (map คำนวณครั้งเดียวต่อขนาดภาพ)
+        
+        Args:
+            frame: Input image
+        
+        Returns:
+            Undistorted image (frame เดิมถ้าไม่มี distortion)
+        """
+        if not self._has_distortion:
+            return frame
+        
+        maps = self._get_undistort_maps(frame.shape[1], frame.shape[0])
+        return cv2.remap(frame, maps[0], maps[1], cv2.INTER_LINEAR)
+    
+    def undistort_frame(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Undistort ทั้งเฟรมบน GPU (OpenCL T-API) สำหรับ preprocess ทุกเฟรมกล้อง
+        
+        map ถูกอัปโหลดเป็น UMat ครั้งเดียวต่อขนาดภาพ; ถ้าไม่มี OpenCL หรือถูกปิดด้วย
+        cv2.ocl.setUseOpenCL(False) จะใช้ undistort_image (CPU)
+        
+        Args:
+            frame: Input image
+        
+        Returns:
+            Undistorted image (numpy array)
+        """
+        if not self._has_distortion or not _opencl_enabled():
+            return self.undistort_image(frame)
+        
+        h, w = frame.shape[:2]
+        umaps = self._undistort_umaps.get((w, h))
+        if umaps is None:
+            map_x, map_y = self._get_undistort_maps(w, h)
+            umaps = self._undistort_umaps[(w, h)] = (cv2.UMat(map_x), cv2.UMat(map_y))
+        
+        return cv2.remap(cv2.UMat(frame), umaps[0], umaps[1], cv2.INTER_LINEAR).get()
+    
+    def _get_undistort_maps(self, w: int, h: int) -> Tuple[np.ndarray, np.ndarray]:
+        """remap maps ของขนาดภาพ (w, h) (คำนวณครั้งเดียวแล้ว cache)"""
+        maps = self._undistort_maps.get((w, h))
+        if maps is None:
+            maps = cv2.initUndistortRectifyMap(self._K, self._dist, None, self._K, (w, h), cv2.CV_32FC1)
+            self._undistort_maps[(w, h)] = maps
+        return maps
+    
+    def pixels_to_world(self, x_px, y_px, z_world: float = 0.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        แปลง pixel หลายจุดพร้อมกัน → world coordinates (vectorized ของ pixel_to_world)
+        
+        Args:
+            x_px, y_px: Array-like of pixel positions (same shape)
+            z_world: Target Z height for all points
+        
+        Returns:
+            (x_world, y_world, z_world) arrays in cm, same shape as input
+        """
+        u = np.asarray(x_px)
+        v = np.asarray(y_px)
+        shape = u.shape
+        
+        if self._has_distortion:
+            # Undistort all points in one call
+            undistorted = self.undistort_points_batch(np.stack((u.ravel(), v.ravel()), axis=-1))
+            u = undistorted[:, 0]
+            v = undistorted[:, 1]
+        
+        world = self.pixel_to_world_batch(u, v, z_world)
+        return (world[:, 0].reshape(shape),
+                world[:, 1].reshape(shape),
+                world[:, 2].reshape(shape))
     
     def world_to_pixel(self, x_world: float, y_world: float, z_world: float = 0.0) -> Tuple[int, int]:
         """
@@ -197,32 +524,68 @@ class CameraCalibration:
             x_world, y_world, z_world: World coordinates in cm
         
         Returns:
-            (x_px, y_px)
+            (x_px, y_px) ปัดเป็น pixel ที่ใกล้ที่สุด (ไม่ตัดเศษเข้าหา 0 ซึ่งเอียงกับค่าติดลบ)
         """
-        # Adjust for offsets
-        x_adj = x_world - self.config.offset_x_cm
-        y_adj = y_world - self.config.offset_y_cm
+        p0, p1, p2 = self._P_rows
+        w = p2[0] * x_world + p2[1] * y_world + p2[2] * z_world + p2[3]
         
-        effective_height = self.config.camera_height_cm - z_world
+        x_px = round((p0[0] * x_world + p0[1] * y_world + p0[2] * z_world + p0[3]) / w)
+        y_px = round((p1[0] * x_world + p1[1] * y_world + p1[2] * z_world + p1[3]) / w)
         
-        if self.config.camera_angle_deg < 5:
-            scale = effective_height
-        else:
-            scale = effective_height / np.cos(self._angle_rad)
+        return (x_px, y_px)
+    
+    def world_to_pixel_batch(self, pts_world) -> np.ndarray:
+        """
+        แปลง world หลายจุด → pixel coordinates ด้วย projection matrix ครั้งเดียว
         
-        x_norm = x_adj / scale
-        y_norm = y_adj / scale
+        Args:
+            pts_world: (N, 3) world coordinates in cm
         
-        x_px = int(x_norm * self.config.fx + self.config.cx)
-        y_px = int(y_norm * self.config.fy + self.config.cy)
+        Returns:
+            (N, 2) pixel positions (int32, ปัดแบบเดียวกับ world_to_pixel)
+        """
+        pts_world = np.asarray(pts_world, dtype=np.float64).reshape(-1, 3)
+        uvw = np.einsum('ij,nj->ni', self._P[:, :3], pts_world)
+        uvw += self._P[:, 3]
+        return np.rint(uvw[:, :2] / uvw[:, 2:]).astype(np.int32)
+    
+    @staticmethod
+    def _process_calib_image(
+        path: str,
+        pattern_size: Tuple[int, int],
+        method: str = "classic"
+    ) -> Optional[Tuple[Optional[np.ndarray], Tuple[int, int]]]:
+        """
+        อ่านภาพ checkerboard 1 ภาพแล้วหา corner (เรียกจาก worker thread)
         
-        return (x_px, y_px)
+        Returns:
+            None ถ้าอ่านภาพไม่ได้, ไม่งั้น (corners หรือ None ถ้าหาไม่เจอ, (width, height))
+        """
+        img = cv2.imread(path)
+        if img is None:
+            return None
+        
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        image_size = gray.shape[::-1]
+        
+        # Find checkerboard corners
+        if method == "sb":
+            ret, corners = cv2.findChessboardCornersSB(gray, pattern_size, flags=CHESSBOARD_SB_FLAGS)
+        else:
+            ret, corners = cv2.findChessboardCorners(gray, pattern_size, None)
+            if ret:
+                # Refine corner positions
+                criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+                corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+        
+        return (corners if ret else None), image_size
     
     def calibrate_from_checkerboard(
         self, 
         image_paths: list, 
         pattern_size: Tuple[int, int] = (9, 6),
-        square_size_cm: float = 2.5
+        square_size_cm: float = 2.5,
+        method: str = "classic"
     ) -> bool:
         """
         Calibrate camera using checkerboard images
@@ -231,36 +594,39 @@ class CameraCalibration:
             image_paths: List of paths to calibration images
             pattern_size: (cols, rows) of inner corners
             square_size_cm: Size of each square in cm
+            method: "classic" = findChessboardCorners + cornerSubPix (default)
+                    "sb" = findChessboardCornersSB (subpixel ในตัว, ทนแสง/blur ดีกว่า แต่ช้ากว่า)
         
         Returns:
             True if calibration successful
         """
-        # Prepare object points
-        objp = np.zeros((pattern_size[0] * pattern_size[1], 3), np.float32)
-        objp[:, :2] = np.mgrid[0:pattern_size[0], 0:pattern_size[1]].T.reshape(-1, 2)
+        # Prepare object points (x เปลี่ยนเร็วสุด ตามลำดับ corner ของ OpenCV)
+        cols, rows = pattern_size
+        objp = np.zeros((cols * rows, 3), np.float32)
+        objp[:, :2] = np.indices((rows, cols), dtype=np.float32)[::-1].reshape(2, -1).T
         objp *= square_size_cm
         
         obj_points = []  # 3D points in real world
         img_points = []  # 2D points in image plane
         
-        for path in image_paths:
-            img = cv2.imread(path)
-            if img is None:
+        # อ่านภาพ + หา corner แต่ละภาพแยกกันได้ (OpenCV ปล่อย GIL) → ทำหลาย thread
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+            results = list(ex.map(
+                lambda path: self._process_calib_image(path, pattern_size, method),
+                image_paths
+            ))
+        
+        # log ตามลำดับ image_paths เหมือนเดิม
+        image_size = None
+        for path, result in zip(image_paths, results):
+            if result is None:
                 logger.warning(f"Could not read image: {path}")
                 continue
             
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Find checkerboard corners
-            ret, corners = cv2.findChessboardCorners(gray, pattern_size, None)
-            
-            if ret:
-                # Refine corner positions
-                criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
-                corners2 = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
-                
+            corners, image_size = result
+            if corners is not None:
                 obj_points.append(objp)
-                img_points.append(corners2)
+                img_points.append(corners)
                 logger.info(f"Found corners in: {path}")
             else:
                 logger.warning(f"No corners found in: {path}")
@@ -271,20 +637,18 @@ class CameraCalibration:
         
         # Calibrate camera
         ret, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(
-            obj_points, img_points, gray.shape[::-1], None, None
+            obj_points, img_points, image_size, None, None
         )
         
         if ret:
             # Update config
-            self.config.fx = mtx[0, 0]
-            self.config.fy = mtx[1, 1]
-            self.config.cx = mtx[0, 2]
-            self.config.cy = mtx[1, 2]
-            self.config.distortion = tuple(dist.flatten()[:5])
+            self.config.update_intrinsics(
+                fx=mtx[0, 0], fy=mtx[1, 1], cx=mtx[0, 2], cy=mtx[1, 2],
+                distortion=dist.flatten()[:5]
+            )
             
             # Update cached values
-            self._K = self.config.intrinsic_matrix
-            self._dist = self.config.distortion_coeffs
+            self._rebuild_cache()
             
             logger.info(f"Calibration successful! RMS error: {ret:.4f}")
             logger.info(f"fx={self.config.fx:.1f}, fy={self.config.fy:.1f}")
@@ -320,15 +684,17 @@ class CameraCalibration:
             target_x, target_y: Target pixel position
         
         Returns:
-            Annotated image
+            Annotated image (buffer เดิมถูกใช้ซ้ำทุกเฟรม - เก็บผลเฟรมก่อนไว้ต้อง .copy() เอง)
         """
-        img = image.copy()
+        # คัดลอกลง buffer ที่จองไว้แทน image.copy() ซึ่ง allocate ~1 MB ทุกเฟรม
+        img = self._vis_buf
+        if img is None or img.shape != image.shape or img.dtype != image.dtype:
+            img = self._vis_buf = np.empty_like(image)
+        np.copyto(img, image)
         
         # Draw crosshair at center
-        cv2.line(img, (self.config.cx - 50, self.config.cy), 
-                 (self.config.cx + 50, self.config.cy), (0, 255, 0), 1)
-        cv2.line(img, (self.config.cx, self.config.cy - 50), 
-                 (self.config.cx, self.config.cy + 50), (0, 255, 0), 1)
+        for pt1, pt2 in self._crosshair:
+            cv2.line(img, pt1, pt2, (0, 255, 0), 1)
         
         # Draw target point
         cv2.circle(img, (target_x, target_y), 8, (0, 0, 255), 2)
@@ -11,6 +11,7 @@ Author: AgriBot Team
 Created: 2026-01-21
 """
 
+import math
 import numpy as np
 from dataclasses import dataclass, field
 from typing import Tuple, List, Optional, Dict
@@ -19,6 +20,16 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    
+    def njit(**kwargs):
+        """ไม่มี numba: ใช้ฟังก์ชัน Python ตามเดิม"""
+        return lambda func: func
+
 
 class JointType(Enum):
     """ประเภทของข้อต่อ"""
@@ -27,6 +38,134 @@ class JointType(Enum):
     PRISMATIC = "prismatic"  # Linear on rail
 
 
+# ชุดชนิดข้อต่อ 2-DOF ที่มี solver เฉพาะ
+_LINEAR_ROTARY = (JointType.LINEAR, JointType.ROTARY)
+_ROTARY_ROTARY = (JointType.ROTARY, JointType.ROTARY)
+
+
+# ==================== Solver Kernels ====================
+# คณิตศาสตร์ล้วนของแต่ละ solver (scalar in → tuple out) compile ด้วย numba ได้
+# ส่วนสร้าง IKSolution อยู่ใน method ของ InverseKinematics
+
+# ความยาวแขน default (cm) ของ solver planar / 3-DOF
+DEFAULT_LINK_LENGTHS = (10.0, 10.0)
+
+
+def _link_constants(L1: float, L2: float) -> Tuple[float, ...]:
+    """
+    ค่าคงที่ของแขน 2 ท่อนที่ solver ใช้ทุกครั้ง (คำนวณครั้งเดียวตอนสร้าง engine)
+    
+    Returns:
+        (L1, L2, L1 + L2, |L1 - L2|, L1², L2², 2·L1·L2)
+    """
+    L1 = float(L1)
+    L2 = float(L2)
+    return (L1, L2, L1 + L2, abs(L1 - L2), L1**2, L2**2, 2 * L1 * L2)
+
+
+@njit(cache=True, fastmath=True)
+def _linear_rotary_kernel(x, y, z, z_min, z_max, y_min, y_max, y_abs_limit,
+                          z_speed, y_speed, z_current, y_current):
+    """
+    2-DOF linear-rotary → (z_value, y_value, z_time, y_time, reachable, horizontal_dist)
+    
+    รวมเวลาเคลื่อนที่ (Joint.time_to_move) ไว้ในนี้ด้วย: solver เรียก kernel ครั้งเดียวแล้วแพ็ก IKSolution
+    """
+    # Calculate horizontal distance
+    horizontal_dist = math.hypot(x, y)
+    
+    # Z extension needed
+    z_value = z_min if horizontal_dist < z_min else z_max if horizontal_dist > z_max else horizontal_dist
+    
+    # Y angle to reach target height
+    if z_value > 0:
+        # arctan(height / distance)
+        y_angle = math.degrees(math.atan2(-z, z_value))  # Negative z because down is positive angle
+    else:
+        y_angle = 0.0
+    y_value = y_min if y_angle < y_min else y_max if y_angle > y_max else y_angle
+    
+    # Check reachability
+    reachable = (
+        z_min <= horizontal_dist <= z_max and
+        abs(y_angle) <= y_abs_limit
+    )
+    
+    # Calculate times (เหมือน Joint.time_to_move)
+    z_time = abs(z_value - z_current) / z_speed if z_speed > 0 else 0.0
+    y_time = abs(y_value - y_current) / y_speed if y_speed > 0 else 0.0
+    return z_value, y_value, z_time, y_time, reachable, horizontal_dist
+
+
+@njit(cache=True, fastmath=True)
+def _planar_2dof_kernel(x, y, links, t1_min, t1_max, t2_min, t2_max):
+    """2-DOF planar → (theta1_deg, theta2_deg, reachable); เข้าไม่ถึงคืนมุม 0"""
+    L1, L2, L_sum, L_diff, L1_sq, L2_sq, two_L1L2 = links
+    d = math.hypot(x, y)
+    
+    # Check reachability
+    if d > L_sum or d < L_diff:
+        return 0.0, 0.0, False
+    
+    # Elbow angle (θ2)
+    cos_theta2 = (d**2 - L1_sq - L2_sq) / two_L1L2
+    cos_theta2 = -1.0 if cos_theta2 < -1 else 1.0 if cos_theta2 > 1 else cos_theta2
+    theta2 = math.acos(cos_theta2)  # Elbow down solution
+    
+    # Shoulder angle (θ1)
+    beta = math.atan2(y, x)
+    alpha = math.atan2(L2 * math.sin(theta2), L1 + L2 * math.cos(theta2))
+    theta1 = beta - alpha
+    
+    # Convert to degrees + clamp to joint limits
+    theta1_deg = math.degrees(theta1)
+    theta2_deg = math.degrees(theta2)
+    theta1_deg = t1_min if theta1_deg < t1_min else t1_max if theta1_deg > t1_max else theta1_deg
+    theta2_deg = t2_min if theta2_deg < t2_min else t2_max if theta2_deg > t2_max else theta2_deg
+    return theta1_deg, theta2_deg, True
+
+
+@njit(cache=True, fastmath=True)
+def _articulated_3dof_kernel(x, y, z, links, b_min, b_max, s_min, s_max, e_min, e_max):
+    """3-DOF articulated → (theta_base, theta_shoulder, theta_elbow, reachable, d)"""
+    L1, L2, L_sum, L_diff, L1_sq, L2_sq, two_L1L2 = links
+    # Base rotation
+    theta_base = math.degrees(math.atan2(y, x))
+    theta_base = b_min if theta_base < b_min else b_max if theta_base > b_max else theta_base
+    
+    # Project onto vertical plane through target
+    r = math.hypot(x, y)  # Horizontal distance
+    
+    # Solve 2-DOF planar IK in the vertical plane
+    d = math.hypot(r, z)
+    
+    if d > L_sum or d < L_diff:
+        return theta_base, 0.0, 0.0, False, d
+    
+    # Elbow angle
+    cos_theta_elbow = (d**2 - L1_sq - L2_sq) / two_L1L2
+    cos_theta_elbow = -1.0 if cos_theta_elbow < -1 else 1.0 if cos_theta_elbow > 1 else cos_theta_elbow
+    theta_elbow = math.degrees(math.acos(cos_theta_elbow))
+    
+    # Shoulder angle
+    beta = math.atan2(z, r)
+    alpha = math.atan2(L2 * math.sin(math.radians(theta_elbow)), 
+                       L1 + L2 * math.cos(math.radians(theta_elbow)))
+    theta_shoulder = math.degrees(beta + alpha)
+    
+    # Clamp to limits
+    theta_shoulder = s_min if theta_shoulder < s_min else s_max if theta_shoulder > s_max else theta_shoulder
+    theta_elbow = e_min if theta_elbow < e_min else e_max if theta_elbow > e_max else theta_elbow
+    return theta_base, theta_shoulder, theta_elbow, True, d
+
+
+if NUMBA_AVAILABLE:
+    # Compile ตอน import ไม่ให้ solve ครั้งแรกช้า
+    _linear_rotary_kernel(10.0, 0.0, 0.0, 0.0, 15.5, -90.0, 90.0, 90.0, 2.21, 45.0, 0.0, 0.0)
+    _planar_2dof_kernel(10.0, 5.0, _link_constants(10.0, 10.0), -180.0, 180.0, -180.0, 180.0)
+    _articulated_3dof_kernel(10.0, 5.0, 5.0, _link_constants(10.0, 10.0), -180.0, 180.0, -45.0, 135.0, 0.0, 150.0)
+
+
 @dataclass
 class Joint:
     """Configuration ของข้อต่อแต่ละตัว"""
@@ -40,7 +179,11 @@ class Joint:
     
     def clamp(self, value: float) -> float:
         """จำกัดค่าให้อยู่ในช่วงที่กำหนด"""
-        return np.clip(value, self.min_value, self.max_value)
+        if value < self.min_value:
+            return self.min_value
+        if value > self.max_value:
+            return self.max_value
+        return value
     
     def time_to_move(self, target: float) -> float:
         """คำนวณเวลาที่ใช้เคลื่อนที่ไปยังเป้าหมาย"""
@@ -52,9 +195,9 @@ class Joint:
         return self.min_value <= value <= self.max_value
 
 
-@dataclass
+@dataclass(slots=True)
 class IKSolution:
-    """ผลลัพธ์จากการคำนวณ Inverse Kinematics"""
+    """ผลลัพธ์จากการคำนวณ Inverse Kinematics (สร้างทุกครั้งที่ solve: slots ไม่มี __dict__ ต่อ object)"""
     joint_values: Dict[str, float]  # {joint_name: target_value}
     joint_times: Dict[str, float]   # {joint_name: time_seconds}
     reachable: bool = True
@@ -74,23 +217,52 @@ class InverseKinematics:
     คำนวณค่าข้อต่อจากตำแหน่งเป้าหมาย (x, y, z) ในหน่วย cm
     """
     
-    def __init__(self, joints: List[Joint], base_position: Tuple[float, float, float] = (0, 0, 0)):
+    def __init__(self, joints: List[Joint], base_position: Tuple[float, float, float] = (0, 0, 0),
+                 link_lengths: Tuple[float, float] = DEFAULT_LINK_LENGTHS):
         """
         Args:
             joints: รายการข้อต่อ
             base_position: ตำแหน่งฐานแขนกล (x, y, z) cm
+            link_lengths: ความยาวแขน (L1, L2) cm สำหรับ solver planar / 3-DOF
         """
         self.joints = {j.name: j for j in joints}
         self.joint_order = [j.name for j in joints]
-        self.base = np.array(base_position)
+        # ฐานเก็บเป็น float ธรรมดา: solve() ลบทีละแกน ไม่ต้องสร้าง array ทุกครั้ง
+        self._bx, self._by, self._bz = (float(v) for v in base_position)
+        self.base = (self._bx, self._by, self._bz)
+        
+        # ข้อต่อตามลำดับ (sub-solver อ่านตรงๆ ไม่ต้อง lookup dict ทุกครั้ง)
+        ordered = [self.joints[n] for n in self.joint_order] + [None, None, None]
+        self._j0, self._j1, self._j2 = ordered[:3]
+        
+        # ค่าคงที่ของหุ่นยนต์ที่ solver ใช้ทุกครั้ง
+        self._links = _link_constants(*link_lengths)
+        self._y_abs_limit = (
+            max(abs(self._j1.min_value), abs(self._j1.max_value)) if self._j1 is not None else 0.0
+        )
         
-        logger.info(f"IK Engine initialized with {len(joints)} joints")
+        # เลือก solver ครั้งเดียวตามจำนวน/ชนิดข้อต่อ (หุ่นยนต์ไม่เปลี่ยนระหว่างทำงาน)
+        joint_types = tuple(self.joints[n].type for n in self.joint_order)
+        if joint_types == _LINEAR_ROTARY:
+            self._solver = self._solve_linear_rotary
+            self._solver_many = self._solve_many_linear_rotary
+        elif joint_types == _ROTARY_ROTARY:
+            self._solver = self._solve_2dof_planar_xyz
+            self._solver_many = self._solve_many_2dof_planar
+        elif len(joint_types) == 3:
+            self._solver = self._solve_3dof_articulated
+            self._solver_many = self._solve_many_3dof_articulated
+        else:
+            self._solver = self._solve_simple  # Fallback: simple solution
+            self._solver_many = self._solve_many_simple
+        
+        logger.info("IK Engine initialized with %d joints", len(joints))
         for j in joints:
-            logger.info(f"  - {j.name}: {j.type.value}, range [{j.min_value}, {j.max_value}]")
+            logger.info("  - %s: %s, range [%s, %s]", j.name, j.type.value, j.min_value, j.max_value)
     
     def solve(self, x: float, y: float, z: float) -> IKSolution:
         """
-        คำนวณ Inverse Kinematics (เลือก solver ตามจำนวน DOF)
+        คำนวณ Inverse Kinematics (solver ตามจำนวน DOF ถูกเลือกไว้แล้วใน __init__)
         
         Args:
             x, y, z: ตำแหน่งเป้าหมาย (cm)
@@ -99,24 +271,24 @@ class InverseKinematics:
             IKSolution object
         """
         # Adjust for base position
-        target = np.array([x, y, z]) - self.base
-        
-        num_joints = len(self.joints)
+        return self._solver(x - self._bx, y - self._by, z - self._bz)
+    
+    def solve_many(self, x, y, z) -> Dict[str, np.ndarray]:
+        """
+        คำนวณ IK หลายเป้าหมายพร้อมกัน (vectorized, สำหรับ trajectory / วางแผนเก็บหลายจุด)
         
-        if num_joints == 2:
-            # Check joint types
-            joint_types = [self.joints[n].type for n in self.joint_order]
-            
-            if joint_types == [JointType.LINEAR, JointType.ROTARY]:
-                return self._solve_linear_rotary(target[0], target[1], target[2])
-            elif all(t == JointType.ROTARY for t in joint_types):
-                return self._solve_2dof_planar(target[0], target[1])
+        คณิตศาสตร์เดียวกับ solve() ทีละจุด แต่ไม่สร้าง IKSolution ต่อเป้าหมาย
         
-        elif num_joints == 3:
-            return self._solve_3dof_articulated(target[0], target[1], target[2])
+        Args:
+            x, y, z: ตำแหน่งเป้าหมาย (cm), array-like shape เดียวกัน
         
-        # Fallback: simple solution
-        return self._solve_simple(target[0], target[1], target[2])
+        Returns:
+            {joint_name: ค่าข้อต่อ (ndarray), 'reachable': bool mask}
+        """
+        x = np.asarray(x, dtype=np.float64) - self._bx
+        y = np.asarray(y, dtype=np.float64) - self._by
+        z = np.asarray(z, dtype=np.float64) - self._bz
+        return self._solver_many(x, y, z)
     
     def _solve_linear_rotary(self, x: float, y: float, z: float) -> IKSolution:
         """
@@ -130,32 +302,12 @@ class InverseKinematics:
         - Z extension = horizontal distance to target
         - Y angle = angle from horizontal to reach target height
         """
-        j_z = self.joints[self.joint_order[0]]
-        j_y = self.joints[self.joint_order[1]]
+        j_z = self._j0
+        j_y = self._j1
         
-        # Calculate horizontal distance
-        horizontal_dist = np.sqrt(x**2 + y**2)
-        
-        # Z extension needed
-        z_value = j_z.clamp(horizontal_dist)
-        
-        # Y angle to reach target height
-        if z_value > 0:
-            # arctan(height / distance)
-            y_angle = np.degrees(np.arctan2(-z, z_value))  # Negative z because down is positive angle
-        else:
-            y_angle = 0
-        y_value = j_y.clamp(y_angle)
-        
-        # Calculate times
-        z_time = j_z.time_to_move(z_value)
-        y_time = j_y.time_to_move(y_value)
-        
-        # Check reachability
-        reachable = (
-            j_z.is_reachable(horizontal_dist) and 
-            abs(y_angle) <= max(abs(j_y.min_value), abs(j_y.max_value))
-        )
+        z_value, y_value, z_time, y_time, reachable, horizontal_dist = _linear_rotary_kernel(
+            x, y, z, j_z.min_value, j_z.max_value, j_y.min_value, j_y.max_value, self._y_abs_limit,
+            j_z.speed, j_y.speed, j_z.current_value, j_y.current_value)
         
         # Create solution
         solution = IKSolution(
@@ -169,10 +321,16 @@ class InverseKinematics:
         if not reachable:
             solution.error_message = f"Target out of reach: need {horizontal_dist:.1f}cm, max {j_z.max_value}cm"
         
-        logger.debug(f"IK Solution: Z={z_value:.2f}cm ({z_time:.2f}s), Y={y_value:.1f}° ({y_time:.2f}s)")
+        # ปกติ log level สูงกว่า DEBUG: ไม่ต้อง format ทุก solve
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("IK Solution: Z=%.2fcm (%.2fs), Y=%.1f° (%.2fs)", z_value, z_time, y_value, y_time)
         
         return solution
     
+    def _solve_2dof_planar_xyz(self, x: float, y: float, z: float) -> IKSolution:
+        """_solve_2dof_planar ด้วย signature เดียวกับ solver อื่น (z ไม่ใช้ในระนาบ)"""
+        return self._solve_2dof_planar(x, y)
+    
     def _solve_2dof_planar(self, x: float, y: float, L1: float = None, L2: float = None) -> IKSolution:
         """
         2-DOF Planar Arm (2 rotary joints)
@@ -181,21 +339,20 @@ class InverseKinematics:
         
         Args:
             x, y: Target position in plane
-            L1, L2: Link lengths (if None, estimated from joint limits)
+            L1, L2: Link lengths (if None, ใช้ link_lengths ของ engine)
         """
-        j1 = self.joints[self.joint_order[0]]
-        j2 = self.joints[self.joint_order[1]]
+        j1 = self._j0
+        j2 = self._j1
         
-        # Estimate link lengths from joint limits if not provided
-        if L1 is None:
-            L1 = 10.0  # Default 10cm
-        if L2 is None:
-            L2 = 10.0
+        links = self._links
+        if L1 is not None or L2 is not None:
+            links = _link_constants(links[0] if L1 is None else L1, links[1] if L2 is None else L2)
+        L1, L2 = links[0], links[1]
         
-        d = np.sqrt(x**2 + y**2)
+        theta1_deg, theta2_deg, reachable = _planar_2dof_kernel(
+            x, y, links, j1.min_value, j1.max_value, j2.min_value, j2.max_value)
         
-        # Check reachability
-        if d > (L1 + L2) or d < abs(L1 - L2):
+        if not reachable:
             return IKSolution(
                 joint_values={j1.name: j1.current_value, j2.name: j2.current_value},
                 joint_times={j1.name: 0, j2.name: 0},
@@ -203,24 +360,6 @@ class InverseKinematics:
                 error_message=f"Target ({x:.1f}, {y:.1f}) unreachable with L1={L1}, L2={L2}"
             )
         
-        # Elbow angle (θ2)
-        cos_theta2 = (d**2 - L1**2 - L2**2) / (2 * L1 * L2)
-        cos_theta2 = np.clip(cos_theta2, -1, 1)
-        theta2 = np.arccos(cos_theta2)  # Elbow down solution
-        
-        # Shoulder angle (θ1)
-        beta = np.arctan2(y, x)
-        alpha = np.arctan2(L2 * np.sin(theta2), L1 + L2 * np.cos(theta2))
-        theta1 = beta - alpha
-        
-        # Convert to degrees
-        theta1_deg = np.degrees(theta1)
-        theta2_deg = np.degrees(theta2)
-        
-        # Clamp to joint limits
-        theta1_deg = j1.clamp(theta1_deg)
-        theta2_deg = j2.clamp(theta2_deg)
-        
         # Calculate times
         t1 = j1.time_to_move(theta1_deg)
         t2 = j2.time_to_move(theta2_deg)
@@ -241,46 +380,27 @@ class InverseKinematics:
         Joint 1: Shoulder (around Y-axis)
         Joint 2: Elbow (around Y-axis)
         """
-        j_base = self.joints[self.joint_order[0]]
-        j_shoulder = self.joints[self.joint_order[1]]
-        j_elbow = self.joints[self.joint_order[2]]
-        
-        # Link lengths (assumed from joint config or defaults)
-        L1 = 10.0  # Shoulder to elbow
-        L2 = 10.0  # Elbow to end effector
-        
-        # Base rotation
-        theta_base = np.degrees(np.arctan2(y, x))
-        theta_base = j_base.clamp(theta_base)
-        
-        # Project onto vertical plane through target
-        r = np.sqrt(x**2 + y**2)  # Horizontal distance
+        j_base = self._j0
+        j_shoulder = self._j1
+        j_elbow = self._j2
         
-        # Solve 2-DOF planar IK in the vertical plane
-        d = np.sqrt(r**2 + z**2)
+        # Link lengths: L1 = shoulder to elbow, L2 = elbow to end effector (link_lengths ของ engine)
+        theta_base, theta_shoulder, theta_elbow, reachable, d = _articulated_3dof_kernel(
+            x, y, z, self._links, j_base.min_value, j_base.max_value,
+            j_shoulder.min_value, j_shoulder.max_value, j_elbow.min_value, j_elbow.max_value)
         
-        if d > (L1 + L2) or d < abs(L1 - L2):
+        if not reachable:
             return IKSolution(
-                joint_values={j.name: j.current_value for j in [j_base, j_shoulder, j_elbow]},
-                joint_times={j.name: 0 for j in [j_base, j_shoulder, j_elbow]},
+                joint_values={
+                    j_base.name: j_base.current_value,
+                    j_shoulder.name: j_shoulder.current_value,
+                    j_elbow.name: j_elbow.current_value
+                },
+                joint_times={j_base.name: 0, j_shoulder.name: 0, j_elbow.name: 0},
                 reachable=False,
                 error_message=f"Target unreachable at distance {d:.1f}cm"
             )
         
-        # Elbow angle
-        cos_theta_elbow = (d**2 - L1**2 - L2**2) / (2 * L1 * L2)
-        theta_elbow = np.degrees(np.arccos(np.clip(cos_theta_elbow, -1, 1)))
-        
-        # Shoulder angle
-        beta = np.arctan2(z, r)
-        alpha = np.arctan2(L2 * np.sin(np.radians(theta_elbow)), 
-                          L1 + L2 * np.cos(np.radians(theta_elbow)))
-        theta_shoulder = np.degrees(beta + alpha)
-        
-        # Clamp to limits
-        theta_shoulder = j_shoulder.clamp(theta_shoulder)
-        theta_elbow = j_elbow.clamp(theta_elbow)
-        
         # Times
         t_base = j_base.time_to_move(theta_base)
         t_shoulder = j_shoulder.time_to_move(theta_shoulder)
@@ -314,18 +434,108 @@ class InverseKinematics:
             target_position=(x, y, z)
         )
         
-        targets = [x, y, z]
-        for i, name in enumerate(self.joint_order):
-            if i < len(targets):
-                j = self.joints[name]
-                value = j.clamp(targets[i])
-                solution.joint_values[name] = value
-                solution.joint_times[name] = j.time_to_move(value)
+        joint_values = solution.joint_values
+        joint_times = solution.joint_times
+        total_time = 0.0  # max ของเวลาแต่ละข้อ (หาไประหว่างวน ไม่ต้องวน dict ซ้ำ)
+        for name, target in zip(self.joint_order, (x, y, z)):
+            j = self.joints[name]
+            value = j.clamp(target)
+            t = j.time_to_move(value)
+            joint_values[name] = value
+            joint_times[name] = t
+            if t > total_time:
+                total_time = t
         
-        solution.total_time = max(solution.joint_times.values()) if solution.joint_times else 0
+        solution.total_time = total_time
         
         return solution
     
+    # ---------- Batch solvers (solve_many) ----------
+    
+    def _solve_many_linear_rotary(self, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> Dict[str, np.ndarray]:
+        """_solve_linear_rotary แบบ array"""
+        j_z = self._j0
+        j_y = self._j1
+        
+        horizontal_dist = np.hypot(x, y)
+        z_value = np.clip(horizontal_dist, j_z.min_value, j_z.max_value)
+        y_angle = np.where(z_value > 0, np.degrees(np.arctan2(-z, z_value)), 0.0)
+        
+        reachable = (
+            (horizontal_dist >= j_z.min_value) & (horizontal_dist <= j_z.max_value) &
+            (np.abs(y_angle) <= self._y_abs_limit)
+        )
+        
+        return {
+            j_z.name: z_value,
+            j_y.name: np.clip(y_angle, j_y.min_value, j_y.max_value),
+            'reachable': reachable
+        }
+    
+    def _solve_many_2dof_planar(self, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> Dict[str, np.ndarray]:
+        """_solve_2dof_planar แบบ array (เป้าที่เข้าไม่ถึงคงค่าข้อต่อปัจจุบัน)"""
+        j1 = self._j0
+        j2 = self._j1
+        L1, L2, L_sum, L_diff, L1_sq, L2_sq, two_L1L2 = self._links
+        
+        d = np.hypot(x, y)
+        reachable = (d <= L_sum) & (d >= L_diff)
+        
+        cos_theta2 = np.clip((d**2 - L1_sq - L2_sq) / two_L1L2, -1, 1)
+        theta2 = np.arccos(cos_theta2)
+        alpha = np.arctan2(L2 * np.sin(theta2), L1 + L2 * np.cos(theta2))
+        theta1 = np.arctan2(y, x) - alpha
+        
+        theta1_deg = np.clip(np.degrees(theta1), j1.min_value, j1.max_value)
+        theta2_deg = np.clip(np.degrees(theta2), j2.min_value, j2.max_value)
+        
+        return {
+            j1.name: np.where(reachable, theta1_deg, j1.current_value),
+            j2.name: np.where(reachable, theta2_deg, j2.current_value),
+            'reachable': reachable
+        }
+    
+    def _solve_many_3dof_articulated(self, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> Dict[str, np.ndarray]:
+        """_solve_3dof_articulated แบบ array (เป้าที่เข้าไม่ถึงคงค่าข้อต่อปัจจุบัน)"""
+        j_base = self._j0
+        j_shoulder = self._j1
+        j_elbow = self._j2
+        
+        L1, L2, L_sum, L_diff, L1_sq, L2_sq, two_L1L2 = self._links
+        
+        theta_base = np.clip(np.degrees(np.arctan2(y, x)), j_base.min_value, j_base.max_value)
+        
+        r = np.hypot(x, y)
+        d = np.hypot(r, z)
+        reachable = (d <= L_sum) & (d >= L_diff)
+        
+        cos_theta_elbow = np.clip((d**2 - L1_sq - L2_sq) / two_L1L2, -1, 1)
+        theta_elbow = np.degrees(np.arccos(cos_theta_elbow))
+        
+        elbow_rad = np.radians(theta_elbow)
+        alpha = np.arctan2(L2 * np.sin(elbow_rad), L1 + L2 * np.cos(elbow_rad))
+        theta_shoulder = np.degrees(np.arctan2(z, r) + alpha)
+        
+        theta_shoulder = np.clip(theta_shoulder, j_shoulder.min_value, j_shoulder.max_value)
+        theta_elbow = np.clip(theta_elbow, j_elbow.min_value, j_elbow.max_value)
+        
+        return {
+            j_base.name: np.where(reachable, theta_base, j_base.current_value),
+            j_shoulder.name: np.where(reachable, theta_shoulder, j_shoulder.current_value),
+            j_elbow.name: np.where(reachable, theta_elbow, j_elbow.current_value),
+            'reachable': reachable
+        }
+    
+    def _solve_many_simple(self, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> Dict[str, np.ndarray]:
+        """_solve_simple แบบ array"""
+        result = {}
+        for name, target in zip(self.joint_order, (x, y, z)):
+            j = self.joints[name]
+            result[name] = np.clip(target, j.min_value, j.max_value)
+        
+        result['reachable'] = np.ones(np.broadcast(x, y, z).shape, dtype=bool)
+        return result
+    
     def forward_kinematics(self, joint_values: Dict[str, float]) -> Tuple[float, float, float]:
         """
         Forward Kinematics: คำนวณตำแหน่งจากมุมข้อต่อ
@@ -343,12 +553,12 @@ class InverseKinematics:
             y_ang = joint_values.get(y_name, 0)
             
             # Convert Y angle to radians
-            y_rad = np.radians(y_ang)
+            y_rad = math.radians(y_ang)
             
             # Calculate position
-            x = z_ext * np.cos(y_rad)
+            x = z_ext * math.cos(y_rad)
             y = 0  # Assuming arm moves in XZ plane
-            z = -z_ext * np.sin(y_rad)  # Negative because down is positive angle
+            z = -z_ext * math.sin(y_rad)  # Negative because down is positive angle
             
             return (x + self.base[0], y + self.base[1], z + self.base[2])
         
@@ -447,7 +657,7 @@ def create_3dof_arm_ik(L1: float = 10.0, L2: float = 10.0) -> InverseKinematics:
         )
     ]
     
-    return InverseKinematics(joints)
+    return InverseKinematics(joints, link_lengths=(L1, L2))
 
 
 if __name__ == "__main__":
@@ -9,6 +9,7 @@ Author: AgriBot Team
 """
 
 import serial
+import threading
 import time
 import logging
 import json
@@ -185,6 +186,11 @@ class RobotBrain:
         self.is_connected = False
         self.state = RobotState.IDLE
         
+        # Serial port ใช้ร่วมกันระหว่าง mission thread และ web API probes
+        self.serial_lock = threading.RLock()
+        # True = อาจมีข้อมูลค้างใน RX buffer (boot banner, DONE ที่ไม่ได้อ่าน ฯลฯ)
+        self.rx_dirty = True
+        
     # ==================== CONNECTION ====================
     
     def connect(self) -> bool:
@@ -196,6 +202,7 @@ class RobotBrain:
                 timeout=self.config.timeout
             )
             time.sleep(2)  # รอ ESP32 reset
+            self._enable_low_latency()
             
             if self._check_connection():
                 self.is_connected = True
@@ -210,6 +217,30 @@ class RobotBrain:
             logger.error(f"❌ Connection Failed: {e}")
             return False
     
+    def _enable_low_latency(self):
+        """
+        ลด latency ของ USB-serial (Linux)
+        
+        - ตั้ง ASYNC_LOW_LATENCY ผ่าน TIOCSSERIAL (pyserial set_low_latency_mode)
+        - ตั้ง latency_timer ของ FTDI เป็น 1ms (ค่า default 16ms)
+        
+        ทำแบบ best-effort: ถ้า driver/สิทธิ์ไม่รองรับจะข้ามไป
+        """
+        try:
+            self.ser.set_low_latency_mode(True)
+            logger.info("⚡ Serial low-latency mode enabled")
+        except (AttributeError, NotImplementedError, OSError, ValueError) as e:
+            logger.debug(f"Low-latency mode not available: {e}")
+        
+        port_name = Path(self.config.serial_port).resolve().name
+        latency_timer = Path("/sys/bus/usb-serial/devices") / port_name / "latency_timer"
+        try:
+            if latency_timer.exists():
+                latency_timer.write_text("1")
+                logger.info(f"⚡ {port_name} latency_timer = 1ms")
+        except OSError as e:
+            logger.debug(f"Cannot set latency_timer: {e}")
+    
     def disconnect(self):
         """ปิดการเชื่อมต่อ"""
         if self.ser and self.ser.is_open:
@@ -221,10 +252,12 @@ class RobotBrain:
     def _check_connection(self) -> bool:
         """ตรวจสอบการเชื่อมต่อด้วย PING/PONG"""
         try:
-            self.ser.reset_input_buffer()
-            self.ser.write(b"PING\n")
-            response = self.ser.readline().decode().strip()
-            return response == "PONG"
+            with self.serial_lock:
+                self.drain_input()
+                self.ser.write(b"PING\n")
+                response = self.ser.readline().decode().strip()
+                self.rx_dirty = response != "PONG"
+                return response == "PONG"
         except serial.SerialException as e:
             logger.error(f"Serial error in connection check: {e}")
             return False
@@ -245,6 +278,21 @@ class RobotBrain:
             command: คำสั่งที่จะส่ง
             wait_for_done: รอ DONE หรือไม่
             
+        Returns:
+            bool: True ถ้าสำเร็จ
+        """
+        return self.send_cmd_bytes(f"{command}\n".encode(), wait_for_done)
+    
+    def send_cmd_bytes(self, buf: bytes, wait_for_done: bool = True) -> bool:
+        """
+        ส่งคำสั่งที่ encode แล้ว (ลงท้ายด้วย b"\n") - ข้ามการ format/encode
+        
+        ใช้กับคำสั่งคงที่ เช่น b"PUMP_ON\n" ที่เตรียมไว้ล่วงหน้า
+        
+        Args:
+            buf: คำสั่งเป็น bytes พร้อม newline
+            wait_for_done: รอ DONE หรือไม่
+            
         Returns:
             bool: True ถ้าสำเร็จ
         """
@@ -252,12 +300,17 @@ class RobotBrain:
             logger.error("❌ Not connected to ESP32")
             return False
         
-        try:
-            self.ser.reset_input_buffer()
-            self.ser.write(f"{command}\n".encode())
-            logger.info(f"📤 Sent: {command}")
-            
-            if wait_for_done:
+        with self.serial_lock:
+            try:
+                self.drain_input()
+                self.ser.write(buf)
+                logger.info("📤 Sent: %s", buf.rstrip().decode())
+                
+                if not wait_for_done:
+                    # ESP32 ยังจะตอบ DONE กลับมา แต่เราไม่ได้อ่าน
+                    self.rx_dirty = True
+                    return True
+                
                 start_time = time.time()
                 while True:
                     if self.ser.in_waiting > 0:
@@ -271,20 +324,32 @@ class RobotBrain:
                         elif line == "EMERGENCY_STOPPED":
                             logger.warning("⚠️ Emergency Stop Activated")
                             self.state = RobotState.IDLE
+                            self.rx_dirty = True
                             return True
                     
                     # Timeout
                     if time.time() - start_time > self.config.timeout:
                         logger.error("❌ Response Timeout")
+                        self.rx_dirty = True
                         return False
                     
                     time.sleep(0.01)
-                        
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ Send Error: {e}")
-            return False
+                
+            except Exception as e:
+                logger.error(f"❌ Send Error: {e}")
+                self.rx_dirty = True
+                return False
+    
+    def drain_input(self):
+        """
+        ล้าง RX buffer เฉพาะเมื่ออาจมีข้อมูลค้าง (rx_dirty)
+        
+        ต้องเรียกภายใต้ serial_lock - ถ้าคำสั่งก่อนหน้าอ่านคำตอบครบแล้ว
+        จะไม่มีอะไรค้าง จึงข้าม TCFLSH ioctl ได้
+        """
+        if self.rx_dirty:
+            self.ser.reset_input_buffer()
+            self.rx_dirty = False
     
     # ==================== PHYSICS CALCULATIONS ====================
     
@@ -0,0 +1,121 @@
+"""
+Test Arm Controller serial handling (fake serial - ไม่ต้องต่อ ESP32)
+"""
+import pytest
+import sys
+from pathlib import Path
+
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from control.arm_controller import ArmController, SERIAL_READ_TIMEOUT_SEC
+
+
+class FakeSerial:
+    """Serial ปลอม: บรรทัดใน rx ถูกอ่านตามลำดับ, readline ว่างเมื่อไม่มีข้อมูล (= timeout)"""
+    
+    def __init__(self, rx=(), replies=(), timeout=None):
+        self.rx = list(rx)
+        self.replies = list(replies)  # คำตอบต่อ write หนึ่งครั้ง (None = ไม่ตอบ / ตอบช้า)
+        self.tx = []
+        self.timeout = timeout
+        self.read_timeouts = []
+        self.flush_count = 0
+    
+    def write(self, data):
+        self.tx.append(data)
+        reply = self.replies.pop(0) if self.replies else None
+        if reply is not None:
+            self.rx.append(reply)
+    
+    def readline(self):
+        self.read_timeouts.append(self.timeout)
+        return self.rx.pop(0) if self.rx else b""
+    
+    def reset_input_buffer(self):
+        self.flush_count += 1
+        self.rx.clear()
+
+
+class TestSerialTimeout:
+    """port อาจใช้ร่วมกับ RobotBrain / backend: ห้ามเปลี่ยน timeout ของ port ถาวร"""
+    
+    def test_init_leaves_port_timeout_alone(self):
+        ser = FakeSerial(timeout=2.0)
+        ArmController(ser)
+        assert ser.timeout == 2.0
+    
+    def test_command_uses_read_timeout_then_restores(self):
+        ser = FakeSerial(rx=[b"DONE\n"], timeout=None)
+        controller = ArmController(ser)
+        
+        assert controller._execute_command("ACT:Z_OUT:1.5")
+        assert ser.read_timeouts == [SERIAL_READ_TIMEOUT_SEC]
+        assert ser.timeout is None
+
+
+
+class TestReadEncoders:
+    """คำตอบ GET:ENC_ALL ที่หาย / ผิดรูป / มาช้า ต้องไม่ถูกป้อนเข้า PID เป็นตำแหน่ง"""
+    
+    def test_reads_both_axes(self):
+        ser = FakeSerial(replies=[b"Z:1.5,Y:-30.25\n"])
+        assert ArmController(ser)._read_encoders() == (1.5, -30.25)
+    
+    def test_timeout_returns_none(self):
+        ser = FakeSerial(replies=[None])
+        assert ArmController(ser)._read_encoders() is None
+    
+    @pytest.mark.parametrize("reply", [b"garbage\n", b"Z:1.5\n", b"Z:abc,Y:2\n", b"DONE\n"])
+    def test_garbage_or_missing_axis_returns_none(self, reply):
+        ser = FakeSerial(replies=[reply])
+        assert ArmController(ser)._read_encoders() is None
+    
+    def test_late_reply_is_flushed_before_next_request(self):
+        ser = FakeSerial(replies=[None, b"Z:5.0,Y:6.0\n"])
+        controller = ArmController(ser)
+        
+        assert controller._read_encoders() is None
+        ser.rx.append(b"Z:1.0,Y:2.0\n")  # คำตอบของ request แรกมาถึงหลัง timeout
+        
+        assert controller._read_encoders() == (5.0, 6.0)
+        assert ser.flush_count == 1
+    
+    def test_no_flush_while_replies_are_on_time(self):
+        ser = FakeSerial(replies=[b"Z:1.0,Y:2.0\n", b"Z:1.1,Y:2.1\n"])
+        controller = ArmController(ser)
+        
+        assert controller._read_encoders() == (1.0, 2.0)
+        assert controller._read_encoders() == (1.1, 2.1)
+        assert ser.flush_count == 0
+    
+    def test_single_axis_timeout_keeps_last_known_position(self):
+        ser = FakeSerial(replies=[None])
+        controller = ArmController(ser)
+        controller.state.z_position_cm = 7.0
+        
+        assert controller._read_encoder('Z') == 7.0
+
+
+class TestClosedLoop:
+    """tick ที่อ่าน encoder ไม่ได้ต้องถูกข้าม ไม่ใช่ป้อน 0.0 เข้า PID"""
+    
+    def test_skips_tick_without_reading(self, monkeypatch):
+        ser = FakeSerial()
+        controller = ArmController(ser, use_encoder=True)
+        controller.control_rate = 1000
+        readings = iter([None, (1.0, 10.0), None, (4.0, 10.0)])
+        monkeypatch.setattr(controller, "_read_encoders", lambda: next(readings))
+        measurements = []
+        monkeypatch.setattr(controller.pid_z, "compute", lambda sp, meas, dt: measurements.append(meas) or 0.0)
+        
+        solution = controller._solve_ik(0.0, 0.0, 0.0)
+        solution.joint_values.update(Z=4.0, Y=10.0)
+        
+        assert controller._execute_closed_loop(solution)
+        assert measurements == [1.0]
+        assert controller.state.z_position_cm == 4.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
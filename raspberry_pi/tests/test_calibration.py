@@ -3,6 +3,7 @@ Test Calibration Config Loading
 """
 import pytest
 import json
+import os
 import tempfile
 from pathlib import Path
 import sys
@@ -11,6 +12,7 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from robot_brain import CalibrationConfig
+from calibration_simple import CalibrationData, CameraCalibrator
 
 
 class TestCalibrationConfig:
@@ -84,5 +86,97 @@ class TestCalibrationConfig:
         assert config.arm_speed_cm_per_sec == 10.0
 
 
+
+class TestCalibrationData:
+    """ทดสอบการบันทึก/โหลด CalibrationData (calibration_simple.py)"""
+    
+    def test_to_dict_has_all_fields(self):
+        data = CalibrationData()
+        assert set(data.to_dict()) == set(CalibrationData.__dataclass_fields__)
+    
+    def test_save_load_roundtrip(self, tmp_path):
+        config_file = tmp_path / "calibration.json"
+        data = CalibrationData(pixel_to_cm_z=0.042, alignment_tolerance_px=12, notes="ทดสอบ")
+        data.save(config_file)
+        
+        loaded = CalibrationData.load(config_file)
+        
+        assert loaded.pixel_to_cm_z == 0.042
+        assert loaded.alignment_tolerance_px == 12
+        assert loaded.notes == "ทดสอบ"
+        assert loaded.calibrated_at == data.calibrated_at
+    
+    def test_to_json_matches_json_dumps(self):
+        data = CalibrationData(camera_angle_deg=30.5, encoder_ppr=40, notes='ไม้บรรทัด "10cm"\n')
+        expected = json.dumps(data.to_dict(), indent=2, ensure_ascii=False)
+        assert data.to_json() == expected
+    
+    def test_load_ignores_unknown_keys(self, tmp_path):
+        config_file = tmp_path / "calibration.json"
+        config_file.write_text(json.dumps({"pixel_to_cm_x": 0.2, "serial_port": "/dev/ttyACM0"}))
+        
+        loaded = CalibrationData.load(config_file)
+        
+        assert loaded.pixel_to_cm_x == 0.2
+        assert loaded.arm_speed_cm_per_sec == 10.0
+    
+    def test_load_cache_sees_file_changes(self, tmp_path):
+        config_file = tmp_path / "calibration.json"
+        config_file.write_text(json.dumps({"pixel_to_cm_x": 0.2}))
+    
+        first = CalibrationData.load(config_file)
+        first.pixel_to_cm_x = 9.9  # แก้ object ที่โหลดมา ต้องไม่กระทบ cache
+        assert CalibrationData.load(config_file).pixel_to_cm_x == 0.2
+    
+        # เขียนทับใน timestamp tick เดียวกัน (mtime เท่าเดิม): ขนาดเปลี่ยน
+        mtime_ns = config_file.stat().st_mtime_ns
+        config_file.write_text(json.dumps({"pixel_to_cm_x": 0.35}))
+        os.utime(config_file, ns=(0, mtime_ns))
+        assert CalibrationData.load(config_file).pixel_to_cm_x == 0.35
+    
+    def test_load_cache_sees_atomic_replace(self, tmp_path):
+        config_file = tmp_path / "calibration.json"
+        config_file.write_text(json.dumps({"pixel_to_cm_x": 0.2}))
+        assert CalibrationData.load(config_file).pixel_to_cm_x == 0.2
+        
+        # os.replace ขนาดเท่าเดิม mtime เท่าเดิม: inode ใหม่
+        mtime_ns = config_file.stat().st_mtime_ns
+        tmp_file = tmp_path / "calibration.json.tmp"
+        tmp_file.write_text(json.dumps({"pixel_to_cm_x": 0.3}))
+        os.utime(tmp_file, ns=(0, mtime_ns))
+        os.replace(tmp_file, config_file)
+        assert CalibrationData.load(config_file).pixel_to_cm_x == 0.3
+    
+    def test_load_missing_file_uses_defaults(self, tmp_path):
+        loaded = CalibrationData.load(tmp_path / "missing.json")
+        assert loaded.to_dict() == CalibrationData().to_dict()
+
+
+
+class TestCalibrationOverlay:
+    """overlay แบบ UMat (use_opencl) ต้องได้ภาพเดียวกับ CPU copyTo"""
+    
+    def test_cpu_is_default(self):
+        assert CameraCalibrator().use_opencl is False
+    
+    def test_umat_overlay_matches_cpu(self, monkeypatch):
+        cv2 = pytest.importorskip("cv2")
+        np = pytest.importorskip("numpy")
+        # UMat ทำงานได้แม้ไม่มี OpenCL device (OpenCV ใช้ CPU แทน)
+        monkeypatch.setattr(cv2.ocl, "haveOpenCL", lambda: True)
+        frame = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+        
+        cpu = CameraCalibrator()
+        gpu = CameraCalibrator(use_opencl=True)
+        for calibrator in (cpu, gpu):
+            calibrator.click_points = [(100, 100), (300, 200)]
+        
+        expected = cpu.draw_calibration_overlay(frame.copy())
+        out = gpu.draw_calibration_overlay(frame.copy())
+        
+        assert isinstance(out, cv2.UMat)
+        assert np.array_equal(out.get(), expected)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,163 @@
+"""
+Test Camera Calibration (pixel ↔ world)
+"""
+import pytest
+import json
+import numpy as np
+import sys
+from pathlib import Path
+
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from kinematics import camera_calibration
+from kinematics.camera_calibration import CameraCalibration, CameraConfig
+
+
+@pytest.fixture(params=[0.0, 45.0], ids=["nadir", "tilted"])
+def calib(request):
+    config = CameraConfig(camera_angle_deg=request.param, offset_x_cm=2.0, offset_y_cm=-3.0)
+    return CameraCalibration(config=config)
+
+
+@pytest.fixture
+def distorted_calib():
+    config = CameraConfig(camera_angle_deg=30.0, distortion=(0.1, -0.05, 0.001, 0.002, 0.0))
+    return CameraCalibration(config=config)
+
+
+class TestCameraConfig:
+    """Cache ของ intrinsic_matrix / distortion_coeffs"""
+    
+    def test_intrinsic_matrix_is_cached(self):
+        config = CameraConfig()
+        assert config.intrinsic_matrix is config.intrinsic_matrix
+    
+    def test_cached_arrays_are_read_only(self):
+        config = CameraConfig()
+        with pytest.raises(ValueError):
+            config.intrinsic_matrix[0, 0] = 1.0
+        with pytest.raises(ValueError):
+            config.distortion_coeffs[0] = 1.0
+    
+    def test_cache_follows_field_changes(self):
+        config = CameraConfig()
+        config.intrinsic_matrix
+        config.distortion_coeffs
+        
+        config.fx = 700.0
+        config.update_intrinsics(fx=650.0, fy=640.0, cx=300.0, cy=200.0, distortion=(0.1, 0, 0, 0, 0))
+        
+        assert config.intrinsic_matrix.tolist() == [[650.0, 0, 300.0], [0, 640.0, 200.0], [0, 0, 1]]
+        assert config.distortion_coeffs[0] == 0.1
+    
+    def test_save_load_roundtrip(self, tmp_path):
+        config_file = tmp_path / "camera.json"
+        config = CameraConfig(width=1280, camera_angle_deg=30.0, offset_z_cm=-1.5)
+        # ค่าจาก cv2.calibrateCamera เป็น numpy float
+        config.update_intrinsics(fx=np.float64(650.5), fy=640.0, cx=300.0, cy=200.0,
+                                 distortion=np.array([0.1, -0.05, 0.0, 0.0, 0.01]))
+        config.save_to_file(str(config_file))
+        
+        loaded = CameraConfig.load_from_file(str(config_file))
+        
+        assert loaded == config
+        assert json.loads(config_file.read_text())["img_width"] == 1280
+    
+    def test_load_partial_file_uses_defaults(self, tmp_path):
+        config_file = tmp_path / "camera.json"
+        config_file.write_text(json.dumps({"fx": 700.0, "img_height": 720, "unknown": 1}))
+        
+        loaded = CameraConfig.load_from_file(str(config_file))
+        
+        assert (loaded.fx, loaded.height, loaded.width) == (700.0, 720, 640)
+
+
+class TestPixelToWorldBatch:
+    """Batch API ต้องให้ผลเหมือนการเรียกทีละจุด"""
+    
+    def test_batch_matches_scalar(self, calib):
+        xs = np.array([0, 100, 320, 500, 639])
+        ys = np.array([0, 400, 240, 120, 479])
+        
+        world = calib.pixel_to_world_batch(xs, ys, 5.0)
+        
+        assert world.shape == (5, 3)
+        for (x, y), row in zip(zip(xs, ys), world):
+            assert row == pytest.approx(calib.pixel_to_world_simple(x, y, 5.0))
+    
+    def test_at_ground_matches_simple(self, calib):
+        for x, y in [(0, 0), (320, 240), (639, 479), (100.5, 300.25)]:
+            assert calib.pixel_to_world_at_ground(x, y) == pytest.approx(calib.pixel_to_world_simple(x, y, 0.0))
+    
+    def test_pixels_to_world_keeps_shape(self, distorted_calib):
+        u, v = np.meshgrid(np.arange(0, 640, 80), np.arange(0, 480, 80))
+        
+        x_w, y_w, z_w = distorted_calib.pixels_to_world(u, v, 2.0)
+        
+        assert x_w.shape == u.shape
+        assert np.all(z_w == 2.0)
+        x_ref, y_ref, _ = distorted_calib.pixel_to_world(int(u[2, 3]), int(v[2, 3]), 2.0)
+        assert x_w[2, 3] == pytest.approx(x_ref, abs=1e-4)
+        assert y_w[2, 3] == pytest.approx(y_ref, abs=1e-4)
+
+
+
+class TestWorldToPixel:
+    """Forward projection ผ่าน projection matrix"""
+    
+    def test_center_projects_to_principal_point(self, calib):
+        cfg = calib.config
+        assert calib.world_to_pixel(cfg.offset_x_cm, cfg.offset_y_cm, 0.0) == (round(cfg.cx), round(cfg.cy))
+    
+    def test_batch_matches_scalar(self, calib):
+        pts = np.array([[0.0, 0.0, 0.0], [5.0, -3.0, 2.0], [-12.5, 8.0, 10.0]])
+        
+        pixels = calib.world_to_pixel_batch(pts)
+        
+        assert pixels.tolist() == [list(calib.world_to_pixel(*p)) for p in pts]
+    
+    def test_roundtrip_nadir(self):
+        calib = CameraCalibration(config=CameraConfig(camera_angle_deg=0.0))
+        x_w, y_w, z_w = calib.pixel_to_world_simple(400, 300, 5.0)
+        x_px, y_px = calib.world_to_pixel(x_w, y_w, z_w)
+        assert abs(x_px - 400) <= 1 and abs(y_px - 300) <= 1
+    
+    def test_rounds_to_nearest_pixel(self):
+        calib = CameraCalibration(config=CameraConfig(camera_angle_deg=0.0))
+        # x_px จริง = cx - 0.6 → ต้องปัดเป็น cx - 1 (ไม่ใช่ตัดเศษเป็น cx)
+        x_w = -0.6 / calib.config.fx * calib.config.camera_height_cm
+        assert calib.world_to_pixel(x_w, 0.0)[0] == round(calib.config.cx) - 1
+        assert calib.world_to_pixel_batch([[x_w, 0.0, 0.0]])[0, 0] == round(calib.config.cx) - 1
+
+
+class TestUndistortFrame:
+    """undistort_frame (UMat) ต้องได้ภาพเดียวกับ undistort_image (CPU)"""
+    
+    @pytest.mark.parametrize("use_opencl", [False, True])
+    def test_matches_undistort_image(self, distorted_calib, monkeypatch, use_opencl):
+        # UMat ทำงานได้แม้ไม่มี OpenCL device (OpenCV ใช้ CPU แทน)
+        monkeypatch.setattr(camera_calibration, "_opencl_enabled", lambda: use_opencl)
+        frame = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+        
+        out = distorted_calib.undistort_frame(frame)
+        
+        assert isinstance(out, np.ndarray)
+        assert np.array_equal(out, distorted_calib.undistort_image(frame))
+
+
+class TestVisualizeCalibration:
+    """วาด overlay ลง buffer ที่ใช้ซ้ำ ไม่แก้ภาพต้นฉบับ"""
+    
+    def test_draws_without_touching_input(self, calib):
+        image = np.zeros((480, 640, 3), dtype=np.uint8)
+        
+        out = calib.visualize_calibration(image, 100, 200)
+        
+        assert not image.any()
+        assert tuple(out[round(calib.config.cy), round(calib.config.cx)]) == (0, 255, 0)
+        assert calib.visualize_calibration(image, 300, 100) is out
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -2,6 +2,7 @@
 Test Inverse Kinematics Engine
 """
 import pytest
+import numpy as np
 import sys
 from pathlib import Path
 
@@ -13,7 +14,8 @@ from kinematics.inverse_kinematics import (
     Joint,
     JointType,
     IKSolution,
-    create_agribot_ik
+    create_agribot_ik,
+    create_3dof_arm_ik
 )
 
 
@@ -97,5 +99,42 @@ class TestAgribotIK:
         assert pos is not None
 
 
+class TestArticulatedIK:
+    """IK แขน 3-DOF"""
+    
+    def test_link_lengths_define_reach(self):
+        """ความยาวแขนจาก factory ต้องถูกใช้จริง"""
+        target = (20.0, 3.0, 4.0)  # ระยะ ~20.6 cm
+        assert create_3dof_arm_ik().solve(*target).reachable == False
+        assert create_3dof_arm_ik(L1=15.0, L2=12.0).solve(*target).reachable == True
+
+
+class TestSolveMany:
+    """solve_many ต้องให้ผลเหมือน solve ทีละจุด"""
+    
+    @pytest.fixture(params=["agribot", "3dof", "planar"])
+    def ik(self, request):
+        if request.param == "agribot":
+            return create_agribot_ik()
+        if request.param == "3dof":
+            return create_3dof_arm_ik()
+        return InverseKinematics([
+            Joint("A", JointType.ROTARY, min_value=-120, max_value=120, speed=30),
+            Joint("B", JointType.ROTARY, min_value=0, max_value=150, speed=40, current_value=5.0)
+        ])
+    
+    def test_matches_scalar_solve(self, ik):
+        rng = np.random.default_rng(0)
+        xs, ys, zs = rng.uniform(-25, 30, size=(3, 200))
+        
+        result = ik.solve_many(xs, ys, zs)
+        
+        for i in range(xs.size):
+            solution = ik.solve(xs[i], ys[i], zs[i])
+            assert result["reachable"][i] == solution.reachable
+            for name, value in solution.joint_values.items():
+                assert result[name][i] == pytest.approx(value)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,82 @@
+"""
+Test PID Controller (scalar / vector / history)
+"""
+import pytest
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from control import pid_controller
+from control.pid_controller import (
+    PIDController, VectorPIDController, HISTORY_FIELDS, DEFAULT_DT, create_agribot_controller
+)
+
+
+class TestComputeAuto:
+    """compute_auto อ่านนาฬิกาครั้งเดียวต่อ tick"""
+    
+    def test_dt_and_timestamp_from_one_clock_read(self, monkeypatch):
+        clock = iter([10.0, 10.5])  # อ่านเกินหนึ่งครั้งต่อ tick → StopIteration
+        monkeypatch.setattr(pid_controller.time, "perf_counter", lambda: next(clock))
+        pid = PIDController(Kp=0.0, Ki=1.0, record_history=True)
+        
+        pid.compute_auto(1.0, 0.0)
+        pid.compute_auto(1.0, 0.0)
+        
+        history = pid.get_history()
+        assert list(history[:, HISTORY_FIELDS.index('time')]) == [10.0, 10.5]
+        assert pid.prev_time == 10.5
+        assert pid.integral == pytest.approx(DEFAULT_DT + 0.5)
+
+
+class TestHistory:
+    """ring buffer คืนแถวเรียงเก่า→ใหม่แม้วนเขียนทับแล้ว"""
+    
+    def test_wraps_in_order(self):
+        pid = PIDController(Kp=1.0, record_history=True)
+        n = pid._max_history + 5
+        for i in range(n):
+            pid.compute(float(i), 0.0, 0.02)
+        
+        setpoints = pid.get_history()[:, HISTORY_FIELDS.index('setpoint')]
+        assert len(setpoints) == pid._max_history
+        assert list(setpoints[:2]) == [5.0, 6.0]
+        assert setpoints[-1] == n - 1
+    
+    def test_history_is_read_only(self):
+        pid = PIDController(record_history=True)
+        pid.compute(1.0, 0.0, 0.02)
+        with pytest.raises(ValueError):
+            pid.get_history()[0, 0] = 0.0
+
+
+class TestVectorPID:
+    """VectorPIDController ต้องได้ค่าเดียวกับ PIDController แยกแกน"""
+    
+    def test_matches_scalar_controllers(self):
+        gains = [(2.0, 0.1, 0.05), (3.0, 0.2, 0.1)]
+        scalar = [PIDController(Kp=kp, Ki=ki, Kd=kd) for kp, ki, kd in gains]
+        vector = VectorPIDController(Kp=[2.0, 3.0], Ki=[0.1, 0.2], Kd=[0.05, 0.1])
+        
+        for setpoints, measurements in [([10.0, 5.0], [0.0, 1.0]), ([10.0, 5.0], [3.0, 4.5]), ([8.0, -2.0], [9.0, 0.0])]:
+            expected = [pid.compute(sp, m, 0.02) for pid, sp, m in zip(scalar, setpoints, measurements)]
+            assert np.allclose(vector.compute(setpoints, measurements, 0.02), expected)
+
+
+class TestMoveTimes:
+    """calculate_move_times (vectorized) = calculate_move_time ทีละค่า"""
+    
+    def test_matches_scalar(self):
+        controller = create_agribot_controller()
+        targets = [0.0, 0.05, 1.0, 7.5, 15.5]
+        
+        expected = [controller.calculate_move_time(t) for t in targets]
+        assert np.allclose(controller.calculate_move_times(targets), expected)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -122,5 +122,66 @@ class TestLegacyMethods:
         assert brain.is_aligned(-31) == False
 
 
+
+class FakeSerial:
+    """Serial จำลองสำหรับทดสอบ (นับจำนวนครั้งที่ล้าง buffer)"""
+    
+    def __init__(self, replies=b""):
+        self.rx = bytearray(replies)
+        self.written = []
+        self.resets = 0
+    
+    @property
+    def in_waiting(self):
+        return len(self.rx)
+    
+    def reset_input_buffer(self):
+        self.resets += 1
+        self.rx.clear()
+    
+    def write(self, data):
+        self.written.append(data)
+    
+    def readline(self):
+        idx = self.rx.find(b"\n")
+        end = len(self.rx) if idx < 0 else idx + 1
+        line = bytes(self.rx[:end])
+        del self.rx[:end]
+        return line
+
+
+class TestSerialDrain:
+    """ทดสอบการล้าง RX buffer เฉพาะเมื่อมีข้อมูลค้าง"""
+    
+    @pytest.fixture
+    def brain(self):
+        brain = RobotBrain(CalibrationConfig())
+        brain.ser = FakeSerial()
+        brain.is_connected = True
+        return brain
+    
+    def test_first_command_drains_boot_output(self, brain):
+        brain.ser.rx.extend(b"ESP32 AgriBot Ready\r\nDONE\r\n")
+        brain.send_cmd("STATUS", wait_for_done=False)
+        assert brain.ser.resets == 1
+    
+    def test_clean_handshake_skips_drain(self, brain):
+        brain.rx_dirty = False
+        brain.ser.rx.extend(b"DONE\r\n")
+        assert brain.send_cmd("PUMP_ON") is True
+        assert brain.ser.resets == 0
+        assert brain.rx_dirty is False
+    
+    def test_unread_reply_marks_dirty(self, brain):
+        brain.rx_dirty = False
+        brain.send_cmd("MOVE_FORWARD", wait_for_done=False)
+        assert brain.rx_dirty is True
+        
+        brain.ser.rx.extend(b"DONE\r\n")
+        brain.drain_input()
+        assert brain.ser.resets == 1
+        assert brain.rx_dirty is False
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
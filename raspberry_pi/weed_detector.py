@@ -9,6 +9,7 @@ Author: AgriBot Team
 import cv2
 import numpy as np
 import logging
+import time
 from pathlib import Path
 from typing import List, Tuple, Optional
 from dataclasses import dataclass
@@ -194,6 +195,10 @@ class WeedDetector:
         self.cap: Optional[cv2.VideoCapture] = None
         self.model = None
         
+        # เฟรมล่าสุดที่ capture ได้ (ให้ health check ใช้โดยไม่ต้องอ่านกล้องซ้ำ)
+        self.last_frame_shape: Optional[Tuple[int, ...]] = None
+        self.last_frame_ts: float = 0.0  # time.monotonic()
+        
         # Dynamic target classes - ชื่อ class ที่ต้องการพ่น (เปลี่ยนได้)
         # Default: พ่นเฉพาะ "weed"
         self.target_class_names: set = {"weed"}
@@ -411,6 +416,8 @@ class WeedDetector:
         if self.cap and self.cap.isOpened():
             ret, frame = self.cap.read()
             if ret:
+                self.last_frame_shape = frame.shape
+                self.last_frame_ts = time.monotonic()
                 return frame
         return None
     